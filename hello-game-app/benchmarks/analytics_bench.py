@@ -0,0 +1,224 @@
+"""Benchmark of /stats/analytics: NumPy columns vs. the equivalent SQL and Python loops.
+
+Seeds Postgres the same way as query_bench.py (cumulative sizes, Zipf names)
+and at every table size measures the four distributions behind
+/stats/analytics computed three ways:
+- sql: one aggregate query per distribution over `GROUP BY name`
+- python: per-name Python loops over the loaded (name, count) rows
+- numpy: NameAnalytics (analytics.py) - uncached computation, cached answer,
+  full rebuild from the database and an incremental refresh after
+  `--incremental-rows` new submissions
+
+The results of the three are compared, so a wrong answer fails the run
+instead of producing a fast number.
+
+Usage:
+    python analytics_bench.py --sizes 100000,1000000,10000000 --cardinality 50000
+"""
+
+import argparse
+import heapq
+import logging
+import math
+import random
+import time
+from datetime import datetime
+
+from query_bench import connect, load_backend, seed_to, time_calls
+from results import summarize, write_result
+from stack import PostgresContainer, wait_for_port
+
+logger = logging.getLogger(__name__)
+
+NAME_COUNTS = "SELECT name, count(*) AS n FROM game_submissions GROUP BY name"
+
+SQL_QUERIES = {
+    'length_histogram': f"SELECT length(name), count(*), sum(n) FROM ({NAME_COUNTS}) c GROUP BY 1 ORDER BY 1",
+    'count_percentiles': (
+        "SELECT percentile_cont(ARRAY[0.5, 0.75, 0.9, 0.99]) WITHIN GROUP (ORDER BY n), avg(n), max(n) "
+        f"FROM ({NAME_COUNTS}) c"
+    ),
+    'concentration': f"SELECT name, n FROM ({NAME_COUNTS}) c ORDER BY n DESC LIMIT %s",
+    'first_letters': f"SELECT upper(left(name, 1)), count(*), sum(n) FROM ({NAME_COUNTS}) c GROUP BY 1 ORDER BY 3 DESC",
+}
+
+
+def run_sql(cursor, top):
+    """Runs every SQL query; returns {distribution: rows}."""
+    results = {}
+    for key, statement in SQL_QUERIES.items():
+        cursor.execute(statement, (top,) if '%s' in statement else None)
+        results[key] = cursor.fetchall()
+    return results
+
+
+def python_summary(rows, top):
+    """The same distributions with plain Python loops over [(name, count), ...]."""
+    total = 0
+    by_length, by_letter = {}, {}
+    for name, count in rows:
+        total += count
+        names, players = by_length.get(len(name), (0, 0))
+        by_length[len(name)] = (names + 1, players + count)
+        letter = name[:1].upper()
+        names, players = by_letter.get(letter, (0, 0))
+        by_letter[letter] = (names + 1, players + count)
+
+    counts = sorted(count for _, count in rows)
+
+    def percentile(pct):
+        # Linear interpolation, like numpy.percentile and percentile_cont
+        position = (len(counts) - 1) * pct / 100
+        low, high = math.floor(position), math.ceil(position)
+        return counts[low] + (counts[high] - counts[low]) * (position - low)
+
+    top_names = heapq.nlargest(top, rows, key=lambda row: row[1])
+    return {
+        'total_players': total,
+        'length_histogram': sorted(by_length.items()),
+        'count_percentiles': [percentile(pct) for pct in (50, 75, 90, 99)],
+        'top_players': sum(count for _, count in top_names),
+        'first_letters': by_letter,
+    }
+
+
+def check_results(sql, python, numpy_summary):
+    """Returns a list of mismatches between the three implementations (empty when they agree)."""
+    errors = []
+    sql_lengths = [(length, (names, players)) for length, names, players in sql['length_histogram']]
+    numpy_lengths = [(item['length'], (item['names'], item['players']))
+                     for item in numpy_summary['name_length']['histogram']]
+    if not sql_lengths == python['length_histogram'] == numpy_lengths:
+        errors.append('length_histogram')
+
+    sql_percentiles = [round(value, 2) for value in sql['count_percentiles'][0][0]]
+    numpy_percentiles = [numpy_summary['count_per_name'][f'p{pct}'] for pct in (50, 75, 90, 99)]
+    if not sql_percentiles == [round(value, 2) for value in python['count_percentiles']] == numpy_percentiles:
+        errors.append('count_percentiles')
+
+    sql_top = sum(count for _, count in sql['concentration'])
+    if not sql_top == python['top_players'] == numpy_summary['concentration']['players']:
+        errors.append('concentration')
+
+    sql_letters = {letter: (names, players) for letter, names, players in sql['first_letters']}
+    numpy_letters = {item['letter']: (item['names'], item['players']) for item in numpy_summary['first_letters']}
+    if not sql_letters == python['first_letters'] == numpy_letters:
+        errors.append('first_letters')
+    return errors
+
+
+def benchmark_size(args, size, app, db, model, analytics_class, feed_class):
+    """Measures all three implementations at the current table size."""
+    result = {'rows': size}
+
+    conn = connect(args)
+    try:
+        cursor = conn.cursor()
+        run_sql(cursor, args.top)  # warm up the buffer cache
+        for key, statement in SQL_QUERIES.items():
+            parameters = (args.top,) if '%s' in statement else None
+            result[f'sql_{key}'] = time_calls(lambda s=statement, p=parameters: cursor.execute(s, p), args.repeat)
+        result['sql_total'] = time_calls(lambda: run_sql(cursor, args.top), args.repeat)
+        sql_results = run_sql(cursor, args.top)
+        conn.rollback()
+    finally:
+        conn.close()
+
+    with app.app_context():
+        rows, _ = model.get_name_counts(0)
+        db.session.rollback()
+        result['names'] = len(rows)
+        result['python'] = time_calls(lambda: python_summary(rows, args.top), args.repeat)
+        python_results = python_summary(rows, args.top)
+
+        analytics = analytics_class()
+        feed = feed_class(model, [analytics], refresh_seconds=0, full_refresh_seconds=0)
+        result['numpy_rebuild'] = time_calls(feed.refresh, max(1, args.repeat // 2))
+        # pylint: disable=protected-access
+        result['numpy_compute'] = time_calls(lambda: analytics._compute(args.top), args.repeat)
+        result['numpy_cached'] = time_calls(lambda: analytics.summary(args.top), args.repeat)
+        numpy_summary = analytics.summary(args.top)
+
+        # From here on every refresh is incremental
+        feed.full_refresh_seconds = math.inf
+        incremental = []
+        for _ in range(max(1, args.repeat // 2)):
+            model.add_submissions([f"bench{random.randint(1, args.cardinality * 2)}"
+                                   for _ in range(args.incremental_rows)])
+            started = time.perf_counter()
+            feed.refresh()
+            incremental.append(time.perf_counter() - started)
+        result['numpy_incremental'] = summarize(incremental)
+        db.session.rollback()
+
+    result['mismatches'] = check_results(sql_results, python_results, numpy_summary)
+    return result
+
+
+def parse_args():
+    """Command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100000,1000000,10000000',
+                        type=lambda value: sorted(int(size) for size in value.split(',')),
+                        help="Comma separated table sizes (rows) to measure at")
+    parser.add_argument('--cardinality', type=int, default=50000, help="Number of distinct names")
+    parser.add_argument('--skew', type=float, default=1.1, help="Zipf exponent of the name popularity (0 = uniform)")
+    parser.add_argument('--days', type=int, default=365, help="Time span covered by the synthetic submissions")
+    parser.add_argument('--top', type=int, default=10, help="Names in the concentration metric")
+    parser.add_argument('--repeat', type=int, default=10, help="Measurements per implementation and size")
+    parser.add_argument('--incremental-rows', type=int, default=1000,
+                        help="Submissions added before every incremental refresh")
+    parser.add_argument('--reset', action='store_true', help="Truncate game_submissions before seeding")
+    parser.add_argument('--output', default=None, help="Result file (default: results/analytics-<timestamp>.json)")
+    parser.add_argument('--no-start-db', action='store_true', help="Use an already running Postgres")
+    parser.add_argument('--db-host', default='localhost')
+    parser.add_argument('--db-port', type=int, default=5432)
+    return parser.parse_args()
+
+
+def main():
+    """Runs the benchmark."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args()
+
+    container = None if args.no_start_db else PostgresContainer(port=args.db_port)
+    if container:
+        container.start()
+    try:
+        wait_for_port(args.db_host, args.db_port)
+        app, db, model = load_backend(args)
+        from analytics import NameAnalytics  # pylint: disable=import-outside-toplevel,import-error
+        from name_index import NameCountsFeed  # pylint: disable=import-outside-toplevel,import-error
+
+        app.test_client().post('/migrate').get_json()
+        if args.reset:
+            conn = connect(args, autocommit=True)
+            conn.cursor().execute("TRUNCATE game_submissions RESTART IDENTITY")
+            conn.close()
+
+        sizes = []
+        for size in args.sizes:
+            seed_to(args, size)
+            logger.info("Measuring at %d rows", size)
+            result = benchmark_size(args, size, app, db, model, NameAnalytics, NameCountsFeed)
+            sizes.append(result)
+
+            print(f"\n=== {size:,} rows, {result['names']:,} names ===")
+            for key in ('sql_total', 'python', 'numpy_compute', 'numpy_cached', 'numpy_rebuild', 'numpy_incremental'):
+                stats = result[key]
+                print(f"{key:18} p50 {stats['p50_ms']:>10} ms   p95 {stats['p95_ms']:>10} ms")
+            if result['mismatches']:
+                print(f"MISMATCH in: {', '.join(result['mismatches'])}")
+    finally:
+        if container:
+            container.stop()
+
+    output = args.output or f"results/analytics-{datetime.now():%Y%m%d-%H%M%S}.json"
+    write_result(output, 'analytics_bench', vars(args), {'sizes': sizes})
+    print(f"\nResults written to {output}")
+    if any(result['mismatches'] for result in sizes):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+"""Latency and fault injecting TCP proxy for the local Postgres.
+
+Locally the database is one hop away and never misbehaves, unlike Cloud SQL
+behind the Cloud SQL Python Connector. Put this proxy between a service and
+Postgres to get closer:
+- connect delay (+ jitter): time before the upstream connection is opened,
+  like the IAM/TLS setup of `Connector.connect`
+- latency (+ jitter): one-way delay of every chunk, in both directions
+  (the round trip grows by twice the latency); the byte order is kept
+- bandwidth: cap per connection and direction
+- resets: every chunk may reset the connection with `reset_probability`, and
+  every connection is reset `reset_after_s` (+-50%) after it was opened;
+  both ends get a TCP RST, like a dropped connection
+
+The services need no changes: point DB_HOST/DB_PORT (backend and function)
+at the proxy. stack.LocalStack does that when given a proxy.
+
+Usage:
+    python db_proxy.py --listen-port 15432 --profile cloudsql
+    python db_proxy.py --listen-port 15432 --latency-ms 5 --jitter-ms 2 --reset-probability 0.001
+"""
+
+import argparse
+import logging
+import queue
+import random
+import socket
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 65536
+
+# Rough guesses - tune them with numbers measured in the real environment
+PROFILES = {
+    'none': {},
+    # Slow connects through the Cloud SQL connector, fast private network afterwards
+    'cloudsql': {'connect_delay_ms': 250, 'connect_jitter_ms': 250, 'latency_ms': 0.5, 'jitter_ms': 0.5},
+    # Cross-region or congested network
+    'slow-network': {'connect_delay_ms': 100, 'latency_ms': 20, 'jitter_ms': 10, 'bandwidth_kbps': 8000},
+    # Connections that get dropped now and then (maintenance, failover, idle timeouts)
+    'flaky': {'connect_delay_ms': 250, 'connect_jitter_ms': 250, 'latency_ms': 0.5, 'jitter_ms': 0.5,
+              'reset_probability': 0.0005, 'reset_after_s': 120},
+}
+
+
+class FaultProfile:
+    """
+    What the proxy does to the traffic. All values can be changed while the proxy runs.
+
+    :param connect_delay_ms: Delay before a new connection is forwarded upstream.
+    :param connect_jitter_ms: Random extra connect delay (uniform, 0..jitter).
+    :param latency_ms: One-way delay of every chunk.
+    :param jitter_ms: Random extra delay per chunk (uniform, 0..jitter).
+    :param bandwidth_kbps: Per connection and direction; 0 = unlimited.
+    :param reset_probability: Chance that forwarding a chunk resets the connection.
+    :param reset_after_s: Reset connections this long (+-50%) after they were opened; 0 = never.
+    """
+    # pylint: disable=too-few-public-methods,too-many-arguments,too-many-instance-attributes
+
+    def __init__(self, connect_delay_ms=0, connect_jitter_ms=0, latency_ms=0, jitter_ms=0,
+                 bandwidth_kbps=0, reset_probability=0, reset_after_s=0):
+        self.connect_delay_ms = connect_delay_ms
+        self.connect_jitter_ms = connect_jitter_ms
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.bandwidth_kbps = bandwidth_kbps
+        self.reset_probability = reset_probability
+        self.reset_after_s = reset_after_s
+
+    @classmethod
+    def named(cls, name, **overrides):
+        """One of PROFILES, with some values replaced (None values are ignored)."""
+        values = dict(PROFILES[name])
+        values.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**values)
+
+    def to_dict(self):
+        """JSON-friendly settings."""
+        return dict(vars(self))
+
+
+class _Pipe:
+    """One direction of a proxied connection: a reader stamps chunks, a writer sends them when due."""
+
+    def __init__(self, connection, source, target):
+        self.connection = connection
+        self.source = source
+        self.target = target
+        self._queue = queue.Queue()
+        self._last_due = 0.0
+        self._link_free_at = 0.0
+        self.threads = [threading.Thread(target=self._read, daemon=True),
+                        threading.Thread(target=self._write, daemon=True)]
+
+    def start(self):
+        """Starts the reader and writer threads."""
+        for thread in self.threads:
+            thread.start()
+
+    def _read(self):
+        profile = self.connection.proxy.profile
+        try:
+            while True:
+                data = self.source.recv(CHUNK_SIZE)
+                if not data:
+                    break
+                if profile.reset_probability and random.random() < profile.reset_probability:
+                    self.connection.reset('random reset')
+                    break
+                delay = (profile.latency_ms + random.uniform(0, profile.jitter_ms)) / 1000
+                # Never overtake the previous chunk, the stream must stay in order
+                self._last_due = max(self._last_due, time.monotonic() + delay)
+                self._queue.put((self._last_due, data))
+        except OSError:
+            pass
+        self._queue.put(None)
+
+    def _write(self):
+        profile = self.connection.proxy.profile
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    self.target.shutdown(socket.SHUT_WR)
+                    break
+                due, data = item
+                if profile.bandwidth_kbps:
+                    transmit = len(data) * 8 / (profile.bandwidth_kbps * 1000)
+                    self._link_free_at = max(self._link_free_at, due) + transmit
+                    due = self._link_free_at
+                wait = due - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                self.target.sendall(data)
+                self.connection.proxy.count('bytes', len(data))
+        except OSError:
+            pass
+        self.connection.pipe_done()
+
+
+class _Connection:
+    """A client connection and its upstream connection."""
+
+    def __init__(self, proxy, client, upstream):
+        self.proxy = proxy
+        self.sockets = [client, upstream]
+        self.pipes = [_Pipe(self, client, upstream), _Pipe(self, upstream, client)]
+        self._open_pipes = len(self.pipes)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._reset_timer = None
+
+    def start(self):
+        """Starts forwarding (and the max age timer)."""
+        reset_after = self.proxy.profile.reset_after_s
+        if reset_after:
+            self._reset_timer = threading.Timer(reset_after * random.uniform(0.5, 1.5), self.reset, ['max age'])
+            self._reset_timer.daemon = True
+            self._reset_timer.start()
+        for pipe in self.pipes:
+            pipe.start()
+
+    def pipe_done(self):
+        """Closes the connection once both directions are done."""
+        with self._lock:
+            self._open_pipes -= 1
+            if self._open_pipes:
+                return
+        self._close(abort=False)
+
+    def reset(self, reason):
+        """Drops the connection with a TCP RST to both ends."""
+        if self._close(abort=True):
+            logger.info("Connection reset (%s)", reason)
+            self.proxy.count('resets')
+
+    def _close(self, abort):
+        with self._lock:
+            if self._closed:
+                return False
+            self._closed = True
+        if self._reset_timer:
+            self._reset_timer.cancel()
+        for sock in self.sockets:
+            try:
+                if abort:
+                    # Linger with timeout 0: close() sends RST instead of FIN
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                sock.close()
+            except OSError:
+                pass
+        self.proxy.closed(self)
+        return True
+
+
+class DbProxy:
+    """
+    TCP proxy applying a FaultProfile. Use it as a context manager or call start()/stop().
+
+    :param upstream_host: Postgres host.
+    :param upstream_port: Postgres port.
+    :param listen_host: Interface to listen on.
+    :param listen_port: Port to listen on (0 = any free port, see `port`).
+    :param profile: FaultProfile (default: forward unchanged).
+    """
+
+    def __init__(self, upstream_host='localhost', upstream_port=5432, listen_host='127.0.0.1', listen_port=0,
+                 profile=None):
+        # pylint: disable=too-many-arguments
+        self.upstream = (upstream_host, upstream_port)
+        self.listen_host = listen_host
+        self.port = listen_port
+        self.profile = profile or FaultProfile()
+
+        self.counters = {'connections': 0, 'connect_failures': 0, 'resets': 0, 'bytes': 0}
+        self._connections = set()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        """Starts listening; returns self."""
+        self._server = socket.create_server((self.listen_host, self.port))
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept, name='db-proxy', daemon=True).start()
+        logger.info("DB proxy listening on %s:%d -> %s:%d (%s)",
+                    self.listen_host, self.port, *self.upstream, self.profile.to_dict())
+        return self
+
+    def stop(self):
+        """Stops listening and drops every open connection."""
+        if self._server:
+            self._server.close()
+            self._server = None
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            connection.reset('proxy stopped')
+
+    def count(self, counter, value=1):
+        """Adds to one of the counters."""
+        with self._lock:
+            self.counters[counter] += value
+
+    def closed(self, connection):
+        """Forgets a closed connection."""
+        with self._lock:
+            self._connections.discard(connection)
+
+    def stats(self):
+        """Counters plus the number of open connections."""
+        with self._lock:
+            return dict(self.counters, open_connections=len(self._connections))
+
+    def _accept(self):
+        server = self._server
+        while True:
+            try:
+                client, _ = server.accept()
+            except OSError:
+                return  # listener closed
+            threading.Thread(target=self._open, args=(client,), daemon=True).start()
+
+    def _open(self, client):
+        profile = self.profile
+        delay = (profile.connect_delay_ms + random.uniform(0, profile.connect_jitter_ms)) / 1000
+        if delay:
+            time.sleep(delay)
+        try:
+            upstream = socket.create_connection(self.upstream, timeout=10)
+            upstream.settimeout(None)
+        except OSError as e:
+            logger.warning("Upstream connection failed: %s", e)
+            self.count('connect_failures')
+            client.close()
+            return
+        for sock in (client, upstream):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        connection = _Connection(self, client, upstream)
+        with self._lock:
+            self.counters['connections'] += 1
+            self._connections.add(connection)
+        connection.start()
+
+
+def parse_args():
+    """Command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--listen-port', type=int, default=15432)
+    parser.add_argument('--upstream', default='localhost:5432', help="Postgres host:port")
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+def add_profile_args(parser):
+    """Adds --profile and the per-value overrides to an argument parser."""
+    parser.add_argument('--profile', default='none', choices=sorted(PROFILES), help="Preset fault profile")
+    parser.add_argument('--connect-delay-ms', type=float, help="Delay before a connection is forwarded")
+    parser.add_argument('--connect-jitter-ms', type=float, help="Random extra connect delay")
+    parser.add_argument('--latency-ms', type=float, help="One-way delay of every chunk")
+    parser.add_argument('--jitter-ms', type=float, help="Random extra delay per chunk")
+    parser.add_argument('--bandwidth-kbps', type=float, help="Bandwidth per connection and direction")
+    parser.add_argument('--reset-probability', type=float, help="Chance that a chunk resets its connection")
+    parser.add_argument('--reset-after-s', type=float, help="Reset connections after this long (+-50%%)")
+
+
+def profile_from_args(args):
+    """FaultProfile selected by the add_profile_args() arguments."""
+    return FaultProfile.named(
+        args.profile,
+        connect_delay_ms=args.connect_delay_ms, connect_jitter_ms=args.connect_jitter_ms,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, bandwidth_kbps=args.bandwidth_kbps,
+        reset_probability=args.reset_probability, reset_after_s=args.reset_after_s,
+    )
+
+
+def main():
+    """Runs the proxy until interrupted."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    host, port = args.upstream.rsplit(':', 1)
+    proxy = DbProxy(host, int(port), listen_port=args.listen_port, profile=profile_from_args(args)).start()
+    try:
+        while True:
+            time.sleep(60)
+            logger.info("Proxy stats: %s", proxy.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.stop()
+
+
+if __name__ == '__main__':
+    main()
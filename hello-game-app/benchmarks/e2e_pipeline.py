@@ -0,0 +1,252 @@
+"""End-to-end pipeline throughput benchmark.
+
+Starts the whole Hello Game stack locally (see stack.py), pushes a workload of
+name submissions through the frontend `/play` endpoint and measures:
+- sustained submit throughput and p50/p95/p99 `/play` latency
+- end-to-end "submitted -> visible in backend /stats" latency and throughput
+
+Every submission uses a unique name, so the poller can tell exactly when each
+one landed in the database. Results are written as JSON for comparing runs.
+
+Usage:
+    python benchmarks/e2e_pipeline.py --requests 2000 --rate 100 --concurrency 32
+"""
+
+import argparse
+import logging
+import random
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from db_proxy import DbProxy, add_profile_args, profile_from_args
+from results import summarize, write_result
+from stack import LocalStack
+
+logger = logging.getLogger(__name__)
+
+
+class VisibilityPoller:
+    """Polls backend /stats and records when each pending name shows up."""
+
+    def __init__(self, stats_url, interval):
+        self.stats_url = stats_url
+        self.interval = interval
+        self.visible_at = {}
+        self.poll_errors = 0
+        self._expected = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def expect(self, name):
+        """Registers a normalized name that is going to show up."""
+        with self._lock:
+            self._expected.add(name)
+
+    def discard(self, name):
+        """Stops waiting for a name (e.g. its submission failed)."""
+        with self._lock:
+            self._expected.discard(name)
+
+    def pending(self):
+        """Number of expected names not yet visible."""
+        with self._lock:
+            return len(self._expected) - len(self.visible_at)
+
+    def start(self):
+        """Starts polling in a background thread."""
+        self._thread.start()
+
+    def stop(self):
+        """Stops polling."""
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        session = requests.Session()
+        while not self._stop.is_set():
+            try:
+                response = session.get(self.stats_url, timeout=10)
+                response.raise_for_status()
+                payload = response.json()
+                seen_at = time.monotonic()
+                # /stats falls back to mock data when the DB is down - don't count that
+                if 'database_error' not in payload:
+                    with self._lock:
+                        for item in payload['name_data']:
+                            name = item['name']
+                            if name in self._expected and name not in self.visible_at:
+                                self.visible_at[name] = seen_at
+            except (requests.RequestException, ValueError, KeyError):
+                self.poll_errors += 1
+            self._stop.wait(self.interval)
+
+
+def run_workload(frontend_url, names, rate, concurrency, poller):
+    """
+    Submits every name to /play.
+
+    With a target rate the load is open-loop: each request has an intended send
+    time and its latency is measured from that time, so a stalled server can't
+    hide its own latency by slowing the load generator down (coordinated omission).
+    Without a rate, `concurrency` workers submit back-to-back.
+
+    :return: dict name -> (intended_start, finished, ok)
+    """
+    outcomes = {}
+    outcomes_lock = threading.Lock()
+    local = threading.local()
+    in_flight = threading.Semaphore(concurrency)
+
+    def submit(name, intended_start):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        try:
+            response = local.session.post(
+                f"{frontend_url}/play", data={'name': name}, allow_redirects=False, timeout=30,
+            )
+            ok = response.status_code in (200, 302)
+        except requests.RequestException:
+            ok = False
+        finished = time.monotonic()
+        if not ok:
+            poller.discard(name.strip().title())
+        with outcomes_lock:
+            outcomes[name] = (intended_start, finished, ok)
+        if not rate:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.monotonic()
+        for index, name in enumerate(names):
+            if rate:
+                intended_start = started + index / rate
+                delay = intended_start - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                in_flight.acquire()  # pylint: disable=consider-using-with
+                intended_start = time.monotonic()
+
+            poller.expect(name.strip().title())
+            executor.submit(submit, name, intended_start)
+
+    return outcomes
+
+
+def build_report(outcomes, poller):
+    """Turns raw timings into the throughput/latency report."""
+    ok = {name: timing for name, timing in outcomes.items() if timing[2]}
+    first_start = min(start for start, _, _ in outcomes.values())
+    last_finish = max(finish for _, finish, _ in outcomes.values())
+
+    submit_latencies = [finish - start for start, finish, _ in ok.values()]
+
+    e2e_latencies = []
+    last_visible = None
+    for name, (start, _, _) in ok.items():
+        visible = poller.visible_at.get(name.strip().title())
+        if visible is not None:
+            e2e_latencies.append(visible - start)
+            last_visible = visible if last_visible is None else max(last_visible, visible)
+
+    submit_window = last_finish - first_start
+    e2e_window = (last_visible - first_start) if last_visible else None
+
+    return {
+        'submitted': len(outcomes),
+        'submit_errors': len(outcomes) - len(ok),
+        'visible': len(e2e_latencies),
+        'lost': len(ok) - len(e2e_latencies),
+        'poll_errors': poller.poll_errors,
+        'submit_throughput_rps': round(len(ok) / submit_window, 2) if submit_window else None,
+        'e2e_throughput_rps': round(len(e2e_latencies) / e2e_window, 2) if e2e_window else None,
+        'submit_latency': summarize(submit_latencies),
+        'e2e_latency': summarize(e2e_latencies),
+    }
+
+
+def print_report(report):
+    """Prints a human-readable summary."""
+    print("\n=== End-to-end pipeline benchmark ===")
+    print(f"Submitted: {report['submitted']}  errors: {report['submit_errors']}  "
+          f"visible: {report['visible']}  lost: {report['lost']}")
+    print(f"Submit throughput: {report['submit_throughput_rps']} req/s")
+    print(f"End-to-end throughput: {report['e2e_throughput_rps']} rows/s")
+    for label, key in (("Submit latency", 'submit_latency'), ("Submitted -> visible", 'e2e_latency')):
+        stats = report[key]
+        if stats['count']:
+            print(f"{label}: p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, "
+                  f"p99 {stats['p99_ms']} ms, max {stats['max_ms']} ms")
+
+
+def parse_args():
+    """Command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000, help="Number of /play submissions")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="Target requests per second (open-loop); 0 = as fast as --concurrency allows")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent client connections")
+    parser.add_argument('--poll-interval', type=float, default=0.1, help="Seconds between /stats polls")
+    parser.add_argument('--drain-timeout', type=float, default=60,
+                        help="Seconds to wait for submissions to become visible after the load stops")
+    parser.add_argument('--output', default=None, help="Result file (default: results/e2e-<timestamp>.json)")
+    parser.add_argument('--no-start-db', action='store_true', help="Use an already running Postgres")
+    parser.add_argument('--db-host', default='localhost')
+    parser.add_argument('--db-port', type=int, default=5432)
+    parser.add_argument('--backend-workers', type=int, default=1)
+    parser.add_argument('--backend-threads', type=int, default=1, help="gthread threads per backend worker")
+    parser.add_argument('--frontend-threads', type=int, default=4)
+    parser.add_argument('--function-concurrency', type=int, default=10)
+    parser.add_argument('--log-dir', default='bench-logs')
+    # Latency/faults between the services and Postgres (see db_proxy.py); no proxy without them
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    """Runs the benchmark."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args()
+
+    # Unique names per run so leftovers from previous runs are never counted
+    run_tag = ''.join(random.choices(string.ascii_lowercase, k=6))
+    names = [f"bench {run_tag} {index}" for index in range(args.requests)]
+
+    profile = profile_from_args(args)
+    db_proxy = DbProxy(args.db_host, args.db_port, profile=profile) if any(profile.to_dict().values()) else None
+
+    with LocalStack(db_host=args.db_host, db_port=args.db_port, start_db=not args.no_start_db,
+                    backend_workers=args.backend_workers, backend_threads=args.backend_threads,
+                    frontend_threads=args.frontend_threads, function_concurrency=args.function_concurrency,
+                    log_dir=args.log_dir, db_proxy=db_proxy) as stack:
+        poller = VisibilityPoller(f"{stack.backend_url}/stats", args.poll_interval)
+        poller.start()
+
+        logger.info("Submitting %d names (rate: %s, concurrency: %d)",
+                    args.requests, args.rate or 'unbounded', args.concurrency)
+        outcomes = run_workload(stack.frontend_url, names, args.rate, args.concurrency, poller)
+
+        logger.info("Load finished, waiting up to %.0fs for the pipeline to drain", args.drain_timeout)
+        deadline = time.monotonic() + args.drain_timeout
+        while poller.pending() and time.monotonic() < deadline:
+            time.sleep(args.poll_interval)
+        poller.stop()
+
+    report = build_report(outcomes, poller)
+    if db_proxy:
+        report['db_proxy'] = dict(db_proxy.stats(), profile=profile.to_dict())
+    print_report(report)
+
+    output = args.output or f"results/e2e-{datetime.now():%Y%m%d-%H%M%S}.json"
+    write_result(output, 'e2e_pipeline', vars(args), report)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
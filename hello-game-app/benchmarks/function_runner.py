@@ -0,0 +1,85 @@
+"""Runs hello-function locally against the Pub/Sub emulator.
+
+In GCP the function is triggered by an Eventarc push subscription. Locally we
+pull from a subscription instead and hand every message to
+`process_pubsub_message` in the same shape the background function receives it
+(base64-encoded `data` plus a context with `event_id` and `timestamp`).
+
+Usage:
+    PUBSUB_EMULATOR_HOST=localhost:8085 python function_runner.py \
+        --project hello-game-local --subscription hello-game-names-bench
+"""
+
+import argparse
+import base64
+import logging
+import os
+import sys
+from concurrent import futures
+
+from google.cloud import pubsub_v1  # type: ignore
+
+FUNCTION_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'hello-function'))
+sys.path.insert(0, FUNCTION_DIR)
+
+from main import process_pubsub_message  # pylint: disable=wrong-import-position
+
+logger = logging.getLogger(__name__)
+
+
+class MessageContext:
+    """Mimics the `context` argument of a background Cloud Function."""
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, message):
+        self.event_id = message.message_id
+        self.timestamp = message.publish_time.isoformat()
+
+
+def handle_message(message):
+    """Invokes the function for a single message, acking only on success."""
+    event = {
+        'data': base64.b64encode(message.data).decode('utf-8'),
+        'attributes': dict(message.attributes),
+    }
+    try:
+        process_pubsub_message(event, MessageContext(message))
+        message.ack()
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        # Same as a failed invocation in GCP - the message gets redelivered
+        logger.error("Function failed for message %s: %s", message.message_id, e)
+        message.nack()
+
+
+def main():
+    """Pulls messages until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--project', required=True)
+    parser.add_argument('--subscription', required=True)
+    parser.add_argument('--concurrency', type=int, default=10,
+                        help="Messages processed at the same time (like function max instances)")
+    args = parser.parse_args()
+
+    subscriber = pubsub_v1.SubscriberClient()
+    subscription_path = subscriber.subscription_path(args.project, args.subscription)
+
+    streaming_pull = subscriber.subscribe(
+        subscription_path,
+        callback=handle_message,
+        flow_control=pubsub_v1.types.FlowControl(max_messages=args.concurrency),
+        scheduler=pubsub_v1.subscriber.scheduler.ThreadScheduler(
+            executor=futures.ThreadPoolExecutor(max_workers=args.concurrency)
+        ),
+    )
+    logger.info("Listening for messages on %s", subscription_path)
+
+    with subscriber:
+        try:
+            streaming_pull.result()
+        except KeyboardInterrupt:
+            streaming_pull.cancel()
+            streaming_pull.result()
+
+
+if __name__ == '__main__':
+    main()
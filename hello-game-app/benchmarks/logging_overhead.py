@@ -0,0 +1,159 @@
+"""Hot-path cost of logging: the old synchronous setup vs. log_setup.py.
+
+Simulates request threads that each write the same three INFO lines /play
+writes per request and measures how long the *request thread* spends in the
+logging calls. The log output goes to a sink that takes `--write-latency-us`
+per write, like stdout piped to a busy log agent in a container.
+
+Setups compared:
+- basicConfig-fstring: the previous setup - synchronous StreamHandler, text format, f-strings
+- sync-json: synchronous JSON output with lazy formatting
+- async-json: the queue-based handler, formatting and writing on a background thread
+- async-json-ratelimited: the same plus the per-message-type rate limit (the default setup)
+
+Usage:
+    python logging_overhead.py
+    python logging_overhead.py --threads 16 --requests 5000 --write-latency-us 200
+"""
+
+import argparse
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from results import summarize, write_result
+from stack import BACKEND_DIR
+
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'src'))
+# pylint: disable=wrong-import-position,import-error
+from log_setup import (  # noqa: E402
+    TEXT_FORMAT, DrainingQueueListener, JsonFormatter, NonBlockingQueueHandler, RateLimitFilter
+)
+
+SETUPS = ['basicConfig-fstring', 'sync-json', 'async-json', 'async-json-ratelimited']
+
+
+class SlowSink:
+    """File-like object that takes a fixed time per write."""
+
+    def __init__(self, write_latency):
+        self.write_latency = write_latency
+        self.lines = 0
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        """Simulated (blocking) write."""
+        with self._lock:
+            self.lines += text.count('\n')
+            end = time.perf_counter() + self.write_latency
+            while time.perf_counter() < end:
+                pass
+
+    def flush(self):
+        """Nothing to flush."""
+
+
+def build_logger(setup, sink, rate_limit, queue_size):
+    """Returns (logger, listener) for one setup."""
+    logger = logging.getLogger(f"bench.{setup}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+    output = logging.StreamHandler(sink)
+    listener = None
+    if setup == 'basicConfig-fstring':
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handler = output
+    else:
+        output.setFormatter(JsonFormatter('bench'))
+        handler = output
+        if setup.startswith('async'):
+            handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+            listener = DrainingQueueListener(handler.queue, output)
+            listener.start()
+        if setup.endswith('ratelimited'):
+            handler.addFilter(RateLimitFilter(rate_limit))
+    logger.addHandler(handler)
+    return logger, listener
+
+
+def run_setup(setup, args):
+    """Runs the simulated requests for one setup; returns its result."""
+    sink = SlowSink(args.write_latency_us / 1e6)
+    logger, listener = build_logger(setup, sink, args.rate_limit, args.queue_size)
+    eager = setup == 'basicConfig-fstring'
+    latencies = []
+    lock = threading.Lock()
+
+    def request(index):
+        name = f"Player{index % 500}"
+        started = time.perf_counter()
+        # pylint: disable=logging-fstring-interpolation
+        if eager:
+            logger.info(f"Received name submission: {name}")
+            logger.info(f"Publishing name to Pub/Sub: {name}")
+            logger.info("Message publishing initiated in background thread")
+        else:
+            logger.info("Received name submission: %s", name)
+            logger.info("Publishing name to Pub/Sub: %s", name)
+            logger.info("Message publishing initiated in background thread")
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        list(executor.map(request, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    dropped = 0
+    if listener:
+        listener.stop()
+        dropped = logger.handlers[0].dropped
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+
+    return {
+        'hot_path': summarize(latencies),
+        'requests_per_second': round(args.requests / elapsed),
+        'lines_written': sink.lines,
+        'dropped': dropped,
+    }
+
+
+def parse_args():
+    """Command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000, help="Simulated requests per setup")
+    parser.add_argument('--threads', type=int, default=8, help="Concurrent request threads")
+    parser.add_argument('--write-latency-us', type=float, default=50, help="Time the sink takes per write")
+    parser.add_argument('--rate-limit', type=float, default=20, help="LOG_RATE_LIMIT for the rate-limited setup")
+    parser.add_argument('--queue-size', type=int, default=10000, help="LOG_QUEUE_SIZE for the async setups")
+    parser.add_argument('--setups', default=','.join(SETUPS), help="Comma separated subset of: " + ', '.join(SETUPS))
+    parser.add_argument('--output', default=None, help="Result file (default: results/logging-<timestamp>.json)")
+    return parser.parse_args()
+
+
+def main():
+    """Runs the benchmark."""
+    args = parse_args()
+    results = {}
+    for setup in args.setups.split(','):
+        results[setup] = result = run_setup(setup, args)
+        stats = result['hot_path']
+        print(f"{setup}: p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms, max {stats['max_ms']} ms per request, "
+              f"{result['requests_per_second']} req/s, {result['lines_written']} lines written, "
+              f"{result['dropped']} dropped")
+
+    output = args.output or f"results/logging-{datetime.now():%Y%m%d-%H%M%S}.json"
+    write_result(output, 'logging_overhead', vars(args), results)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
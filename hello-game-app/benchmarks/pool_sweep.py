@@ -0,0 +1,318 @@
+"""Connection pool sweep of hello-backend behind the fault injecting DB proxy.
+
+For every combination of --pool-sizes x --max-overflows x --pool-timeouts,
+starts hello-backend under gunicorn with DB_POOL_SIZE / DB_MAX_OVERFLOW /
+DB_POOL_TIMEOUT, connected to Postgres through db_proxy.py with the selected
+fault profile. It then runs a closed-loop workload (`--concurrency` clients
+for `--duration` seconds, a mix of /submit and uncached /submissions reads)
+and reports:
+- throughput and p50/p95/p99/max latency
+- errors - requests that timed out waiting for a pooled connection or hit a
+  reset connection answer 500
+- DB connections opened and reset, as seen by the proxy
+- the backend's own pool telemetry from /debug/pool: checkout wait p95,
+  connections created and their p95 connect time, overflow checkouts
+
+With `--auto-budget N` one more run uses DB_POOL_SIZING=auto with a
+connection budget of N, with pool limits derived from --workers/--threads and
+resized at runtime every `--auto-adjust-seconds`.
+
+It also measures hello-function's connect-per-message cost through the same
+proxy: get_db_connection(), one query and close, `--connect-samples` times.
+
+Usage:
+    python pool_sweep.py --profile cloudsql --pool-sizes 2,5,10 --max-overflows 0,2,10 --threads 8
+    python pool_sweep.py --no-start-db --profile flaky --latency-ms 2 --duration 60
+    python pool_sweep.py --profile cloudsql --pool-sizes 2,5 --max-overflows 0,5 --auto-budget 10
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import requests
+
+from db_proxy import DbProxy, add_profile_args, profile_from_args
+from results import summarize, write_result
+from stack import (BACKEND_DIR, BACKEND_PORT, DB_NAME, DB_PASSWORD, DB_USER, FUNCTION_DIR, PostgresContainer,
+                   backend_command, wait_for_http, wait_for_port)
+
+logger = logging.getLogger(__name__)
+
+# Lets the sweep read /debug/pool of the backends it starts
+DEBUG_TOKEN = 'pool-sweep'
+
+
+def run_workload(url, concurrency, duration, warmup, read_ratio):
+    """Closed loop: `concurrency` clients send requests back to back; returns (latencies, statuses, seconds)."""
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    start = time.monotonic()
+    measure_from, stop_at = start + warmup, start + warmup + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            started = time.monotonic()
+            try:
+                if random.random() < read_ratio:
+                    # An explicit before_id skips the cached newest page
+                    response = session.get(f"{url}/submissions",
+                                           params={'before_id': random.randint(1, 10 ** 9)}, timeout=60)
+                else:
+                    response = session.post(f"{url}/submit", json={'name': f"pool{random.randint(1, 1000)}"},
+                                            timeout=60)
+                status = response.status_code
+            except requests.RequestException:
+                status = 'connection_error'
+            finished = time.monotonic()
+            if started >= measure_from and finished <= stop_at:
+                with lock:
+                    latencies.append(finished - started)
+                    statuses[status] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, duration
+
+
+def pool_env(pool_size, max_overflow, pool_timeout):
+    """Backend environment for fixed pool settings."""
+    return {
+        'DB_POOL_SIZING': 'fixed',
+        'DB_POOL_SIZE': str(pool_size),
+        'DB_MAX_OVERFLOW': str(max_overflow),
+        'DB_POOL_TIMEOUT': str(pool_timeout),
+    }
+
+
+def auto_pool_env(args):
+    """Backend environment for DB_POOL_SIZING=auto."""
+    return {
+        'DB_POOL_SIZING': 'auto',
+        'DB_CONNECTION_BUDGET': str(args.auto_budget),
+        'DB_POOL_ADJUST_SECONDS': str(args.auto_adjust_seconds),
+        'DB_POOL_TIMEOUT': str(args.pool_timeouts[0]),
+    }
+
+
+def start_backend(args, proxy, settings, log_file):
+    """Starts hello-backend with the given pool settings (environment), connected through the proxy."""
+    env = dict(os.environ)
+    env.update({
+        'ENVIRONMENT': 'development',
+        'DB_HOST': proxy.listen_host,
+        'DB_PORT': str(proxy.port),
+        'DB_NAME': DB_NAME,
+        'DB_USER': DB_USER,
+        'DB_PASSWORD': DB_PASSWORD,
+        'INSTANCE_CONNECTION_NAME': '',
+        'WEB_CONCURRENCY': str(args.workers),
+        'GUNICORN_THREADS': str(args.threads),
+        'DEBUG_TOKEN': DEBUG_TOKEN,
+        'PYTHONUNBUFFERED': '1',
+        **settings,
+    })
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        backend_command(args.port, args.workers, args.threads),
+        cwd=BACKEND_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+    try:
+        wait_for_http(f"http://localhost:{args.port}/health")
+    except TimeoutError:
+        process.kill()
+        raise
+    return process
+
+
+def stop_backend(process):
+    """Stops a backend started by start_backend()."""
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def measure_function_connect(proxy, samples):
+    """Latency of hello-function's connect-per-message (connect, SELECT 1, close) through the proxy."""
+    os.environ.update({
+        'DB_HOST': proxy.listen_host,
+        'DB_PORT': str(proxy.port),
+        'DB_NAME': DB_NAME,
+        'DB_USER': DB_USER,
+        'DB_PASSWORD': DB_PASSWORD,
+    })
+    os.environ.pop('INSTANCE_CONNECTION_NAME', None)
+    sys.path.insert(0, FUNCTION_DIR)
+    from main import get_db_connection  # pylint: disable=import-outside-toplevel,import-error
+
+    latencies, errors = [], 0
+    for _ in range(samples):
+        started = time.perf_counter()
+        try:
+            db, _ = get_db_connection()
+            cursor = db.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            db.close()
+        except Exception:  # pylint: disable=broad-exception-caught
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    return dict(summarize(latencies), errors=errors)
+
+
+def read_pool_stats(url):
+    """The backend's /debug/pool summary (of the worker that answers), or None."""
+    try:
+        response = requests.get(f"{url}/debug/pool", headers={'X-Debug-Token': DEBUG_TOKEN}, timeout=10)
+        response.raise_for_status()
+        return response.json()
+    except requests.RequestException as e:
+        logger.warning("Could not read /debug/pool: %s", e)
+        return None
+
+
+def measure_combination(args, proxy, label, settings):
+    """Runs the workload against a backend with one pool setting."""
+    url = f"http://localhost:{args.port}"
+    os.makedirs(args.log_dir, exist_ok=True)
+    log_path = os.path.join(args.log_dir, f"backend-pool-{'-'.join(map(str, label))}.log")
+    with open(log_path, 'w', encoding='utf-8') as log_file:
+        process = start_backend(args, proxy, settings, log_file)
+        try:
+            before = proxy.stats()
+            latencies, statuses, seconds = run_workload(
+                url, args.concurrency, args.duration, args.warmup, args.read_ratio)
+            after = proxy.stats()
+            pool_stats = read_pool_stats(url)
+        finally:
+            stop_backend(process)
+
+    ok = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 400)
+    pool_size, max_overflow, pool_timeout = label
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'requests': sum(statuses.values()),
+        'throughput_rps': round(ok / seconds, 2),
+        'errors': sum(statuses.values()) - ok,
+        'statuses': {str(status): count for status, count in statuses.items()},
+        'latency': summarize(latencies),
+        'db_connections_opened': after['connections'] - before['connections'],
+        'db_connection_resets': after['resets'] - before['resets'],
+        'pool_stats': pool_stats,
+    }
+
+
+def print_results(function_connect, combinations):
+    """Prints a table of all measured combinations."""
+    print(f"\nhello-function connect + query + close: p50 {function_connect.get('p50_ms')} ms, "
+          f"p99 {function_connect.get('p99_ms')} ms, errors {function_connect['errors']}")
+    print(f"\n{'pool':>5} {'overflow':>8} {'timeout':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'max ms':>9} {'errors':>7} {'conns':>6} {'resets':>6} {'wait p95':>9} {'conn p95':>9}")
+    for result in combinations:
+        latency = result['latency']
+        # Pool telemetry of one worker - the one that answered /debug/pool
+        pool_stats = result['pool_stats'] or {}
+        wait_p95 = pool_stats.get('checkout_wait', {}).get('p95_ms', '-')
+        connect_p95 = pool_stats.get('connect', {}).get('p95_ms', '-')
+        print(f"{result['pool_size']:>5} {result['max_overflow']:>8} {result['pool_timeout']:>7} "
+              f"{result['throughput_rps']:>9} {latency.get('p50_ms', '-'):>9} {latency.get('p95_ms', '-'):>9} "
+              f"{latency.get('p99_ms', '-'):>9} {latency.get('max_ms', '-'):>9} {result['errors']:>7} "
+              f"{result['db_connections_opened']:>6} {result['db_connection_resets']:>6} "
+              f"{wait_p95:>9} {connect_p95:>9}")
+
+
+def parse_args():
+    """Command line arguments."""
+    def numbers(kind):
+        return lambda value: [kind(item) for item in value.split(',')]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pool-sizes', type=numbers(int), default=[2, 5, 10], help="Comma separated pool_size values")
+    parser.add_argument('--max-overflows', type=numbers(int), default=[0, 2, 10],
+                        help="Comma separated max_overflow values")
+    parser.add_argument('--pool-timeouts', type=numbers(float), default=[30],
+                        help="Comma separated pool_timeout values (seconds)")
+    parser.add_argument('--auto-budget', type=int, default=0,
+                        help="Also measure DB_POOL_SIZING=auto with this connection budget (0 = don't)")
+    parser.add_argument('--auto-adjust-seconds', type=float, default=5,
+                        help="DB_POOL_ADJUST_SECONDS of the auto sizing run")
+    parser.add_argument('--workers', type=int, default=1, help="gunicorn workers")
+    parser.add_argument('--threads', type=int, default=8, help="gthread threads per worker")
+    parser.add_argument('--concurrency', type=int, default=32, help="Concurrent clients")
+    parser.add_argument('--duration', type=float, default=30, help="Measured seconds per combination")
+    parser.add_argument('--warmup', type=float, default=3, help="Unmeasured seconds before every measurement")
+    parser.add_argument('--read-ratio', type=float, default=0.5, help="Share of /submissions reads vs /submit")
+    parser.add_argument('--connect-samples', type=int, default=20, help="hello-function connects to time")
+    parser.add_argument('--port', type=int, default=BACKEND_PORT, help="Backend port")
+    parser.add_argument('--output', default=None, help="Result file (default: results/pool-<timestamp>.json)")
+    parser.add_argument('--log-dir', default='bench-logs')
+    parser.add_argument('--no-start-db', action='store_true', help="Use an already running Postgres")
+    parser.add_argument('--db-host', default='localhost')
+    parser.add_argument('--db-port', type=int, default=5432)
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    """Runs the sweep."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    profile = profile_from_args(args)
+
+    container = None if args.no_start_db else PostgresContainer(port=args.db_port)
+    if container:
+        container.start()
+    proxy = DbProxy(args.db_host, args.db_port, profile=profile)
+    try:
+        wait_for_port(args.db_host, args.db_port)
+        proxy.start()
+
+        function_connect = measure_function_connect(proxy, args.connect_samples)
+
+        runs = [(label, pool_env(*label)) for label in itertools.product(
+            args.pool_sizes, args.max_overflows, args.pool_timeouts)]
+        if args.auto_budget:
+            runs.append((('auto', 'auto', args.pool_timeouts[0]), auto_pool_env(args)))
+
+        combinations = []
+        for label, settings in runs:
+            logger.info("Measuring pool_size=%s max_overflow=%s pool_timeout=%s", *label)
+            if not combinations:
+                # Same as calling /migrate once, with the first backend
+                process = start_backend(args, proxy, settings, subprocess.DEVNULL)
+                requests.post(f"http://localhost:{args.port}/migrate", timeout=60).raise_for_status()
+                stop_backend(process)
+            combinations.append(measure_combination(args, proxy, label, settings))
+    finally:
+        proxy.stop()
+        if container:
+            container.stop()
+
+    print_results(function_connect, combinations)
+    output = args.output or f"results/pool-{datetime.now():%Y%m%d-%H%M%S}.json"
+    write_result(output, 'pool_sweep', vars(args), {
+        'profile': profile.to_dict(),
+        'function_connect': function_connect,
+        'combinations': combinations,
+    })
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""Benchmark for GameSubmission.get_name_stats, /stats and /submit at growing data sizes.
+
+Seeds Postgres with synthetic submissions using COPY (streamed, so memory stays
+flat even for 10^8 rows), and at every requested table size measures:
+- `GameSubmission.get_name_stats()` called directly
+- the `/stats` route (Flask test client, in-process - no HTTP overhead)
+- the `/submit` route
+- `EXPLAIN (ANALYZE, BUFFERS)` of every statement `get_name_stats` executes
+
+Names follow a Zipf distribution over a fixed number of distinct names
+(`--cardinality`, `--skew`), which is much closer to real name popularity than
+a uniform spread. Sizes are cumulative: the table grows from one size to the
+next, so a 10^5..10^8 sweep only loads 10^8 rows once.
+
+Usage:
+    python benchmarks/query_bench.py --sizes 100000,1000000,10000000 --cardinality 5000
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pg8000.dbapi
+
+from results import summarize, write_result
+from stack import BACKEND_DIR, DB_NAME, DB_PASSWORD, DB_USER, PostgresContainer, wait_for_port
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_ROWS = 100_000
+
+
+def connect(args, autocommit=False):
+    """Plain pg8000 connection used for seeding and EXPLAIN."""
+    conn = pg8000.dbapi.connect(user=DB_USER, password=DB_PASSWORD, host=args.db_host,
+                                port=args.db_port, database=DB_NAME)
+    conn.autocommit = autocommit
+    return conn
+
+
+def synthetic_rows(count, cardinality, skew, start_time, seconds_per_row):
+    """
+    Yields COPY (csv) chunks of `count` synthetic submissions.
+
+    Names are already normalized the way the app stores them (`.strip().title()`)
+    and timestamps increase with the id, like real traffic.
+    """
+    names = [f"player{rank}".title() for rank in range(1, cardinality + 1)]
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, cardinality + 1):
+        total += 1 / (rank ** skew)
+        cum_weights.append(total)
+
+    # Formatting a timestamp per row is the slowest part, so every chunk shares a
+    # handful of evenly spaced timestamps
+    timestamps_per_chunk = 100
+    emitted = 0
+    while emitted < count:
+        rows = min(COPY_CHUNK_ROWS, count - emitted)
+        chunk_names = random.choices(names, cum_weights=cum_weights, k=rows)
+        per_timestamp = max(1, rows // timestamps_per_chunk)
+        lines = []
+        for offset in range(0, rows, per_timestamp):
+            submitted_at = start_time + timedelta(seconds=(emitted + offset) * seconds_per_row)
+            stamp = submitted_at.strftime('%Y-%m-%d %H:%M:%S')
+            lines.extend(f"{name},{stamp}\n" for name in chunk_names[offset:offset + per_timestamp])
+        emitted += rows
+        yield ''.join(lines)
+
+
+def seed_to(args, target_rows):
+    """Grows game_submissions to `target_rows` rows; returns the load time in seconds."""
+    conn = connect(args, autocommit=True)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT count(*) FROM game_submissions")
+        current = cursor.fetchone()[0]
+        missing = target_rows - current
+        if missing <= 0:
+            logger.info("Table already has %d rows (target %d)", current, target_rows)
+            return 0.0
+
+        logger.info("Loading %d rows (%d -> %d)", missing, current, target_rows)
+        # Spread all rows of the largest size over --days, ending now
+        seconds_per_row = args.days * 86400 / max(args.sizes)
+        start_time = datetime.utcnow() - timedelta(days=args.days) + timedelta(seconds=current * seconds_per_row)
+
+        started = time.perf_counter()
+        cursor.execute(
+            "COPY game_submissions (name, submitted_at) FROM STDIN WITH (FORMAT csv)",
+            stream=synthetic_rows(missing, args.cardinality, args.skew, start_time, seconds_per_row),
+        )
+        # Fresh statistics, otherwise the planner works with the previous size's numbers
+        cursor.execute("VACUUM ANALYZE game_submissions")
+        elapsed = time.perf_counter() - started
+        logger.info("Loaded %d rows in %.1fs (%.0f rows/s)", missing, elapsed, missing / elapsed)
+        return elapsed
+    finally:
+        conn.close()
+
+
+def explain_statements(args, statements):
+    """Runs EXPLAIN (ANALYZE, BUFFERS) for every captured (statement, parameters)."""
+    conn = connect(args)
+    plans = []
+    try:
+        cursor = conn.cursor()
+        for statement, parameters in statements:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters or None)
+            plans.append({
+                'statement': ' '.join(statement.split()),
+                'plan': [row[0] for row in cursor.fetchall()],
+            })
+        conn.rollback()
+    finally:
+        conn.close()
+    return plans
+
+
+def time_calls(func, repeat):
+    """Calls `func` `repeat` times, returns the latency summary."""
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
+
+
+def load_backend(args):
+    """Imports the backend app configured for the benchmark database."""
+    os.environ.update({
+        'ENVIRONMENT': 'development',
+        'DB_HOST': args.db_host,
+        'DB_PORT': str(args.db_port),
+        'DB_NAME': DB_NAME,
+        'DB_USER': DB_USER,
+        'DB_PASSWORD': DB_PASSWORD,
+    })
+    os.environ.pop('INSTANCE_CONNECTION_NAME', None)
+    sys.path.insert(0, BACKEND_DIR)
+    # pylint: disable=import-outside-toplevel,import-error
+    from src.main import app
+    from models import db, GameSubmission
+    return app, db, GameSubmission
+
+
+def benchmark_size(args, size, app, db, model):
+    """Measures everything at the current table size."""
+    # pylint: disable=import-outside-toplevel
+    from sqlalchemy import event
+
+    client = app.test_client()
+    result = {'rows': size}
+
+    with app.app_context():
+        engine = db.engine
+
+        # Warm up the pool and the Postgres buffer cache before measuring
+        model.get_name_stats()
+        db.session.rollback()
+
+        def stats_query():
+            model.get_name_stats()
+            db.session.rollback()
+
+        result['get_name_stats'] = time_calls(stats_query, args.repeat)
+
+        # Capture the statements get_name_stats really runs, then EXPLAIN them
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            # pylint: disable=unused-argument,too-many-arguments
+            statements.append((statement, parameters))
+
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            model.get_name_stats()
+            db.session.rollback()
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+        result['explain'] = explain_statements(args, statements)
+
+    stats_errors = []
+
+    def stats_route():
+        response = client.get('/stats')
+        payload = response.get_json()
+        # /stats answers 200 with mock data when the query fails - that is an error here
+        if response.status_code != 200 or 'database_error' in payload:
+            stats_errors.append(payload.get('database_error', response.status_code))
+
+    result['stats_route'] = time_calls(stats_route, args.repeat)
+    result['stats_route']['errors'] = len(stats_errors)
+    if stats_errors:
+        result['stats_route']['first_error'] = str(stats_errors[0])
+
+    submit_errors = []
+
+    def submit_route():
+        response = client.post('/submit', json={'name': f"bench{random.randint(1, args.cardinality)}"})
+        if response.status_code != 201:
+            submit_errors.append(response.status_code)
+
+    result['submit_route'] = time_calls(submit_route, args.submit_requests)
+    result['submit_route']['errors'] = len(submit_errors)
+    return result
+
+
+def parse_args():
+    """Command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100000,1000000,10000000',
+                        type=lambda value: sorted(int(size) for size in value.split(',')),
+                        help="Comma separated table sizes (rows) to measure at")
+    parser.add_argument('--cardinality', type=int, default=5000, help="Number of distinct names")
+    parser.add_argument('--skew', type=float, default=1.1, help="Zipf exponent of the name popularity (0 = uniform)")
+    parser.add_argument('--days', type=int, default=365, help="Time span covered by the synthetic submissions")
+    parser.add_argument('--repeat', type=int, default=10, help="Measurements per query/route and size")
+    parser.add_argument('--submit-requests', type=int, default=200, help="/submit calls per size")
+    parser.add_argument('--reset', action='store_true', help="Truncate game_submissions before seeding")
+    parser.add_argument('--output', default=None, help="Result file (default: results/query-<timestamp>.json)")
+    parser.add_argument('--no-start-db', action='store_true', help="Use an already running Postgres")
+    parser.add_argument('--db-host', default='localhost')
+    parser.add_argument('--db-port', type=int, default=5432)
+    return parser.parse_args()
+
+
+def main():
+    """Runs the benchmark."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args()
+
+    container = None if args.no_start_db else PostgresContainer(port=args.db_port)
+    if container:
+        container.start()
+    try:
+        wait_for_port(args.db_host, args.db_port)
+        app, db, model = load_backend(args)
+
+        # Same as calling the /migrate endpoint
+        app.test_client().post('/migrate').get_json()
+        if args.reset:
+            conn = connect(args, autocommit=True)
+            conn.cursor().execute("TRUNCATE game_submissions RESTART IDENTITY")
+            conn.close()
+
+        sizes = []
+        for size in args.sizes:
+            load_seconds = seed_to(args, size)
+            logger.info("Measuring at %d rows", size)
+            result = benchmark_size(args, size, app, db, model)
+            result['load_seconds'] = round(load_seconds, 2)
+            sizes.append(result)
+
+            print(f"\n=== {size:,} rows ===")
+            for key in ('get_name_stats', 'stats_route', 'submit_route'):
+                stats = result[key]
+                print(f"{key}: p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, max {stats['max_ms']} ms")
+            for explained in result['explain']:
+                print(f"\n{explained['statement']}")
+                print('\n'.join(f"  {line}" for line in explained['plan']))
+    finally:
+        if container:
+            container.stop()
+
+    output = args.output or f"results/query-{datetime.now():%Y%m%d-%H%M%S}.json"
+    write_result(output, 'query_bench', vars(args), {'sizes': sizes})
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
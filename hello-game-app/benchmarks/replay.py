@@ -0,0 +1,321 @@
+"""Production traffic capture -> trace -> time-scaled replay.
+
+Two steps:
+
+1. `convert` turns what production recorded into a compact trace file:
+   - gunicorn access logs (`--access-log frontend=frontend.log`). The default
+     format has second resolution and no names; when the Makefile format with a
+     trailing `%(M)s` is used, the original request duration is kept as well.
+   - structured captures written by traffic_capture.py when TRAFFIC_CAPTURE_FILE
+     is set (`--capture capture.jsonl`) - millisecond timing, durations and names.
+
+2. `replay` sends the trace to a running stack (or starts the local one) at
+   1x/10x/100x... speed, keeping the inter-arrival timing (divided by the speed),
+   the query strings and the submitted names, and reports per endpoint:
+   - client latency, from the scheduled start (includes network and queueing
+     in the replayer) - what a user would have seen
+   - server time, from the `Server-Timing` header the services send with
+     SERVER_TIMING=true (the local stack sets it), and its ratio to the
+     original duration, which is server time as well
+
+The trace is gzipped JSON lines: a header with the name table, then one
+`[offset_ms, service, method, path, status, duration_ms, name_index]` per request.
+
+Usage:
+    python replay.py convert --access-log frontend=frontend-access.log --output trace.jsonl.gz
+    python replay.py convert --capture frontend-capture.jsonl --capture backend-capture.jsonl -o trace.jsonl.gz
+    python replay.py replay trace.jsonl.gz --speed 10 --local-stack
+    python replay.py replay trace.jsonl.gz --speed 1 --frontend-url http://localhost:8080 --backend-url http://localhost:8081
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from results import summarize, write_result
+from stack import LocalStack
+
+logger = logging.getLogger(__name__)
+
+TRACE_VERSION = 1
+
+# Default gunicorn access log format, optionally followed by the request duration in ms (%(M)s).
+# Anything in front of the host (e.g. a log collector timestamp) is ignored.
+ACCESS_LOG_PATTERN = re.compile(
+    r'(?P<host>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<target>\S+) [^"]*" '
+    r'(?P<status>\d{3}) \S+ "[^"]*" "[^"]*"(?: (?P<duration_ms>\d+))?\s*$'
+)
+
+# Server time the services report with SERVER_TIMING=true
+SERVER_TIMING_PATTERN = re.compile(r'\bapp;dur=([\d.]+)')
+
+# Used for replayed /play and /submit requests when the source did not record names
+FALLBACK_NAMES = ['Alex', 'Sarah', 'Mike', 'Emma', 'John', 'Lisa']
+
+
+# --- Convert ---
+def parse_access_log(path, service):
+    """Yields request records from a gunicorn access log."""
+    per_second = defaultdict(list)
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = ACCESS_LOG_PATTERN.search(line)
+            if not match:
+                continue
+            arrived = datetime.strptime(match['time'], '%d/%b/%Y:%H:%M:%S %z').timestamp()
+            duration = match['duration_ms']
+            per_second[arrived].append({
+                'service': service,
+                'method': match['method'],
+                'path': match['target'],
+                'status': int(match['status']),
+                'duration_ms': float(duration) if duration is not None else None,
+                'name': None,
+            })
+
+    # Access logs only have second resolution - spread each second's requests evenly
+    for second, records in per_second.items():
+        for index, record in enumerate(records):
+            record['ts'] = second + index / len(records)
+            yield record
+
+
+def parse_capture(path):
+    """Yields request records from a traffic_capture.py file."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield {
+                'service': record['service'],
+                'ts': record['ts'],
+                'method': record['method'],
+                'path': record.get('target', record['path']),
+                'status': record['status'],
+                'duration_ms': record.get('duration_ms'),
+                'name': record.get('name'),
+            }
+
+
+def convert(args):
+    """Builds a trace file from access logs and/or captures."""
+    records = []
+    for spec in args.access_log:
+        service, _, path = spec.partition('=')
+        records.extend(parse_access_log(path, service))
+    for path in args.capture:
+        records.extend(parse_capture(path))
+    if not records:
+        raise SystemExit("No requests found in the given sources")
+
+    records.sort(key=lambda record: record['ts'])
+    start = records[0]['ts']
+
+    with gzip.open(args.output, 'wt', encoding='utf-8') as f:
+        name_table = sorted({record['name'] for record in records if record['name']})
+        names = {name: index for index, name in enumerate(name_table)}
+        f.write(json.dumps({'version': TRACE_VERSION, 'start': start, 'names': name_table}) + '\n')
+        for record in records:
+            f.write(json.dumps([
+                round((record['ts'] - start) * 1000, 3),
+                record['service'],
+                record['method'],
+                record['path'],
+                record['status'],
+                record['duration_ms'],
+                names.get(record['name'], -1),
+            ], separators=(',', ':')) + '\n')
+
+    duration = records[-1]['ts'] - start
+    print(f"Wrote {len(records)} requests spanning {duration:.1f}s "
+          f"({len(names)} distinct names) to {args.output}")
+
+
+# --- Replay ---
+def load_trace(path):
+    """Returns (header, entries) of a trace file."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('version') != TRACE_VERSION:
+            raise SystemExit(f"Unsupported trace version: {header.get('version')}")
+        entries = [json.loads(line) for line in f if line.strip()]
+    return header, entries
+
+
+def replay(args):
+    """Replays a trace and reports latency divergence per endpoint."""
+    header, entries = load_trace(args.trace)
+    names = header['names'] or FALLBACK_NAMES
+    logger.info("Replaying %d requests at %gx speed", len(entries), args.speed)
+
+    if args.local_stack:
+        with LocalStack(log_dir=args.log_dir) as stack:
+            report = run_replay(entries, names, stack.frontend_url, stack.backend_url, args)
+    else:
+        report = run_replay(entries, names, args.frontend_url, args.backend_url, args)
+
+    print_report(report)
+    output = args.output or f"results/replay-{datetime.now():%Y%m%d-%H%M%S}.json"
+    write_result(output, 'replay', vars(args), report)
+    print(f"\nResults written to {output}")
+
+
+def run_replay(entries, names, frontend_url, backend_url, args):
+    """Sends every trace entry at its (scaled) offset; returns the report."""
+    # pylint: disable=too-many-locals
+    base_urls = {'frontend': frontend_url, 'backend': backend_url}
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=args.connections)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    original = defaultdict(list)
+    replayed = defaultdict(list)
+    replayed_server = defaultdict(list)
+    status_mismatches = defaultdict(int)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    max_lag = 0.0
+
+    def send(entry, intended_start):
+        _, service, method, target, status, duration_ms, name_index = entry
+        path = target.split('?')[0]
+        key = f"{service} {method} {path}"
+        name = names[name_index] if name_index >= 0 else random.choice(names)
+        url = f"{base_urls[service]}{target}"
+        server_timing = None
+        try:
+            if method == 'POST' and path == '/play':
+                response = session.post(url, data={'name': name}, allow_redirects=False, timeout=args.timeout)
+            elif method == 'POST' and path == '/submit':
+                response = session.post(url, json={'name': name}, timeout=args.timeout)
+            else:
+                response = session.request(method, url, allow_redirects=False, timeout=args.timeout)
+            replayed_status = response.status_code
+            server_timing = SERVER_TIMING_PATTERN.search(response.headers.get('Server-Timing', ''))
+        except requests.RequestException:
+            replayed_status = None
+        latency = time.monotonic() - intended_start
+
+        with lock:
+            if replayed_status is None:
+                errors[key] += 1
+                return
+            replayed[key].append(latency)
+            if server_timing:
+                replayed_server[key].append(float(server_timing[1]) / 1000)
+            if duration_ms is not None:
+                original[key].append(duration_ms / 1000)
+            if replayed_status != status:
+                status_mismatches[key] += 1
+
+    skipped = 0
+    with ThreadPoolExecutor(max_workers=args.connections) as executor:
+        started = time.monotonic()
+        for entry in entries:
+            if not base_urls.get(entry[1]):
+                skipped += 1
+                continue
+            intended_start = started + entry[0] / 1000 / args.speed
+            lag = time.monotonic() - intended_start
+            if lag < 0:
+                time.sleep(-lag)
+            else:
+                max_lag = max(max_lag, lag)
+            executor.submit(send, entry, intended_start)
+        elapsed = time.monotonic() - started
+
+    endpoints = {}
+    for key in sorted(set(replayed) | set(errors)):
+        server_stats = summarize(replayed_server[key])
+        original_stats = summarize(original[key])
+        # Only server time against server time - client latency also has network and queueing in it
+        divergence = {}
+        for pct in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if original_stats['count'] and server_stats['count'] and original_stats[pct]:
+                divergence[pct] = round(server_stats[pct] / original_stats[pct], 2)
+        endpoints[key] = {
+            'original': original_stats,
+            'replayed': summarize(replayed[key]),
+            'replayed_server': server_stats,
+            'ratio': divergence,
+            'status_mismatches': status_mismatches[key],
+            'errors': errors[key],
+        }
+
+    return {
+        'requests': len(entries) - skipped,
+        'skipped': skipped,
+        'elapsed_seconds': round(elapsed, 2),
+        'max_schedule_lag_ms': round(max_lag * 1000, 1),
+        'endpoints': endpoints,
+    }
+
+
+def print_report(report):
+    """Prints the divergence table."""
+    print(f"\n=== Replay: {report['requests']} requests in {report['elapsed_seconds']}s "
+          f"(skipped {report['skipped']}, max schedule lag {report['max_schedule_lag_ms']} ms) ===")
+    for key, stats in report['endpoints'].items():
+        replayed, server, original = stats['replayed'], stats['replayed_server'], stats['original']
+        line = f"{key}: client p50/p95/p99 {replayed.get('p50_ms')}/{replayed.get('p95_ms')}/{replayed.get('p99_ms')} ms"
+        if server['count']:
+            line += f", server {server['p50_ms']}/{server['p95_ms']}/{server['p99_ms']} ms"
+        if original['count']:
+            line += f" vs original server {original['p50_ms']}/{original['p95_ms']}/{original['p99_ms']} ms"
+        if stats['ratio']:
+            line += f" (p95 x{stats['ratio'].get('p95_ms')})"
+        if stats['status_mismatches'] or stats['errors']:
+            line += f" status mismatches: {stats['status_mismatches']}, errors: {stats['errors']}"
+        print(line)
+
+
+def parse_args():
+    """Command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = commands.add_parser('convert', help="Build a trace from access logs and/or captures")
+    convert_parser.add_argument('--access-log', action='append', default=[], metavar='SERVICE=PATH',
+                                help="gunicorn access log, e.g. frontend=frontend.log (repeatable)")
+    convert_parser.add_argument('--capture', action='append', default=[], metavar='PATH',
+                                help="TRAFFIC_CAPTURE_FILE output (repeatable)")
+    convert_parser.add_argument('-o', '--output', default='trace.jsonl.gz')
+
+    replay_parser = commands.add_parser('replay', help="Replay a trace")
+    replay_parser.add_argument('trace')
+    replay_parser.add_argument('--speed', type=float, default=1.0, help="Time compression factor (10 = 10x faster)")
+    replay_parser.add_argument('--local-stack', action='store_true', help="Start the local stack (see stack.py)")
+    replay_parser.add_argument('--frontend-url', default=None)
+    replay_parser.add_argument('--backend-url', default=None)
+    replay_parser.add_argument('--connections', type=int, default=64, help="Max concurrent requests")
+    replay_parser.add_argument('--timeout', type=float, default=30)
+    replay_parser.add_argument('--output', default=None, help="Result file (default: results/replay-<timestamp>.json)")
+    replay_parser.add_argument('--log-dir', default='bench-logs')
+    return parser.parse_args()
+
+
+def main():
+    """Entry point."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    if args.command == 'convert':
+        convert(args)
+    else:
+        replay(args)
+
+
+if __name__ == '__main__':
+    main()
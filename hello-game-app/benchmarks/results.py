@@ -0,0 +1,70 @@
+"""Latency summaries and machine-readable result files shared by the benchmarks."""
+
+import json
+import math
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (None for an empty list)."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(values):
+    """Summarizes latencies (in seconds) as milliseconds."""
+    ordered = sorted(values)
+    if not ordered:
+        return {'count': 0}
+
+    def ms(value):
+        return round(value * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'min_ms': ms(ordered[0]),
+        'mean_ms': ms(sum(ordered) / len(ordered)),
+        'p50_ms': ms(percentile(ordered, 50)),
+        'p95_ms': ms(percentile(ordered, 95)),
+        'p99_ms': ms(percentile(ordered, 99)),
+        'max_ms': ms(ordered[-1]),
+    }
+
+
+def git_commit():
+    """Current commit of the repository, so runs can be compared across commits."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(__file__), check=True, capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_result(path, benchmark, config, results):
+    """Writes a benchmark result file (JSON) and returns the written document."""
+    document = {
+        'benchmark': benchmark,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'host': {
+            'hostname': platform.node(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': config,
+        'results': results,
+    }
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+    return document
@@ -0,0 +1,315 @@
+"""Local Hello Game stack used by the benchmarks.
+
+Starts (and tears down) every component of the pipeline on the local machine:
+- a Postgres container (or an already running Postgres instance)
+- the Pub/Sub emulator (with the topic and a pull subscription)
+- hello-function, driven by a local pull subscriber (function_runner.py)
+- hello-backend and hello-frontend under gunicorn, the same way `make run` does
+
+The frontend development config has the backend URL and the emulator address
+hard-coded, so the default ports below mirror it.
+"""
+
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BACKEND_DIR = os.path.join(APP_DIR, 'hello-backend')
+FRONTEND_DIR = os.path.join(APP_DIR, 'hello-frontend')
+FUNCTION_DIR = os.path.join(APP_DIR, 'hello-function')
+
+# Values from hello-frontend/src/config.py (DevelopmentConfig)
+PROJECT_ID = 'hello-game-local'
+TOPIC_ID = 'hello-game-names'
+SUBSCRIPTION_ID = 'hello-game-names-bench'
+EMULATOR_HOST = 'localhost:8085'
+FRONTEND_PORT = 8080
+BACKEND_PORT = 8081
+
+# Defaults from hello-backend/src/config.py
+DB_NAME = 'hello_game'
+DB_USER = 'hello_user'
+DB_PASSWORD = 'hello_password'
+
+POSTGRES_IMAGE = 'postgres:17'  # Same major version as the Cloud SQL instance
+POSTGRES_CONTAINER = 'hello-game-bench-db'
+
+
+def wait_for_port(host, port, timeout=60.0):
+    """Blocks until a TCP port accepts connections."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"{host}:{port} did not open within {timeout:.0f}s")
+
+
+def wait_for_http(url, timeout=60.0):
+    """Blocks until a URL answers with a non-5xx status."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=2).status_code < 500:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} did not become ready within {timeout:.0f}s")
+
+
+def backend_command(port=BACKEND_PORT, workers=1, threads=1):
+    """gunicorn command line of hello-backend (gthread workers when threads > 1)."""
+    args = [sys.executable, '-m', 'gunicorn', '-b', f"0.0.0.0:{port}", '--workers', str(workers)]
+    if threads > 1:
+        args += ['--worker-class', 'gthread', '--threads', str(threads)]
+    return args + ['--log-level', 'info', '--access-logfile', '-', '--error-logfile', '-', 'src.main:app']
+
+
+class PostgresContainer:
+    """A throwaway Postgres container (removed again on `stop`)."""
+
+    def __init__(self, port=5432, db_name=DB_NAME, db_user=DB_USER, db_password=DB_PASSWORD):
+        self.port = port
+        self.db_name = db_name
+        self.db_user = db_user
+        self.db_password = db_password
+        self._started = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        """Starts the container and waits until Postgres accepts queries."""
+        if not shutil.which('docker'):
+            raise RuntimeError("docker is required to start Postgres (or pass --no-start-db)")
+
+        subprocess.run(['docker', 'rm', '-f', POSTGRES_CONTAINER], check=False, capture_output=True)
+        subprocess.run([
+            'docker', 'run', '-d', '--rm', '--name', POSTGRES_CONTAINER,
+            '-p', f"{self.port}:5432",
+            '-e', f"POSTGRES_DB={self.db_name}",
+            '-e', f"POSTGRES_USER={self.db_user}",
+            '-e', f"POSTGRES_PASSWORD={self.db_password}",
+            POSTGRES_IMAGE,
+        ], check=True, capture_output=True)
+        self._started = True
+
+        # The port opens before Postgres accepts queries, so wait for pg_isready as well
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            ready = subprocess.run(
+                ['docker', 'exec', POSTGRES_CONTAINER, 'pg_isready', '-U', self.db_user],
+                check=False, capture_output=True,
+            )
+            if ready.returncode == 0:
+                return
+            time.sleep(0.5)
+        raise TimeoutError("Postgres container did not become ready")
+
+    def stop(self):
+        """Removes the container (and its data)."""
+        if self._started:
+            subprocess.run(['docker', 'rm', '-f', POSTGRES_CONTAINER], check=False, capture_output=True)
+            self._started = False
+
+
+class LocalStack:
+    """
+    Runs the whole Hello Game pipeline locally.
+
+    Use it as a context manager so every process is stopped on exit:
+
+        with LocalStack() as stack:
+            requests.post(f"{stack.frontend_url}/play", data={'name': 'Alice'})
+
+    :param db_host: Postgres host. When `start_db` is False it must already be running.
+    :param db_port: Postgres port.
+    :param start_db: Start a throwaway Postgres container with docker.
+    :param backend_workers: gunicorn workers for hello-backend.
+    :param backend_threads: gunicorn gthread threads per backend worker (1 = sync workers).
+    :param frontend_threads: gunicorn gthread threads for hello-frontend.
+    :param function_concurrency: Messages processed concurrently by the function runner.
+    :param log_dir: Where process logs are written (they are too noisy for the console).
+    :param env: Extra environment variables passed to every service.
+    :param db_proxy: Optional db_proxy.DbProxy (not started yet) in front of Postgres;
+        the backend and the function connect through it.
+    """
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, db_host='localhost', db_port=5432, start_db=True,
+                 backend_workers=1, frontend_threads=4, function_concurrency=10,
+                 log_dir='bench-logs', env=None, backend_threads=1, db_proxy=None):
+        self.db_host = db_host
+        self.db_port = db_port
+        self.start_db = start_db
+        self.db_proxy = db_proxy
+        self.backend_workers = backend_workers
+        self.backend_threads = backend_threads
+        self.frontend_threads = frontend_threads
+        self.function_concurrency = function_concurrency
+        self.log_dir = log_dir
+        self.extra_env = env or {}
+
+        self.db_name = DB_NAME
+        self.db_user = DB_USER
+        self.db_password = DB_PASSWORD
+
+        self.frontend_url = f"http://localhost:{FRONTEND_PORT}"
+        self.backend_url = f"http://localhost:{BACKEND_PORT}"
+
+        self._processes = []
+        self._log_files = []
+        self._db_container = PostgresContainer(
+            self.db_port, self.db_name, self.db_user, self.db_password
+        ) if start_db else None
+
+    # --- Lifecycle ---
+    def __enter__(self):
+        try:
+            self.start()
+        except Exception:
+            self.stop()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        """Starts every component and waits until the pipeline is ready."""
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        if self._db_container:
+            self._db_container.start()
+        wait_for_port(self.db_host, self.db_port)
+        if self.db_proxy:
+            self.db_proxy.start()
+
+        self._start_emulator()
+        self._create_topic_and_subscription()
+
+        self._start_backend()
+        wait_for_http(f"{self.backend_url}/health")
+        requests.post(f"{self.backend_url}/migrate", timeout=30).raise_for_status()
+
+        self._start_function_runner()
+        self._start_frontend()
+        wait_for_http(f"{self.frontend_url}/")
+        logger.info("Local stack is up (frontend: %s, backend: %s)", self.frontend_url, self.backend_url)
+
+    def stop(self):
+        """Stops every process started by this stack (in reverse order)."""
+        for name, process in reversed(self._processes):
+            if process.poll() is None:
+                logger.info("Stopping %s", name)
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        self._processes.clear()
+
+        for log_file in self._log_files:
+            log_file.close()
+        self._log_files.clear()
+
+        if self.db_proxy:
+            self.db_proxy.stop()
+        if self._db_container:
+            self._db_container.stop()
+
+    # --- Helpers ---
+    def service_env(self, **overrides):
+        """Environment shared by the backend, frontend and function runner."""
+        env = dict(os.environ)
+        db_host, db_port = self.db_host, self.db_port
+        if self.db_proxy:
+            db_host, db_port = self.db_proxy.listen_host, self.db_proxy.port
+        env.update({
+            'ENVIRONMENT': 'development',
+            'PUBSUB_EMULATOR_HOST': EMULATOR_HOST,
+            'DB_HOST': db_host,
+            'DB_PORT': str(db_port),
+            'DB_NAME': self.db_name,
+            'DB_USER': self.db_user,
+            'DB_PASSWORD': self.db_password,
+            'INSTANCE_CONNECTION_NAME': '',
+            'SERVER_TIMING': 'true',
+            'PYTHONUNBUFFERED': '1',
+        })
+        env.update(self.extra_env)
+        env.update(overrides)
+        return env
+
+    def _spawn(self, name, args, cwd, env=None):
+        log_path = os.path.join(self.log_dir, f"{name}.log")
+        log_file = open(log_path, 'w', encoding='utf-8')  # pylint: disable=consider-using-with
+        self._log_files.append(log_file)
+
+        logger.info("Starting %s (logs: %s)", name, log_path)
+        process = subprocess.Popen(  # pylint: disable=consider-using-with
+            args, cwd=cwd, env=env or self.service_env(),
+            stdout=log_file, stderr=subprocess.STDOUT,
+        )
+        self._processes.append((name, process))
+        return process
+
+    def _start_emulator(self):
+        if not shutil.which('gcloud'):
+            raise RuntimeError("gcloud (with the pubsub-emulator component) is required")
+
+        self._spawn('pubsub-emulator', [
+            'gcloud', 'beta', 'emulators', 'pubsub', 'start',
+            f"--host-port={EMULATOR_HOST}", f"--project={PROJECT_ID}",
+        ], cwd=APP_DIR)
+        host, port = EMULATOR_HOST.split(':')
+        wait_for_port(host, int(port))
+
+    def _create_topic_and_subscription(self):
+        # Imported here so the emulator host is picked up by the clients
+        os.environ['PUBSUB_EMULATOR_HOST'] = EMULATOR_HOST
+        from google.cloud import pubsub_v1  # pylint: disable=import-outside-toplevel
+
+        publisher = pubsub_v1.PublisherClient()
+        subscriber = pubsub_v1.SubscriberClient()
+        topic_path = publisher.topic_path(PROJECT_ID, TOPIC_ID)
+        subscription_path = subscriber.subscription_path(PROJECT_ID, SUBSCRIPTION_ID)
+
+        publisher.create_topic(request={'name': topic_path})
+        subscriber.create_subscription(request={'name': subscription_path, 'topic': topic_path})
+        subscriber.close()
+
+    def _start_backend(self):
+        self._spawn('hello-backend', backend_command(BACKEND_PORT, self.backend_workers, self.backend_threads),
+                    cwd=BACKEND_DIR)
+
+    def _start_frontend(self):
+        self._spawn('hello-frontend', [
+            sys.executable, '-m', 'gunicorn', '-b', f"0.0.0.0:{FRONTEND_PORT}",
+            '--worker-class', 'gthread', '--threads', str(self.frontend_threads), '--timeout', '60',
+            '--log-level', 'info', '--access-logfile', '-', '--error-logfile', '-',
+            'src.main:app',
+        ], cwd=FRONTEND_DIR)
+
+    def _start_function_runner(self):
+        self._spawn('hello-function', [
+            sys.executable, os.path.join(os.path.dirname(__file__), 'function_runner.py'),
+            '--project', PROJECT_ID, '--subscription', SUBSCRIPTION_ID,
+            '--concurrency', str(self.function_concurrency),
+        ], cwd=FUNCTION_DIR)
@@ -0,0 +1,187 @@
+"""Name popularity distributions for /stats/analytics.
+
+The (name, count) aggregate is kept as NumPy columns - one entry per distinct
+name: submission count, name length and first letter. Every statistic is a
+handful of vectorized passes (bincount, percentile, argpartition) over these
+columns instead of a query or a Python loop per name:
+- name length histogram (names and players per length)
+- percentiles of the submission count per name
+- concentration: share of all players using the top N names
+- first letter breakdown
+
+The columns are refreshed incrementally in the background from the same load
+as the name index (see NameCountsFeed in name_index.py): new names are
+appended, counts of known names are added in place. Results are cached until the next refresh that
+changes the data, so most requests don't compute anything.
+"""
+
+import numpy as np
+
+from name_index import RefreshedAggregate
+
+# Percentiles of the per-name submission counts
+COUNT_PERCENTILES = (50, 75, 90, 99)
+
+# Largest `top` for the concentration metric
+ANALYTICS_MAX_TOP = 100
+
+
+class NameColumns:
+    """Per-name count, length and first letter in NumPy arrays with room to grow."""
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.names = []
+        self.positions = {}  # name -> row
+        self.letters = []
+        self.letter_ids = {}  # first letter -> index in letters
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.lengths = np.zeros(capacity, dtype=np.int32)
+        self.letter = np.zeros(capacity, dtype=np.int32)
+
+    def _reserve(self, size):
+        capacity = len(self.counts)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for column in ('counts', 'lengths', 'letter'):
+            old = getattr(self, column)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:self.size] = old[:self.size]
+            setattr(self, column, grown)
+
+    def _letter_id(self, name):
+        letter = name[:1].upper()
+        letter_id = self.letter_ids.get(letter)
+        if letter_id is None:
+            letter_id = self.letter_ids[letter] = len(self.letters)
+            self.letters.append(letter)
+        return letter_id
+
+    def add(self, rows):
+        """Adds [(name, count), ...]; names not seen before are appended."""
+        known_rows, known_added, new_names, new_counts = [], [], [], []
+        for name, count in rows:
+            row = self.positions.get(name)
+            if row is None:
+                new_names.append(name)
+                new_counts.append(count)
+            else:
+                known_rows.append(row)
+                known_added.append(count)
+
+        if known_rows:
+            # add.at, not +=, so a name listed twice is counted twice
+            np.add.at(self.counts, np.array(known_rows, dtype=np.intp), np.array(known_added, dtype=np.int64))
+
+        if new_names:
+            start, end = self.size, self.size + len(new_names)
+            self._reserve(end)
+            self.counts[start:end] = new_counts
+            self.lengths[start:end] = np.fromiter(map(len, new_names), dtype=np.int32, count=len(new_names))
+            self.letter[start:end] = np.fromiter(map(self._letter_id, new_names), dtype=np.int32,
+                                                 count=len(new_names))
+            self.positions.update(zip(new_names, range(start, end)))
+            self.names.extend(new_names)
+            self.size = end
+
+
+def length_histogram(lengths, counts):
+    """Names and players per name length."""
+    names = np.bincount(lengths)
+    players = np.bincount(lengths, weights=counts)
+    return [
+        {'length': int(length), 'names': int(names[length]), 'players': int(players[length])}
+        for length in np.flatnonzero(names)
+    ]
+
+
+def count_percentiles(counts):
+    """Percentiles, mean and max of the submission count per name."""
+    values = np.percentile(counts, COUNT_PERCENTILES)
+    result = {f'p{pct}': round(float(value), 2) for pct, value in zip(COUNT_PERCENTILES, values)}
+    result.update(mean=round(float(counts.mean()), 2), max=int(counts.max()))
+    return result
+
+
+def concentration(names, counts, total, top):
+    """The `top` most popular names and the share of all players using them."""
+    top = min(top, len(counts))
+    rows = np.argpartition(counts, len(counts) - top)[len(counts) - top:]
+    rows = rows[np.argsort(-counts[rows], kind='stable')]
+    players = int(counts[rows].sum())
+    return {
+        'top': top,
+        'players': players,
+        'share': round(players / total, 4),
+        'names': [{'name': names[row], 'count': int(counts[row])} for row in rows],
+    }
+
+
+def letter_breakdown(letters, letter, counts, total):
+    """Names and players per first letter, most players first."""
+    names = np.bincount(letter, minlength=len(letters))
+    players = np.bincount(letter, weights=counts, minlength=len(letters))
+    return [
+        {'letter': letters[index], 'names': int(names[index]), 'players': int(players[index]),
+         'share': round(float(players[index]) / total, 4)}
+        for index in np.argsort(-players, kind='stable') if names[index]
+    ]
+
+
+class NameAnalytics(RefreshedAggregate):
+    """
+    NameColumns kept up to date by a NameCountsFeed; answers the /stats/analytics queries.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.columns = NameColumns()
+        self._results = {}  # top -> summary of the current data
+
+    # --- Refresh ---
+    def _build(self, rows):
+        columns = NameColumns(max(len(rows), 1024))
+        columns.add(rows)
+        return columns, int(columns.counts[:columns.size].sum())
+
+    def _install(self, state):
+        self.columns, self.total = state
+        self._results = {}
+
+    def _apply(self, rows):
+        if rows:
+            self.columns.add(rows)
+            self.total += sum(count for _, count in rows)
+            self._results = {}
+
+    # --- Queries ---
+    def summary(self, top=10):
+        """All distributions at once, computed from one consistent snapshot."""
+        with self._lock:
+            result = self._results.get(top)
+            if result is None:
+                result = self._results[top] = self._compute(top)
+            return result
+
+    def _compute(self, top):
+        """Computes the summary; called with `_lock` held."""
+        columns, total = self.columns, self.total
+        size = columns.size
+        result = {'total_players': total, 'unique_names': size}
+        if not size:
+            return result
+
+        counts = columns.counts[:size]
+        lengths = columns.lengths[:size]
+        result.update(
+            name_length={
+                'mean': round(float(np.dot(lengths, counts)) / total, 2),
+                'histogram': length_histogram(lengths, counts),
+            },
+            count_per_name=count_percentiles(counts),
+            concentration=concentration(columns.names, counts, total, top),
+            first_letters=letter_breakdown(columns.letters, columns.letter[:size], counts, total),
+        )
+        return result
@@ -24,6 +24,127 @@ class Config:
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Connection pool per worker; unset values keep the defaults of the connection mode below
+    DB_POOL_SIZE = os.getenv('DB_POOL_SIZE')
+    DB_MAX_OVERFLOW = os.getenv('DB_MAX_OVERFLOW')
+    DB_POOL_TIMEOUT = os.getenv('DB_POOL_TIMEOUT')
+    DB_POOL_RECYCLE = os.getenv('DB_POOL_RECYCLE')  # seconds
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'false').lower() == 'true'
+
+    # Pool sizing: 'fixed' uses the values above, 'auto' derives pool_size/max_overflow from the
+    # workers and threads and a connection budget shared by all instances, and adjusts how many
+    # connections are kept open at runtime based on checkout waits (see pool_stats.py)
+    DB_POOL_SIZING = os.getenv('DB_POOL_SIZING', 'fixed')
+    DB_CONNECTION_BUDGET = int(os.getenv('DB_CONNECTION_BUDGET', '20'))  # e.g. Cloud SQL max_connections minus headroom
+    DB_MAX_INSTANCES = int(os.getenv('DB_MAX_INSTANCES', '1'))  # Cloud Run max instances
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))  # gunicorn workers (gunicorn reads it as well)
+    GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', '1'))  # gunicorn --threads
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+    DB_POOL_TARGET_WAIT_MS = float(os.getenv('DB_POOL_TARGET_WAIT_MS', '10'))
+    DB_POOL_ADJUST_SECONDS = float(os.getenv('DB_POOL_ADJUST_SECONDS', '30'))
+
+    # Optional request capture for load testing (see traffic_capture.py)
+    TRAFFIC_CAPTURE_FILE = os.getenv('TRAFFIC_CAPTURE_FILE')
+    # Server-Timing header with the request duration, for replay.py (see traffic_capture.py)
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() == 'true'
+
+    # Tracing: none, console, file or otlp (see tracing.py)
+    TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none')
+    TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+
+    # On-demand request profiling (see profiling.py). Enabled by PROFILE_SECRET (signed
+    # X-Profile-Token header / _profile query parameter) and/or PROFILE_SAMPLE_RATE (1 in N).
+    PROFILE_SECRET = os.getenv('PROFILE_SECRET')
+    PROFILE_SAMPLE_RATE = int(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_MODE = os.getenv('PROFILE_MODE', 'cprofile')  # cprofile or sampling
+    PROFILE_SAMPLING_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLING_INTERVAL_MS', '5'))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/hello-game-profiles')
+    PROFILE_DIR_MAX_MB = int(os.getenv('PROFILE_DIR_MAX_MB', '100'))
+
+    # SQL statement timing (see query_stats.py)
+    QUERY_LOG_SIZE = int(os.getenv('QUERY_LOG_SIZE', '1000'))
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+    SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'false').lower() == 'true'
+
+    # Submission counts per name behind /stats/name/<name>, /names/search and /stats/analytics,
+    # loaded once for both in-memory aggregates (see NameCountsFeed in name_index.py)
+    NAME_INDEX_REFRESH_SECONDS = float(os.getenv('NAME_INDEX_REFRESH_SECONDS', '1'))
+    NAME_INDEX_FULL_REFRESH_SECONDS = float(os.getenv('NAME_INDEX_FULL_REFRESH_SECONDS', '3600'))
+    # Trailing ids scanned again on every refresh, for rows that commit out of id order
+    NAME_INDEX_REORDER_WINDOW = int(os.getenv('NAME_INDEX_REORDER_WINDOW', '2000'))
+
+    # /submit write mode: 'sync' commits every submission on its own, 'group' batches
+    # concurrent submissions into shared transactions (see group_commit.py); group mode needs
+    # gunicorn --worker-class gthread --threads N (and GUNICORN_THREADS=N), sync workers never group
+    SUBMIT_MODE = os.getenv('SUBMIT_MODE', 'sync')
+    GROUP_COMMIT_MAX_BATCH = int(os.getenv('GROUP_COMMIT_MAX_BATCH', '100'))
+    GROUP_COMMIT_MAX_WAIT_MS = float(os.getenv('GROUP_COMMIT_MAX_WAIT_MS', '5'))
+
+    # Per-route token bucket and concurrency limits (see admission.py), e.g.
+    # "/submit:rate=200,burst=400,concurrency=6;/stats:concurrency=2". Empty = no limits.
+    ADMISSION_LIMITS = os.getenv('ADMISSION_LIMITS', '')
+    ADMISSION_MAX_WAIT_MS = float(os.getenv('ADMISSION_MAX_WAIT_MS', '100'))
+
+    # How long every worker reuses the newest page of /submissions
+    SUBMISSIONS_CACHE_SECONDS = float(os.getenv('SUBMISSIONS_CACHE_SECONDS', '1'))
+
+    # Rows fetched and encoded at a time by /export
+    EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '10000'))
+    # Rows per /export response (0: no limit); the X-Export-Next-After-Id header continues the export
+    EXPORT_MAX_ROWS = int(os.getenv('EXPORT_MAX_ROWS', '1000000'))
+
+    # Protects the /debug/* endpoints (sent as the X-Debug-Token header).
+    # When not set, they are only available with DEBUG enabled.
+    DEBUG_TOKEN = os.getenv('DEBUG_TOKEN')
+
+    @staticmethod
+    def auto_pool_size():
+        """
+        Per-worker pool limits for DB_POOL_SIZING=auto.
+
+        Every worker gets an equal share of DB_CONNECTION_BUDGET, but never more
+        connections than its threads (plus background threads) can use at once.
+        """
+        workers = Config.DB_MAX_INSTANCES * Config.WEB_CONCURRENCY
+        share = max(1, Config.DB_CONNECTION_BUDGET // workers)
+        # The DB health check and the group commit writer query outside of requests
+        demand = Config.GUNICORN_THREADS + 1 + (Config.SUBMIT_MODE == 'group')
+        limit = min(share, demand)
+        if share < demand:
+            logger.warning("Connection budget %d allows %d connections per worker for %d threads; "
+                           "requests will wait for connections under full load",
+                           Config.DB_CONNECTION_BUDGET, share, Config.GUNICORN_THREADS)
+
+        pool_size = min(Config.GUNICORN_THREADS, limit)
+        logger.info("Auto pool sizing: pool_size=%d, max_overflow=%d (%d workers share %d connections)",
+                    pool_size, limit - pool_size, workers, Config.DB_CONNECTION_BUDGET)
+        return {'pool_size': pool_size, 'max_overflow': limit - pool_size}
+
+    @staticmethod
+    def pool_options(defaults):
+        """
+        Pool engine options: `defaults` overridden by the DB_POOL_* settings.
+
+        With DB_POOL_SIZING=auto, pool_size and max_overflow come from auto_pool_size().
+        """
+        options = dict(defaults)
+        if Config.DB_POOL_SIZING == 'auto':
+            options.update(Config.auto_pool_size())
+        elif Config.DB_POOL_SIZING == 'fixed':
+            if Config.DB_POOL_SIZE:
+                options['pool_size'] = int(Config.DB_POOL_SIZE)
+            if Config.DB_MAX_OVERFLOW:
+                options['max_overflow'] = int(Config.DB_MAX_OVERFLOW)
+        else:
+            raise ValueError(f"Unknown DB_POOL_SIZING: {Config.DB_POOL_SIZING}")
+        if Config.DB_POOL_TIMEOUT:
+            options['pool_timeout'] = float(Config.DB_POOL_TIMEOUT)
+        if Config.DB_POOL_RECYCLE:
+            options['pool_recycle'] = int(Config.DB_POOL_RECYCLE)
+        if Config.DB_POOL_PRE_PING:
+            options['pool_pre_ping'] = True
+        return options
+
     @staticmethod
     def get_connection_settings():
         """
@@ -53,9 +174,7 @@ class Config:
 
             engine_options = {
                 "creator": get_connection,
-                "pool_size": 5,
-                "max_overflow": 2,
-                "pool_timeout": 30,
+                **Config.pool_options({"pool_size": 5, "max_overflow": 2, "pool_timeout": 30}),
             }
 
             return sqlalchemy_uri, engine_options, connector
@@ -63,11 +182,11 @@ class Config:
         # --- Local development with classic password-based connection ---
         logger.info("Using classic database connection (username/password) for local development.")
         sqlalchemy_uri = (
-            f"postgresql://{Config.DB_USER}:{Config.DB_PASSWORD}"
+            f"postgresql+pg8000://{Config.DB_USER}:{Config.DB_PASSWORD}"
             f"@{Config.DB_HOST}:{Config.DB_PORT}/{Config.DB_NAME}"
         )
 
-        engine_options = {} # SQLAlchemy default options
+        engine_options = Config.pool_options({}) # SQLAlchemy defaults unless overridden
         connector = None    # No Cloud SQL Connector in local mode
 
         return sqlalchemy_uri, engine_options, connector
@@ -0,0 +1,154 @@
+"""Streaming export of the raw game_submissions rows.
+
+Rows are read with a server-side cursor (`stream_results`) in chunks of
+EXPORT_CHUNK_SIZE and encoded chunk by chunk, so memory use does not depend
+on the table size. Rows always come in id order: an interrupted export is
+resumed with `after_id=<last id received>`. A response holds at most
+EXPORT_MAX_ROWS rows, so it ends well within the gunicorn timeout; the
+X-Export-Next-After-Id header says where the next one starts.
+
+Formats: csv, ndjson and parquet (one row group per chunk; needs the
+optional pyarrow package). Any format can be gzipped on the fly.
+"""
+
+import csv
+import io
+import itertools
+import json
+import zlib
+
+from sqlalchemy import select
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+COLUMNS = ['id', 'name', 'submitted_at']
+
+
+def export_statement(table, since=None, after_id=0, up_to_id=None):
+    """SELECT of the rows to export, in id order."""
+    statement = select(table.c.id, table.c.name, table.c.submitted_at).where(table.c.id > after_id)
+    if up_to_id is not None:
+        statement = statement.where(table.c.id <= up_to_id)
+    if since is not None:
+        statement = statement.where(table.c.submitted_at >= since)
+    return statement.order_by(table.c.id)
+
+
+def page_end(session, table, max_rows, since=None, after_id=0):
+    """Id of the `max_rows`-th row to export, or None if there are no more rows than that."""
+    statement = select(table.c.id).where(table.c.id > after_id)
+    if since is not None:
+        statement = statement.where(table.c.submitted_at >= since)
+    ids = session.execute(statement.order_by(table.c.id).offset(max_rows - 1).limit(2)).scalars().all()
+    return ids[0] if len(ids) == 2 else None
+
+
+def encode_csv(rows):
+    """CSV lines of a chunk."""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerows((row_id, name, submitted_at.isoformat()) for row_id, name, submitted_at in rows)
+    return out.getvalue().encode('utf-8')
+
+
+def encode_ndjson(rows):
+    """One JSON object per row."""
+    return ''.join(
+        json.dumps({'id': row_id, 'name': name, 'submitted_at': submitted_at.isoformat()}) + '\n'
+        for row_id, name, submitted_at in rows
+    ).encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last call to take()."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        """Returns and forgets the buffered bytes."""
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def stream_parquet(chunks):
+    """Parquet file, written one row group per chunk."""
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel,import-error
+    import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel,import-error
+
+    schema = pa.schema([('id', pa.int64()), ('name', pa.string()), ('submitted_at', pa.timestamp('us'))])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in chunks:
+            ids, names, submitted = zip(*rows)
+            writer.write_table(pa.table([ids, names, submitted], schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+def check_format(fmt):
+    """Returns an error message if `fmt` can't be exported, else None."""
+    if fmt not in FORMATS:
+        return f"format must be one of: {', '.join(FORMATS)}"
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet  # pylint: disable=import-outside-toplevel,import-error,unused-import
+        except ImportError:
+            return "parquet export requires the pyarrow package"
+    return None
+
+
+def stream_export(engine, statement, fmt, chunk_size=10000, gzip=False):
+    """
+    Yields the encoded export, chunk by chunk.
+
+    The connection is held for the duration of the export and released when
+    the generator is closed (also if the client disconnects).
+    """
+    def chunks():
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(statement)
+            for partition in result.partitions():
+                yield partition
+
+    source = chunks()
+    if fmt == 'parquet':
+        encoded = stream_parquet(source)
+    elif fmt == 'csv':
+        header = (','.join(COLUMNS) + '\n').encode('utf-8')
+        encoded = itertools.chain([header], (encode_csv(rows) for rows in source))
+    else:
+        encoded = (encode_ndjson(rows) for rows in source)
+
+    try:
+        if not gzip:
+            yield from encoded
+            return
+
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+        for data in encoded:
+            compressed = compressor.compress(data)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    finally:
+        # Releases the connection right away when the client goes away mid-export
+        source.close()
+
@@ -0,0 +1,184 @@
+"""Group commit for /submit.
+
+With SUBMIT_MODE=group, /submit hands its name to a writer thread instead of
+committing on its own. The writer inserts up to GROUP_COMMIT_MAX_BATCH names
+in one transaction (one commit, one WAL flush) as soon as the batch is full or
+GROUP_COMMIT_MAX_WAIT_MS after its first name arrived, whichever comes first.
+A name that arrives alone is flushed right away; names queued while a flush
+is running form the next batch. Every request waits on its own future, so it
+still gets the persisted id and submitted_at - a request only returns once its
+row is committed. A request that gives up waiting is dropped from its batch
+unless the writer is already inserting it.
+
+Grouping needs concurrent requests in a worker: run gunicorn with
+`--worker-class gthread --threads N`. With sync workers (one request at a time)
+every batch has one name.
+
+If a batch fails, its names are retried one by one, so one bad name only fails
+its own request. Batch sizes and latencies are served by /debug/writes.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+
+from models import db
+from query_stats import TimingSummary
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitWriter:
+    """
+    Batches submissions from concurrent requests into shared transactions.
+
+    :param app: Flask app (the writer thread needs its app context).
+    :param insert_many: Callable(names) -> submissions, committing them in one transaction.
+    :param max_batch: Flush when this many names are waiting.
+    :param max_wait_ms: Flush at the latest this long after the first name of a batch arrived.
+    :param timeout: How long a request waits for its row before giving up (seconds).
+    """
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, app, insert_many, max_batch=100, max_wait_ms=5, timeout=10):
+        self.app = app
+        self.insert_many = insert_many
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout
+
+        self.batch_sizes = Counter()
+        self.flush_latency = TimingSummary()
+        self.request_latency = TimingSummary()
+        self.failed_batches = 0
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self):
+        # Started on first use, so the thread lives in the gunicorn worker and not in a pre-fork parent
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None:
+                atexit.register(self.stop)
+            elif self._thread.is_alive():
+                return
+            else:
+                logger.error("Group commit writer thread died, restarting it")
+            self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+            self._thread.start()
+            logger.info("Group commit writer started (max batch %d, max wait %.1f ms)",
+                        self.max_batch, self.max_wait * 1000)
+
+    def submit(self, name):
+        """Queues the name and waits until it is committed; returns the submission."""
+        self._ensure_started()
+        future = Future()
+        started = time.perf_counter()
+        self._queue.put((name, future))
+        try:
+            try:
+                return future.result(timeout=self.timeout)
+            except FuturesTimeoutError:
+                # Cancelled names are skipped by the writer; too late to cancel means it is inserting now
+                if future.cancel():
+                    raise FuturesTimeoutError(f"Name not committed within {self.timeout} s, dropped") from None
+                return future.result()
+        finally:
+            with self._stats_lock:
+                self.request_latency.add((time.perf_counter() - started) * 1000)
+
+    def stop(self):
+        """Flushes what is queued and stops the writer thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=self.timeout)
+
+    # --- Writer thread ---
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    # Only wait for more names when others arrived too, a lone name is flushed right away
+                    if len(batch) == 1:
+                        item = self._queue.get_nowait()
+                    else:
+                        item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                self._flush(batch)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Group commit of %d names failed: %s", len(batch), e)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _flush(self, batch):
+        # Skips the names whose request gave up waiting, the others can no longer be cancelled
+        batch = [(name, future) for name, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        started = time.perf_counter()
+        names = [name for name, _ in batch]
+        with self.app.app_context():
+            try:
+                results = self.insert_many(names)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Group commit of %d names failed, retrying them one by one: %s", len(batch), e)
+                with self._stats_lock:
+                    self.failed_batches += 1
+                self._flush_one_by_one(batch)
+            else:
+                for (_, future), submission in zip(batch, results):
+                    future.set_result(submission)
+
+        with self._stats_lock:
+            self.batch_sizes[len(batch)] += 1
+            self.flush_latency.add((time.perf_counter() - started) * 1000, len(batch))
+
+    def _flush_one_by_one(self, batch):
+        for name, future in batch:
+            try:
+                db.session.rollback()
+                future.set_result(self.insert_many([name])[0])
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                future.set_exception(e)
+
+    # --- Reporting ---
+    def summary(self):
+        """Batch size distribution, flush and request latency."""
+        with self._stats_lock:
+            batches = sum(self.batch_sizes.values())
+            rows = sum(size * count for size, count in self.batch_sizes.items())
+            return {
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000,
+                'queued': self._queue.qsize(),
+                'batches': batches,
+                'rows': rows,
+                'mean_batch_size': round(rows / batches, 2) if batches else None,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'failed_batches': self.failed_batches,
+                'flush_latency': self.flush_latency.to_dict(),
+                'request_latency': self.request_latency.to_dict(),
+            }
@@ -1,36 +1,49 @@
 """Main application file for Hello Game Backend."""
 
 import atexit
+import hmac
 import logging
 import os
 import sys
 import threading
 import time
+from datetime import datetime
 
-from flask import Flask, request
+from flask import Flask, Response, request
 from flask_cors import CORS
 from sqlalchemy import text
 
 # Add current directory to Python path for local imports
 sys.path.append(os.path.dirname(__file__))
 
+from admission import init_admission_control
+from analytics import ANALYTICS_MAX_TOP, NameAnalytics
 from config import Config, config
+import export
+from group_commit import GroupCommitWriter
+from log_setup import setup_logging
 from models import db, GameSubmission
+from name_index import SEARCH_MAX_LIMIT, NameCountsFeed, NameIndex
+from pool_stats import PoolSizer, PoolStats
+from profiling import init_profiling
+from query_stats import QueryStats
+from traffic_capture import init_traffic_capture
+from tracing import init_tracing, tracer
 
 
-def setup_logging():
-    """Setup logging configuration."""
-    log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+def submitted_name():
+    """Normalized name submitted with the current request (if any), for the traffic capture."""
+    if request.path != '/submit':
+        return None
+    data = request.get_json(silent=True) or {}
+    name = data.get('name')
+    return name.strip().title() if isinstance(name, str) and name.strip() else None
+
 
-    logging.basicConfig(
-        level=getattr(logging, log_level, logging.INFO),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
 def create_app(config_name='default'):
     """Application factory pattern."""
 
-    setup_logging()
+    setup_logging('hello-backend')
     logger = logging.getLogger(__name__)
     logger.info("Starting app in %s configuration.", config_name)
 
@@ -51,6 +64,18 @@ def create_app(config_name='default'):
 
     CORS(app)  # TODO: Enable CORS for specific origins in production
 
+    # Optional request capture and Server-Timing header for load testing
+    init_traffic_capture(app, 'backend', submitted_name)
+
+    # Request tracing (no-op unless TRACE_EXPORTER is set)
+    init_tracing(app, 'hello-backend')
+
+    # On-demand profiling (no-op unless PROFILE_SECRET or PROFILE_SAMPLE_RATE is set)
+    init_profiling(app)
+
+    # Load shedding: 429/503 with Retry-After instead of queueing on the DB pool
+    init_admission_control(app)
+
     # --- Close connector on app teardown (if used) ---
     def close_connector(exception=None):
         """Cloud SQL Connector cleanup function."""
@@ -100,6 +125,51 @@ def create_app(config_name='default'):
         engine = db.get_engine()
     start_db_connection_health_check(engine=engine)
 
+    # Pool checkout wait, connect and hold times, overflow and invalidations (see /debug/pool)
+    app.extensions['pool_stats'] = PoolStats(engine)
+
+    # Per-statement timing and slow query log, next to the pool checkout wait (see /debug/queries)
+    app.extensions['query_stats'] = QueryStats(
+        engine,
+        log_size=app.config['QUERY_LOG_SIZE'],
+        slow_query_ms=app.config['SLOW_QUERY_MS'],
+        explain_slow=app.config['SLOW_QUERY_EXPLAIN'],
+        pool_stats=app.extensions['pool_stats'],
+    )
+    if app.config['DB_POOL_SIZING'] == 'auto':
+        app.extensions['pool_sizer'] = PoolSizer(
+            app.extensions['pool_stats'],
+            min_size=app.config['DB_POOL_MIN_SIZE'],
+            target_wait_ms=app.config['DB_POOL_TARGET_WAIT_MS'],
+            interval_seconds=app.config['DB_POOL_ADJUST_SECONDS'],
+        ).start()
+
+    # Optional group commit for /submit
+    if app.config['SUBMIT_MODE'] == 'group':
+        if app.config['GUNICORN_THREADS'] <= 1:
+            logger.warning("SUBMIT_MODE=group needs concurrent requests per worker to group anything; "
+                           "run gunicorn with --worker-class gthread --threads N and set GUNICORN_THREADS")
+        app.extensions['group_commit'] = GroupCommitWriter(
+            app,
+            GameSubmission.add_submissions,
+            max_batch=app.config['GROUP_COMMIT_MAX_BATCH'],
+            max_wait_ms=app.config['GROUP_COMMIT_MAX_WAIT_MS'],
+        )
+    elif app.config['SUBMIT_MODE'] != 'sync':
+        raise ValueError(f"Unknown SUBMIT_MODE: {app.config['SUBMIT_MODE']}")
+
+    # Name popularity index behind /stats/name/<name> and /names/search, and the name length,
+    # count and first letter distributions behind /stats/analytics, fed by one background load
+    app.extensions['name_index'] = NameIndex()
+    app.extensions['analytics'] = NameAnalytics()
+    app.extensions['name_counts'] = NameCountsFeed(
+        GameSubmission,
+        [app.extensions['name_index'], app.extensions['analytics']],
+        refresh_seconds=app.config['NAME_INDEX_REFRESH_SECONDS'],
+        full_refresh_seconds=app.config['NAME_INDEX_FULL_REFRESH_SECONDS'],
+        reorder_window=app.config['NAME_INDEX_REORDER_WINDOW'],
+    ).start(app.app_context)
+
     if connector:
         atexit.register(lambda: close_connector())
 
@@ -108,6 +178,22 @@ def create_app(config_name='default'):
 environment = os.getenv('ENVIRONMENT', 'development')
 app = create_app(environment)
 
+
+def debug_access_error():
+    """
+    Checks access to the /debug/* endpoints and /export.
+
+    Returns None when the request may proceed, or an error response otherwise.
+    Without DEBUG_TOKEN the endpoints only exist in DEBUG mode.
+    """
+    token = app.config.get('DEBUG_TOKEN')
+    if not token:
+        return None if app.debug else ({"error": "Not found"}, 404)
+    if not hmac.compare_digest(request.headers.get('X-Debug-Token', ''), token):
+        return {"error": "Forbidden"}, 403
+    return None
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint - tests database connectivity."""
@@ -117,8 +203,8 @@ def health_check():
         logging.info("Database connection successful.")
         return {"status": "healthy", "database": "connected"}, 200
     except Exception as e:
-        logging.error(f"Database connection failed: {e}")
-        logging.error(f"DB Connection Info: {app.config['SQLALCHEMY_DATABASE_URI']}")
+        logging.error("Database connection failed: %s", e)
+        logging.error("DB Connection Info: %s", app.config['SQLALCHEMY_DATABASE_URI'])
         return {"status": "unhealthy", "database": "disconnected", "error": str(e)}, 500
 
 @app.route('/migrate', methods=['POST'])
@@ -136,7 +222,7 @@ def migrate():
         logging.info("Database migration completed.")
         return {"status": "success", "message": "Database tables created"}, 200
     except Exception as e:
-        logging.error(f"Database migration failed: {e}")
+        logging.error("Database migration failed: %s", e)
         return {"status": "error", "message": str(e)}, 500
 
 @app.route('/stats', methods=['GET'])
@@ -144,12 +230,13 @@ def get_stats():
     """Get game statistics from database."""
     try:
         # Get stats from database
-        stats = GameSubmission.get_name_stats()
+        with tracer.start_as_current_span('GameSubmission.get_name_stats'):
+            stats = GameSubmission.get_name_stats()
         logging.info("Retrieved stats from database successfully.")
         return stats, 200
     except Exception as e:
         # Fallback to mock data if database unavailable
-        logging.error(f"Failed to retrieve stats from database: {e}")
+        logging.error("Failed to retrieve stats from database: %s", e)
         logging.error("Returning mock data instead.")
         mock_name_data = [
             {"name": "Alex", "count": 10},
@@ -168,6 +255,69 @@ def get_stats():
             "database_error": str(e)
         }, 200
 
+@app.route('/stats/analytics', methods=['GET'])
+def get_analytics():
+    """Name length histogram, count percentiles, top `top` concentration and first letter breakdown."""
+    top = request.args.get('top', default=10, type=int)
+    if not 1 <= top <= ANALYTICS_MAX_TOP:
+        return {"error": f"top must be between 1 and {ANALYTICS_MAX_TOP}"}, 400
+
+    analytics = app.extensions['analytics']
+    if not analytics.loaded:
+        return {"error": "Name analytics are still loading"}, 503, {'Retry-After': '1'}
+
+    try:
+        with tracer.start_as_current_span('NameAnalytics.summary'):
+            result = analytics.summary(top)
+    except Exception as e:
+        logging.error("Failed to compute name analytics: %s", e)
+        return {"error": str(e)}, 500
+
+    return result, 200
+
+@app.route('/stats/name/<name>', methods=['GET'])
+def get_name_rank(name):
+    """Count, rank and percentile of a single name."""
+    normalized = GameSubmission.normalize_name(name)
+    if not normalized:
+        return {"error": "Name cannot be empty"}, 400
+
+    name_index = app.extensions['name_index']
+    if not name_index.loaded:
+        return {"error": "Name index is still loading"}, 503, {'Retry-After': '1'}
+
+    try:
+        with tracer.start_as_current_span('NameIndex.lookup'):
+            result = name_index.lookup(normalized)
+    except Exception as e:
+        logging.error("Failed to look up name rank: %s", e)
+        return {"error": str(e)}, 500
+
+    if result is None:
+        return {"error": f"Name '{normalized}' has not been submitted yet"}, 404
+    return result, 200
+
+@app.route('/names/search', methods=['GET'])
+def search_names():
+    """Most popular names starting with `prefix` (autocomplete), at most `limit` of them."""
+    prefix = request.args.get('prefix', '').strip()
+    limit = request.args.get('limit', default=10, type=int)
+    if not 1 <= limit <= SEARCH_MAX_LIMIT:
+        return {"error": f"limit must be between 1 and {SEARCH_MAX_LIMIT}"}, 400
+
+    name_index = app.extensions['name_index']
+    if not name_index.loaded:
+        return {"error": "Name index is still loading"}, 503, {'Retry-After': '1'}
+
+    try:
+        with tracer.start_as_current_span('NameIndex.search'):
+            names = name_index.search(prefix, limit)
+    except Exception as e:
+        logging.error("Failed to search names: %s", e)
+        return {"error": str(e)}, 500
+
+    return {"prefix": prefix, "names": names}, 200
+
 @app.route('/submit', methods=['POST'])
 def submit_name():
     """Submit a new name to the database."""
@@ -180,7 +330,13 @@ def submit_name():
         if not name.strip():
             return {"error": "Name cannot be empty"}, 400
 
-        submission = GameSubmission.add_submission(name)
+        writer = app.extensions.get('group_commit')
+        if writer:
+            with tracer.start_as_current_span('GroupCommitWriter.submit'):
+                submission = writer.submit(name)
+        else:
+            with tracer.start_as_current_span('GameSubmission.add_submission'):
+                submission = GameSubmission.add_submission(name)
         return {
             "status": "success",
             "message": f"Name '{submission.name}' submitted successfully",
@@ -190,5 +346,185 @@ def submit_name():
     except Exception as e:
         return {"error": str(e)}, 500
 
+# Largest page /submissions returns
+SUBMISSIONS_MAX_LIMIT = 100
+
+# The newest page is what every viewer asks for, so it is cached briefly: {limit: (expires_at, page)}
+newest_page_cache = {}
+newest_page_locks = {}  # limit -> lock held while that page is refreshed
+
+
+def submissions_page(after_id=None, before_id=None, limit=20):
+    """Page of submissions with the ids to continue from."""
+    rows = GameSubmission.get_submissions_page(after_id=after_id, before_id=before_id, limit=limit)
+    return {
+        "submissions": [row.to_dict() for row in rows],
+        "newest_id": rows[0].id if rows else None,
+        "oldest_id": rows[-1].id if rows else None,
+        "has_more": len(rows) == limit,
+    }
+
+
+def newest_page(limit, ttl):
+    """Newest page from the cache; when it expired, one thread per limit refreshes it and the others wait."""
+    cached = newest_page_cache.get(limit)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    # dict.setdefault is atomic, so every thread gets the same lock for a limit (1..SUBMISSIONS_MAX_LIMIT)
+    with newest_page_locks.setdefault(limit, threading.Lock()):
+        # Another thread may have refreshed it while this one waited
+        cached = newest_page_cache.get(limit)
+        if cached is None or cached[0] <= time.monotonic():
+            cached = newest_page_cache[limit] = (time.monotonic() + ttl, submissions_page(limit=limit))
+        return cached[1]
+
+
+@app.route('/submissions', methods=['GET'])
+def get_submissions():
+    """
+    Recent submissions, newest first (keyset pagination on the id).
+
+    Query parameters:
+      limit: page size (default 20)
+      before_id: older submissions - pass the `oldest_id` of the previous page to scroll back
+      after_id: newer submissions - pass the `newest_id` of the newest page you have to catch up
+    """
+    try:
+        limit = int(request.args.get('limit', 20))
+        after_id, before_id = (
+            int(request.args[key]) if request.args.get(key) else None for key in ('after_id', 'before_id')
+        )
+    except ValueError as e:
+        return {"error": f"Invalid parameter: {e}"}, 400
+    if not 1 <= limit <= SUBMISSIONS_MAX_LIMIT:
+        return {"error": f"limit must be between 1 and {SUBMISSIONS_MAX_LIMIT}"}, 400
+    if after_id is not None and before_id is not None:
+        return {"error": "Use either after_id or before_id, not both"}, 400
+
+    try:
+        with tracer.start_as_current_span('GameSubmission.get_submissions_page'):
+            if after_id is not None or before_id is not None:
+                return submissions_page(after_id=after_id, before_id=before_id, limit=limit), 200
+
+            ttl = app.config['SUBMISSIONS_CACHE_SECONDS']
+            return newest_page(limit, ttl), 200, {'Cache-Control': f'public, max-age={int(ttl)}'}
+    except Exception as e:
+        logging.error("Failed to retrieve submissions: %s", e)
+        return {"error": str(e)}, 500
+
+@app.route('/export', methods=['GET'])
+def export_submissions():
+    """
+    Streams the raw submissions in id order, at most EXPORT_MAX_ROWS of them.
+    Needs the X-Debug-Token header (see debug_access_error()).
+
+    Query parameters:
+      format: csv (default), ndjson or parquet
+      since: only rows submitted at or after this ISO 8601 time
+      after_id: only rows with a higher id - resume an interrupted export with the last id received
+      gzip: true to gzip the output
+
+    When more rows are left, the X-Export-Next-After-Id header holds the `after_id` of the next request.
+    """
+    error = debug_access_error()
+    if error:
+        return error
+
+    fmt = request.args.get('format', 'csv').lower()
+    error = export.check_format(fmt)
+    if error:
+        return {"error": error}, 400
+
+    try:
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else None
+        after_id = int(request.args.get('after_id', 0))
+    except ValueError as e:
+        return {"error": f"Invalid export parameter: {e}"}, 400
+    gzip = request.args.get('gzip', 'false').lower() in ('1', 'true')
+
+    table = GameSubmission.__table__
+    up_to_id = None
+    if app.config['EXPORT_MAX_ROWS']:
+        try:
+            up_to_id = export.page_end(db.session, table, app.config['EXPORT_MAX_ROWS'], since=since, after_id=after_id)
+        except Exception as e:
+            logging.error("Failed to plan export: %s", e)
+            return {"error": str(e)}, 500
+        finally:
+            db.session.rollback()  # don't keep a transaction open while streaming
+
+    statement = export.export_statement(table, since=since, after_id=after_id, up_to_id=up_to_id)
+    body = export.stream_export(db.engine, statement, fmt, chunk_size=app.config['EXPORT_CHUNK_SIZE'], gzip=gzip)
+
+    mimetype, extension = export.FORMATS[fmt]
+    filename = f"game_submissions.{extension}" + ('.gz' if gzip else '')
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if up_to_id is not None:
+        headers['X-Export-Next-After-Id'] = str(up_to_id)
+    return Response(body, mimetype='application/gzip' if gzip else mimetype, headers=headers)
+
+@app.route('/debug/queries', methods=['GET', 'DELETE'])
+def debug_queries():
+    """
+    SQL statement summary: count, total time and p95 per normalized statement,
+    pool checkout wait and the most recent statements (`?recent=N`).
+    DELETE resets the collected data.
+    """
+    error = debug_access_error()
+    if error:
+        return error
+
+    query_stats = app.extensions['query_stats']
+    if request.method == 'DELETE':
+        query_stats.reset()
+        return {"status": "success", "message": "Query stats reset"}, 200
+
+    recent = request.args.get('recent', default=50, type=int)
+    return query_stats.summary(recent_limit=recent), 200
+
+@app.route('/debug/writes', methods=['GET'])
+def debug_writes():
+    """Group commit batch sizes, flush latency and request latency of /submit."""
+    error = debug_access_error()
+    if error:
+        return error
+
+    writer = app.extensions.get('group_commit')
+    if writer is None:
+        return {"submit_mode": app.config['SUBMIT_MODE']}, 200
+    return {"submit_mode": app.config['SUBMIT_MODE'], **writer.summary()}, 200
+
+@app.route('/debug/pool', methods=['GET', 'DELETE'])
+def debug_pool():
+    """
+    Connection pool telemetry: checkout wait, connect and hold times, overflow,
+    timeouts and invalidations, plus the resize decisions with DB_POOL_SIZING=auto.
+    DELETE resets the collected data.
+    """
+    error = debug_access_error()
+    if error:
+        return error
+
+    pool_stats = app.extensions['pool_stats']
+    if request.method == 'DELETE':
+        pool_stats.reset()
+        return {"status": "success", "message": "Pool stats reset"}, 200
+
+    result = {"sizing": app.config['DB_POOL_SIZING'], **pool_stats.summary()}
+    sizer = app.extensions.get('pool_sizer')
+    if sizer is not None:
+        result['sizer'] = sizer.summary()
+    return result, 200
+
+@app.route('/debug/admission', methods=['GET'])
+def debug_admission():
+    """Admitted and shed requests per route, with the configured limits."""
+    error = debug_access_error()
+    if error:
+        return error
+    return app.extensions['admission'].summary(), 200
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8080)
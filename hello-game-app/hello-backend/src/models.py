@@ -53,10 +53,81 @@ class GameSubmission(db.Model):
             'name_data': name_data
         }
 
+    @classmethod
+    def get_name_counts(cls, after_id=0, up_to_id=None):
+        """
+        Submission counts per name for the rows with an id above `after_id` (and up to `up_to_id`).
+
+        Returns:
+          ([(name, count), ...], highest id seen)
+        """
+        query = db.session.query(
+            cls.name,
+            db.func.count(cls.id),
+            db.func.max(cls.id)
+        ).filter(cls.id > after_id)
+        if up_to_id is not None:
+            query = query.filter(cls.id <= up_to_id)
+        rows = query.group_by(cls.name).all()
+
+        max_id = max((row[2] for row in rows), default=after_id)
+        return [(name, count) for name, count, _ in rows], max_id
+
+    @classmethod
+    def get_names_since(cls, after_id):
+        """(id, name) of the submissions with an id above `after_id`, oldest first."""
+        rows = db.session.query(cls.id, cls.name).filter(cls.id > after_id).order_by(cls.id).all()
+        return [(row_id, name) for row_id, name in rows]
+
+    @classmethod
+    def get_max_id(cls):
+        """Highest submission id (0 for an empty table)."""
+        return db.session.query(db.func.max(cls.id)).scalar() or 0
+
+    @classmethod
+    def get_submissions_page(cls, after_id=None, before_id=None, limit=20):
+        """
+        A page of submissions, newest first, using keyset pagination on the id.
+
+        - before_id: the page of submissions older than this id (scrolling back)
+        - after_id: the page of submissions newer than this id, the oldest of them first
+          in the page (catching up)
+        - neither: the newest page
+        """
+        query = db.session.query(cls)
+        if after_id is not None:
+            rows = query.filter(cls.id > after_id).order_by(cls.id.asc()).limit(limit).all()
+            return rows[::-1]
+        if before_id is not None:
+            query = query.filter(cls.id < before_id)
+        return query.order_by(cls.id.desc()).limit(limit).all()
+
+    @staticmethod
+    def normalize_name(name):
+        """Normalized form names are stored in."""
+        return name.strip().title()
+
     @classmethod
     def add_submission(cls, name):
         """Add a new name submission."""
-        submission = cls(name=name.strip().title())
+        submission = cls(name=cls.normalize_name(name))
         db.session.add(submission)
         db.session.commit()
         return submission
+
+    @classmethod
+    def add_submissions(cls, names):
+        """
+        Add several name submissions in one transaction (one multi-row INSERT).
+
+        Returns:
+          the submissions (with id and submitted_at), in the order of `names`
+        """
+        rows = [{'name': cls.normalize_name(name), 'submitted_at': datetime.utcnow()} for name in names]
+        result = db.session.execute(
+            db.insert(cls).returning(cls.id, sort_by_parameter_order=True),
+            rows
+        )
+        ids = result.scalars().all()
+        db.session.commit()
+        return [cls(id=submission_id, **row) for submission_id, row in zip(ids, rows)]
@@ -0,0 +1,365 @@
+"""In-memory name popularity index for the Hello Game backend.
+
+Keeps the submission count of every name and answers "how popular is this
+name" (count, rank, percentile) and "most popular names starting with ..."
+(autocomplete) without sorting all names per request.
+
+The counts are loaded by a NameCountsFeed, which also feeds the analytics
+columns (analytics.py), incrementally on a background thread every
+NAME_INDEX_REFRESH_SECONDS: submissions with an id above the highest id seen
+so far are counted (an index range scan on the primary key). Rows can commit
+out of id order, so the last NAME_INDEX_REORDER_WINDOW ids are scanned again
+and the ids already counted are skipped; everything is rebuilt every
+NAME_INDEX_FULL_REFRESH_SECONDS as well. Every gunicorn worker keeps its own
+copy, and requests never wait for the database.
+"""
+
+import abc
+import bisect
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Largest `limit` a prefix search can ask for
+SEARCH_MAX_LIMIT = 50
+
+# Prefixes up to this length (including the empty one) have a precomputed top list;
+# longer prefixes match few enough names to rank them per request
+TOP_PREFIX_LENGTH = 3
+
+# Ids below the highest one seen that are scanned again on every incremental refresh
+REORDER_WINDOW = 2000
+
+
+class CountRanking:
+    """
+    Number of names per submission count, kept in a Fenwick (binary indexed) tree.
+
+    Moving a name to another count and asking how many names have a higher or
+    lower count are both O(log max_count).
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = 1
+        while self.capacity < capacity:
+            self.capacity *= 2
+        self.names = 0
+        self._tree = [0] * (self.capacity + 1)
+
+    def _grow(self, count):
+        # With a power-of-two capacity n, doubling only adds one non-empty node:
+        # tree[2n] covers (0, 2n], i.e. every name currently in the tree.
+        while self.capacity < count:
+            in_tree = self._prefix(self.capacity)
+            self._tree.extend([0] * self.capacity)
+            self.capacity *= 2
+            self._tree[self.capacity] = in_tree
+
+    def _add(self, count, delta):
+        self._grow(count)
+        while count <= self.capacity:
+            self._tree[count] += delta
+            count += count & -count
+
+    def _prefix(self, count):
+        """Names with a count in 1..count."""
+        count = min(count, self.capacity)
+        total = 0
+        while count > 0:
+            total += self._tree[count]
+            count -= count & -count
+        return total
+
+    def move(self, old_count, new_count):
+        """Moves one name from `old_count` (0 for a new name) to `new_count`."""
+        if old_count:
+            self._add(old_count, -1)
+        else:
+            self.names += 1
+        self._add(new_count, 1)
+
+    def names_above(self, count):
+        """Names with a higher count."""
+        return self.names - self._prefix(count)
+
+    def names_below(self, count):
+        """Names with a lower count."""
+        return self._prefix(count - 1)
+
+
+class PrefixIndex:
+    """
+    Most popular names by (case-insensitive) prefix.
+
+    - short prefixes: a trie flattened into a dict, prefix -> top SEARCH_MAX_LIMIT names.
+      Counts only grow between rebuilds, so a top list stays exact by
+      re-ranking a name's prefixes whenever its count changes.
+    - longer prefixes: binary search in the sorted name keys, then rank the
+      (small) matching range.
+    """
+
+    def __init__(self):
+        self.top = {}
+        self.keys = []  # sorted (casefolded name, name)
+
+    @staticmethod
+    def _short_prefixes(key):
+        return [key[:length] for length in range(min(len(key), TOP_PREFIX_LENGTH) + 1)]
+
+    def rebuild(self, counts):
+        """Builds the index from scratch."""
+        self.keys = keys = sorted((name.casefold(), name) for name in counts)
+        # Walk the names most popular first, so every top list just fills up in order.
+        # The sort is stable, so names with the same count stay in key order.
+        negated_counts = [-counts[name] for _, name in keys]
+        self.top = top_lists = {}
+        for index in sorted(range(len(keys)), key=negated_counts.__getitem__):
+            key, name = keys[index]
+            for length in range(min(len(key), TOP_PREFIX_LENGTH) + 1):
+                top = top_lists.get(key[:length])
+                if top is None:
+                    top_lists[key[:length]] = [name]
+                elif len(top) < SEARCH_MAX_LIMIT:
+                    top.append(name)
+
+    def update(self, changed, new_names, counts):
+        """Re-ranks the names whose count changed; `new_names` are not in the index yet."""
+        new_keys = [(name.casefold(), name) for name in new_names]
+        if len(new_keys) > 1000:
+            self.keys.extend(new_keys)
+            self.keys.sort()
+        else:
+            for key in new_keys:
+                bisect.insort(self.keys, key)
+
+        def rank(name):
+            return (-counts[name], name.casefold(), name)
+
+        for name in changed:
+            for prefix in self._short_prefixes(name.casefold()):
+                top = self.top.setdefault(prefix, [])
+                if name not in top:
+                    if len(top) < SEARCH_MAX_LIMIT:
+                        top.append(name)
+                    elif rank(name) < rank(top[-1]):
+                        top[-1] = name
+                    else:
+                        continue
+                top.sort(key=rank)
+
+    def search(self, prefix, limit, counts):
+        """Up to `limit` most popular names starting with `prefix`."""
+        key = prefix.casefold()
+        if len(key) <= TOP_PREFIX_LENGTH:
+            return self.top.get(key, [])[:limit]
+
+        start = bisect.bisect_left(self.keys, (key,))
+        end = bisect.bisect_left(self.keys, (key[:-1] + chr(ord(key[-1]) + 1),))
+        matches = heapq.nsmallest(limit, self.keys[start:end], key=lambda item: -counts[item[1]])
+        return [name for _, name in matches]
+
+
+class RefreshedAggregate(abc.ABC):
+    """
+    Base for in-memory aggregates of the submission counts per name, kept up to date by a NameCountsFeed.
+
+    Subclasses implement `_build(rows)` (full rebuild; returns the new state without
+    touching the current one, so lookups are served from it meanwhile),
+    `_install(state)` and `_apply(rows)` (adds the counts of new submissions).
+    `_install` and `_apply` are called with `_lock` held. Nothing is served
+    until the first build is installed (`loaded`).
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def rebuild(self, rows):
+        """Replaces the data with [(name, count), ...] of all submissions."""
+        state = self._build(rows)
+        with self._lock:
+            self._install(state)
+            self.loaded = True
+
+    def add(self, rows):
+        """Adds [(name, count), ...] of new submissions."""
+        with self._lock:
+            self._apply(rows)
+
+    @abc.abstractmethod
+    def _build(self, rows):
+        """Returns the state for [(name, count), ...] of all submissions."""
+
+    @abc.abstractmethod
+    def _install(self, state):
+        """Makes a state returned by `_build` the current one."""
+
+    @abc.abstractmethod
+    def _apply(self, rows):
+        """Adds [(name, count), ...] of new submissions to the current state."""
+
+
+class NameCountsFeed:
+    """
+    Loads the submission counts per name once and hands them to every aggregate.
+
+    Refreshes run on a background thread (see start()), so lookups never wait
+    for the database.
+
+    :param source: Model class with get_name_counts(after_id, up_to_id),
+        get_names_since(after_id) and get_max_id() (GameSubmission).
+    :param aggregates: RefreshedAggregates to keep up to date.
+    :param refresh_seconds: Time between incremental refreshes.
+    :param full_refresh_seconds: Time between full rebuilds.
+    :param reorder_window: How many ids below the highest one seen are scanned again
+        for submissions that committed out of id order.
+    """
+
+    def __init__(self, source, aggregates, refresh_seconds=1.0, full_refresh_seconds=3600,
+                 reorder_window=REORDER_WINDOW):
+        # pylint: disable=too-many-arguments
+        self.source = source
+        self.aggregates = list(aggregates)
+        self.refresh_seconds = refresh_seconds
+        self.full_refresh_seconds = full_refresh_seconds
+        self.reorder_window = reorder_window
+
+        self.last_id = 0
+        self.loaded = False
+        self._seen_ids = set()  # ids counted within the reorder window below last_id
+        self._rebuilt_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    def start(self, app_context):
+        """Starts the background refresh thread; every refresh runs inside `app_context()`. Returns self."""
+        self._thread = threading.Thread(target=self._run, args=(app_context,), name='name-counts-refresh',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self, app_context):
+        while True:
+            try:
+                with app_context():
+                    self.refresh()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Name counts refresh failed: %s", e)
+            time.sleep(self.refresh_seconds)
+
+    def refresh(self):
+        """Rebuilds when nothing is loaded or the last rebuild is too old, otherwise loads new submissions."""
+        with self._refresh_lock:
+            if not self.loaded or time.monotonic() - self._rebuilt_at >= self.full_refresh_seconds:
+                self._rebuild()
+            else:
+                self._load_new()
+
+    def _load_new(self):
+        # Rows below last_id can still show up while their transaction commits,
+        # so the trailing window is scanned again and the ids already counted are skipped
+        rows = self.source.get_names_since(max(0, self.last_id - self.reorder_window))
+        new_rows = [(row_id, name) for row_id, name in rows if row_id not in self._seen_ids]
+        if not new_rows:
+            return
+        counts = list(Counter(name for _, name in new_rows).items())
+        for aggregate in self.aggregates:
+            aggregate.add(counts)
+        self.last_id = max(self.last_id, new_rows[-1][0])
+        self._remember(new_rows)
+
+    def _remember(self, rows):
+        floor = self.last_id - self.reorder_window
+        self._seen_ids.update(row_id for row_id, _ in rows)
+        self._seen_ids = {row_id for row_id in self._seen_ids if row_id > floor}
+
+    def _rebuild(self):
+        started = time.perf_counter()
+        # Grouped counts up to the start of the reorder window, single rows after it,
+        # so the window's ids are known for the next incremental refresh
+        boundary = max(0, self.source.get_max_id() - self.reorder_window)
+        rows, _ = self.source.get_name_counts(0, up_to_id=boundary)
+        tail = self.source.get_names_since(boundary)
+        counts = dict(rows)
+        for _, name in tail:
+            counts[name] = counts.get(name, 0) + 1
+        counts = list(counts.items())
+        for aggregate in self.aggregates:
+            aggregate.rebuild(counts)
+
+        self.last_id = tail[-1][0] if tail else boundary
+        self.loaded = True
+        self._seen_ids = set()
+        self._remember(tail)
+        self._rebuilt_at = time.monotonic()
+        logger.info("Name counts rebuilt: %d names, %d submissions in %.1f ms",
+                    len(counts), sum(count for _, count in counts), (time.perf_counter() - started) * 1000)
+
+
+class NameIndex(RefreshedAggregate):
+    """
+    Name -> count map plus CountRanking and PrefixIndex, kept up to date by a NameCountsFeed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.counts = {}
+        self.ranking = CountRanking()
+        self.prefixes = PrefixIndex()
+
+    # --- Refresh ---
+    def _build(self, rows):
+        counts, ranking, prefixes, total = {}, CountRanking(), PrefixIndex(), 0
+        for name, count in rows:
+            counts[name] = count
+            ranking.move(0, count)
+            total += count
+        prefixes.rebuild(counts)
+        return counts, ranking, prefixes, total
+
+    def _install(self, state):
+        self.counts, self.ranking, self.prefixes, self.total = state
+
+    def _apply(self, rows):
+        new_names = []
+        for name, added in rows:
+            old_count = self.counts.get(name, 0)
+            if not old_count:
+                new_names.append(name)
+            self.counts[name] = old_count + added
+            self.ranking.move(old_count, old_count + added)
+            self.total += added
+        self.prefixes.update([name for name, _ in rows], new_names, self.counts)
+
+    # --- Lookups ---
+    def lookup(self, name):
+        """
+        Returns count, rank and percentile of a normalized name (None if never submitted).
+
+        Rank 1 is the most popular name; names with the same count share a rank.
+        The percentile is the share of names that were submitted less often.
+        """
+        with self._lock:
+            count = self.counts.get(name)
+            if not count:
+                return None
+            unique_names = self.ranking.names
+            return {
+                'name': name,
+                'count': count,
+                'rank': self.ranking.names_above(count) + 1,
+                'unique_names': unique_names,
+                'percentile': round(100 * self.ranking.names_below(count) / unique_names, 2),
+                'total_players': self.total,
+            }
+
+    def search(self, prefix, limit=10):
+        """Most popular names starting with `prefix` (case-insensitive), with their counts."""
+        with self._lock:
+            names = self.prefixes.search(prefix, min(limit, SEARCH_MAX_LIMIT), self.counts)
+            return [{'name': name, 'count': self.counts[name]} for name in names]
@@ -0,0 +1,360 @@
+"""Connection pool telemetry and runtime pool sizing for the Hello Game backend.
+
+PoolStats hooks into the SQLAlchemy engine and its pool and records:
+- checkout wait: time spent waiting for a pooled connection, without the time
+  spent opening a new one; checkouts that gave up after pool_timeout
+- connect: time to open a new connection (Cloud SQL connector or driver) and
+  failed attempts
+- hold: how long a connection stayed checked out
+- overflow: checkouts that needed a connection beyond pool_size, and the peak
+  number of connections in use
+- invalidations: connections dropped after an error, failed pre-pings
+  (DB_POOL_PRE_PING) and connections replaced after DB_POOL_RECYCLE
+
+PoolSizer (DB_POOL_SIZING=auto) uses the same numbers to adjust how many
+connections the pool keeps open, within the per-worker limit derived from the
+connection budget (see Config.auto_pool_size()). The summary of both is
+served by the protected /debug/pool endpoint.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from query_stats import TimingSummary, percentile
+
+logger = logging.getLogger(__name__)
+
+# Grow the pool when more than this share of the checkouts needed an overflow connection
+OVERFLOW_SHARE_TO_GROW = 0.1
+
+# Resize decisions kept for /debug/pool
+RESIZE_HISTORY = 20
+
+
+def check_resizable(pool):
+    """
+    Raises RuntimeError when resize_queue_pool() can't work on this pool.
+
+    The QueuePool internals it changes are checked once at startup, so an
+    SQLAlchemy upgrade (pinned in requirements.txt) that renames them fails
+    loudly instead of corrupting the pool at the first resize.
+    """
+    if not isinstance(pool, QueuePool):
+        return  # PoolSizer leaves other pools alone
+    queue = getattr(pool, '_pool', None)
+    missing = [name for name in ('_overflow', '_max_overflow', '_overflow_lock') if not hasattr(pool, name)]
+    missing += [f'_pool.{name}' for name in ('maxsize', 'mutex') if not hasattr(queue, name)]
+    if missing:
+        raise RuntimeError(f"DB_POOL_SIZING=auto can't resize this SQLAlchemy QueuePool (missing "
+                           f"{', '.join(missing)}); use the SQLAlchemy version in requirements.txt "
+                           f"or DB_POOL_SIZING=fixed")
+
+
+def resize_queue_pool(pool, pool_size):
+    """
+    Changes how many connections a QueuePool keeps open, keeping pool_size + max_overflow.
+
+    SQLAlchemy has no public API for this. QueuePool counts its connections in
+    `_overflow` relative to pool_size, so all three values move together: the
+    total limit and checkedout() stay the same, only the split between kept and
+    overflow connections changes. Surplus connections are closed as they are
+    checked in. Returns the new pool_size.
+
+    Swapping in a new pool (engine.dispose(), pool.recreate()) is public API but
+    would not count the old pool's checked out connections, so the worker could
+    exceed its share of the connection budget until they are returned.
+    """
+    # pylint: disable=protected-access
+    pool_size = max(1, min(pool_size, pool.size() + pool._max_overflow))
+    with pool._overflow_lock, pool._pool.mutex:
+        delta = pool_size - pool._pool.maxsize
+        pool._pool.maxsize = pool_size
+        pool._overflow -= delta
+        pool._max_overflow -= delta
+    return pool_size
+
+
+class _Window:
+    """Checkout numbers since the last PoolSizer adjustment."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.max_in_use = 0
+        self.checkout_ms = deque(maxlen=1000)
+
+
+class PoolStats:
+    """
+    Pool event recorder attached to a SQLAlchemy engine.
+
+    :param engine: SQLAlchemy engine to instrument.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.started_at = time.time()
+        self.checkout_wait = TimingSummary()
+        self.connect = TimingSummary()
+        self.hold = TimingSummary()
+        self.counters = {}
+        self.max_in_use = 0
+        self._window = _Window()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._reset_counters()
+
+        self._instrument(engine)
+
+    def _reset_counters(self):
+        self.counters = {
+            'checkouts': 0,
+            'overflow_checkouts': 0,
+            'timeouts': 0,
+            'connect_failures': 0,
+            'invalidated': 0,
+            'pre_ping_failures': 0,
+            'soft_invalidated': 0,
+            'recycled': 0,
+        }
+
+    # --- Engine and pool hooks ---
+    def _instrument(self, engine):
+        pool = engine.pool
+        # pylint: disable=protected-access
+        # Time connection creation by wrapping the pool's creator. Setting `_creator` keeps the
+        # wrapper when the pool is recreated (engine.dispose(), pool.recreate()).
+        invoke_creator = pool._invoke_creator
+
+        def timed_creator(connection_record):
+            started = time.perf_counter()
+            try:
+                return invoke_creator(connection_record)
+            except Exception:
+                with self._lock:
+                    self.counters['connect_failures'] += 1
+                raise
+            finally:
+                duration_ms = (time.perf_counter() - started) * 1000
+                self._local.connect_ms = getattr(self._local, 'connect_ms', 0.0) + duration_ms
+                with self._lock:
+                    self.connect.add(duration_ms)
+
+        pool._creator = timed_creator
+
+        # There is no "checkout started" pool event, so time the call that waits for the pool,
+        # minus connecting. This is the only wrapper; QueryStats reports the same numbers.
+        raw_connection = engine.raw_connection
+
+        def timed_raw_connection(*args, **kwargs):
+            self._local.connect_ms = 0.0
+            started = time.perf_counter()
+            try:
+                return raw_connection(*args, **kwargs)
+            except exc.TimeoutError:
+                with self._lock:
+                    self.counters['timeouts'] += 1
+                    self._window.timeouts += 1
+                raise
+            finally:
+                total_ms = (time.perf_counter() - started) * 1000
+                with self._lock:
+                    self.checkout_wait.add(max(0.0, total_ms - self._local.connect_ms))
+                    self._window.checkout_ms.append(total_ms)
+
+        engine.raw_connection = timed_raw_connection
+
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+        event.listen(engine, 'soft_invalidate', self._on_soft_invalidate)
+        event.listen(engine, 'close', self._on_close)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        # pylint: disable=unused-argument
+        connection_record.info['pool_stats_checked_out'] = time.perf_counter()
+        pool = self.engine.pool
+        # Only QueuePool has a size and overflow (not NullPool/StaticPool)
+        in_use = pool.checkedout() if hasattr(pool, 'checkedout') else 0
+        overflow = hasattr(pool, 'size') and in_use > pool.size()
+        with self._lock:
+            self.counters['checkouts'] += 1
+            self.counters['overflow_checkouts'] += overflow
+            self.max_in_use = max(self.max_in_use, in_use)
+            self._window.checkouts += 1
+            self._window.overflow_checkouts += overflow
+            self._window.max_in_use = max(self._window.max_in_use, in_use)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        # pylint: disable=unused-argument
+        started = connection_record.info.pop('pool_stats_checked_out', None)
+        if started is not None:
+            with self._lock:
+                self.hold.add((time.perf_counter() - started) * 1000)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        # pylint: disable=unused-argument
+        # A failed pre-ping invalidates with a DisconnectionError, errors during queries with the DBAPI error
+        counter = 'pre_ping_failures' if isinstance(exception, exc.DisconnectionError) else 'invalidated'
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _on_soft_invalidate(self, dbapi_connection, connection_record, exception):
+        # pylint: disable=unused-argument
+        with self._lock:
+            self.counters['soft_invalidated'] += 1
+
+    def _on_close(self, dbapi_connection, connection_record):
+        # pylint: disable=unused-argument,protected-access
+        # There is no recycle event; a connection closed after pool_recycle seconds is being replaced
+        recycle = self.engine.pool._recycle
+        if recycle > -1 and time.time() - connection_record.starttime > recycle:
+            with self._lock:
+                self.counters['recycled'] += 1
+
+    # --- Reporting ---
+    def take_window(self):
+        """Returns the checkout numbers since the previous call and starts a new window."""
+        with self._lock:
+            window, self._window = self._window, _Window()
+        return window
+
+    def pool_status(self):
+        """Current size and usage of the pool."""
+        pool = self.engine.pool
+        if not hasattr(pool, 'checkedout'):
+            return {'class': type(pool).__name__}
+        # pylint: disable=protected-access
+        return {
+            'class': type(pool).__name__,
+            'pool_size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(0, pool.overflow()),
+            'timeout_s': pool.timeout(),
+        }
+
+    def checkout_summary(self):
+        """Checkout wait timings (without connecting)."""
+        with self._lock:
+            return self.checkout_wait.to_dict()
+
+    def summary(self):
+        """Counters, timings and the current pool status."""
+        with self._lock:
+            result = {
+                'since': self.started_at,
+                **self.counters,
+                'max_in_use': self.max_in_use,
+                'checkout_wait': self.checkout_wait.to_dict(),
+                'connect': self.connect.to_dict(),
+                'hold': self.hold.to_dict(),
+            }
+        result['pool'] = self.pool_status()
+        return result
+
+    def reset(self):
+        """Clears everything recorded so far."""
+        with self._lock:
+            self._reset_counters()
+            self.max_in_use = 0
+            self.checkout_wait = TimingSummary()
+            self.connect = TimingSummary()
+            self.hold = TimingSummary()
+            self.started_at = time.time()
+
+
+class PoolSizer:
+    """
+    Adjusts how many connections a QueuePool keeps open, from PoolStats windows.
+
+    Every `interval_seconds` the pool grows when checkouts waited too long
+    (p95 of waiting plus connecting above `target_wait_ms`), timed out or often
+    needed overflow connections - growing by half at a time, since connecting
+    is slow. It shrinks by one when nothing overflowed and fewer connections
+    than kept were in use at the peak. The size stays between `min_size` and
+    the pool's pool_size + max_overflow, which never changes.
+
+    :param stats: PoolStats of the engine.
+    :param min_size: Smallest number of kept connections.
+    :param target_wait_ms: Acceptable p95 checkout time.
+    :param interval_seconds: Time between adjustments.
+    """
+
+    def __init__(self, stats, min_size=1, target_wait_ms=10.0, interval_seconds=30.0):
+        check_resizable(stats.engine.pool)
+        self.stats = stats
+        self.min_size = min_size
+        self.target_wait_ms = target_wait_ms
+        self.interval_seconds = interval_seconds
+        self.history = deque(maxlen=RESIZE_HISTORY)
+        self._thread = None
+
+    def start(self):
+        """Starts the background thread; returns self."""
+        self._thread = threading.Thread(target=self._run, name='pool-sizer', daemon=True)
+        self._thread.start()
+        logger.info("Pool sizer started (target checkout p95 %.0f ms, every %.0f s)",
+                    self.target_wait_ms, self.interval_seconds)
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval_seconds)
+            try:
+                self.adjust()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Pool sizing failed: %s", e)
+
+    def adjust(self):
+        """Looks at the checkouts since the last call and resizes the pool if needed."""
+        window = self.stats.take_window()
+        pool = self.stats.engine.pool
+        # pylint: disable=protected-access
+        if not hasattr(pool, '_max_overflow') or pool._max_overflow < 0:
+            return  # not a QueuePool, or unlimited overflow
+        if not window.checkouts and not window.timeouts:
+            return  # idle
+
+        size = pool.size()
+        limit = size + pool._max_overflow
+        checkout_p95 = percentile(list(window.checkout_ms), 95) or 0.0
+        overflow_share = window.overflow_checkouts / max(window.checkouts, 1)
+
+        new_size = size
+        if checkout_p95 > self.target_wait_ms or window.timeouts or overflow_share > OVERFLOW_SHARE_TO_GROW:
+            new_size = min(limit, size + max(1, size // 2))
+        elif not window.overflow_checkouts and window.max_in_use < size:
+            new_size = max(self.min_size, size - 1)
+
+        if new_size == size:
+            return
+        new_size = resize_queue_pool(pool, new_size)
+        logger.info("Pool size %d -> %d (checkout p95 %.1f ms, %.0f%% overflow, %d timeouts, peak %d in use)",
+                    size, new_size, checkout_p95, overflow_share * 100, window.timeouts, window.max_in_use)
+        self.history.append({
+            'ts': time.time(),
+            'from': size,
+            'to': new_size,
+            'checkout_p95_ms': round(checkout_p95, 3),
+            'overflow_share': round(overflow_share, 4),
+            'timeouts': window.timeouts,
+            'max_in_use': window.max_in_use,
+        })
+
+    def summary(self):
+        """Settings and the latest resize decisions."""
+        return {
+            'min_size': self.min_size,
+            'target_wait_ms': self.target_wait_ms,
+            'interval_seconds': self.interval_seconds,
+            'resizes': list(self.history),
+        }
@@ -0,0 +1,218 @@
+"""SQL statement timing for the Hello Game backend.
+
+Hooks into the SQLAlchemy engine and records for every statement how long it
+took and how many rows it touched, next to the pool checkout wait recorded by
+PoolStats (pool_stats.py). The data is kept in memory only:
+- a bounded ring buffer with the most recent statements
+- a per-statement summary (count, total time, p95) keyed by the normalized
+  statement, i.e. with literals and parameters replaced by `?`
+
+Statements slower than SLOW_QUERY_MS are logged, optionally together with
+their EXPLAIN plan (SLOW_QUERY_EXPLAIN). The summary is served by the
+protected /debug/queries endpoint.
+"""
+
+import functools
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Recent durations kept per statement for the p95 - enough for a stable value
+DURATIONS_PER_STATEMENT = 500
+
+# Distinct normalized statements tracked; anything beyond that is counted as '<other>'
+MAX_STATEMENTS = 200
+
+# Explain the same slow statement at most once per this many seconds
+EXPLAIN_INTERVAL_SECONDS = 60
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),           # string literals
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),         # numbers
+    (re.compile(r'%\(\w+\)s|%s|\$\d+|(?<!:):\w+'), '?'),  # driver placeholders (not ::casts)
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?)'),  # IN lists of any length
+    (re.compile(r'\s+'), ' '),
+]
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_statement(statement):
+    """Returns the statement with literals and parameters replaced by `?`."""
+    for pattern, replacement in _LITERALS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, int(round(pct / 100 * len(ordered))) - 1)]
+
+
+class TimingSummary:
+    """Count, total and recent durations of one kind of operation."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.recent_ms = deque(maxlen=DURATIONS_PER_STATEMENT)
+
+    def add(self, duration_ms, rows=0):
+        """Adds one measurement."""
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.rows += max(rows, 0)
+        self.recent_ms.append(duration_ms)
+
+    def to_dict(self):
+        """JSON-friendly representation."""
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else None,
+            'p95_ms': round(percentile(list(self.recent_ms), 95) or 0, 3),
+            'max_ms': round(self.max_ms, 3),
+            'rows': self.rows,
+        }
+
+
+class QueryStats:
+    """
+    Per-statement timing recorder attached to a SQLAlchemy engine.
+
+    :param engine: SQLAlchemy engine to instrument.
+    :param log_size: How many recent statements the ring buffer keeps.
+    :param slow_query_ms: Statements slower than this are logged (0 disables it).
+    :param explain_slow: Log the EXPLAIN plan of slow SELECT statements.
+    :param pool_stats: PoolStats of the engine; its checkout wait is reported as pool_checkout.
+    """
+
+    def __init__(self, engine, log_size=1000, slow_query_ms=200, explain_slow=False, pool_stats=None):
+        # pylint: disable=too-many-arguments
+        self.log_size = log_size
+        self.slow_query_ms = slow_query_ms
+        self.explain_slow = explain_slow
+        self.pool_stats = pool_stats
+
+        self.recent = deque(maxlen=log_size)
+        self.statements = {}
+        self.started_at = time.time()
+        self._last_explained = {}
+        self._lock = threading.Lock()
+
+        self._instrument(engine)
+
+    # --- Engine hooks ---
+    def _instrument(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # pylint: disable=unused-argument,too-many-arguments,protected-access
+        # Kept on the execution context: it is discarded with the statement, also when the statement fails
+        if context is not None:
+            context._query_stats_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # pylint: disable=unused-argument,too-many-arguments,protected-access
+        started = getattr(context, '_query_stats_started', None)
+        if started is None:
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        rows = cursor.rowcount if cursor.rowcount is not None else -1
+        self.record(statement, duration_ms, rows)
+
+        if self.slow_query_ms and duration_ms >= self.slow_query_ms:
+            logger.warning("Slow query (%.1f ms, %d rows): %s", duration_ms, rows, ' '.join(statement.split()))
+            if self.explain_slow:
+                self._explain(conn, statement, parameters)
+
+    # --- Recording ---
+    def record(self, statement, duration_ms, rows):
+        """Records a single executed statement."""
+        normalized = normalize_statement(statement)
+        with self._lock:
+            summary = self.statements.get(normalized)
+            if summary is None:
+                if len(self.statements) >= MAX_STATEMENTS:
+                    normalized = '<other>'
+                summary = self.statements.setdefault(normalized, TimingSummary())
+            summary.add(duration_ms, rows)
+            self.recent.append({
+                'ts': time.time(),
+                'statement': normalized,
+                'duration_ms': round(duration_ms, 3),
+                'rows': rows,
+            })
+
+    def _explain(self, conn, statement, parameters):
+        """Logs the plan of a slow SELECT (without executing it again)."""
+        if not statement.lstrip().upper().startswith('SELECT'):
+            return
+
+        normalized = normalize_statement(statement)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_explained.get(normalized, -EXPLAIN_INTERVAL_SECONDS) < EXPLAIN_INTERVAL_SECONDS:
+                return
+            self._last_explained[normalized] = now
+
+        try:
+            cursor = conn.connection.cursor()
+            try:
+                # Runs in the request's transaction: a failing EXPLAIN must not abort it
+                cursor.execute("SAVEPOINT query_stats_explain")
+                try:
+                    if parameters:
+                        cursor.execute(f"EXPLAIN {statement}", parameters)
+                    else:
+                        cursor.execute(f"EXPLAIN {statement}")
+                    plan = '\n'.join(str(row[0]) for row in cursor.fetchall())
+                except Exception:
+                    cursor.execute("ROLLBACK TO SAVEPOINT query_stats_explain")
+                    raise
+                finally:
+                    cursor.execute("RELEASE SAVEPOINT query_stats_explain")
+            finally:
+                cursor.close()
+            logger.warning("EXPLAIN for slow query:\n%s", plan)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error("Could not EXPLAIN slow query: %s", e)
+
+    # --- Reporting ---
+    def summary(self, recent_limit=50):
+        """Returns the per-statement summary (slowest total first) and the latest statements."""
+        with self._lock:
+            statements = [
+                {'statement': statement, **summary.to_dict()}
+                for statement, summary in self.statements.items()
+            ]
+            recent = list(self.recent)[-recent_limit:] if recent_limit > 0 else []
+        pool_checkout = self.pool_stats.checkout_summary() if self.pool_stats else None
+
+        statements.sort(key=lambda item: item['total_ms'], reverse=True)
+        return {
+            'since': self.started_at,
+            'slow_query_ms': self.slow_query_ms,
+            'pool_checkout': pool_checkout,
+            'statements': statements,
+            'recent': recent,
+        }
+
+    def reset(self):
+        """Clears everything recorded so far."""
+        with self._lock:
+            self.recent.clear()
+            self.statements.clear()
+            self.started_at = time.time()
@@ -0,0 +1,124 @@
+"""Tracing for the Hello Game services.
+
+Spans are created with OpenTelemetry and sent to the exporter selected with
+TRACE_EXPORTER:
+- none (default): tracing is off, every span is a no-op
+- console: one JSON document per span on stdout
+- file: one JSON line per span appended to TRACE_FILE (works fully offline)
+- otlp: an OTLP collector (needs the opentelemetry-exporter-otlp package)
+
+Trace context travels as W3C `traceparent` - as a header on the frontend's
+backend call and as a message attribute on the Pub/Sub publish, which
+`extract_context` picks up in hello-function - so one trace follows a name
+from `/play` to the database insert.
+
+The web services call init_tracing(app, service_name), hello-function calls
+setup_tracing() directly. The source of this module is shared/tracing.py;
+every service has a copy (`make sync-shared`). Edit the shared file, not the
+copies.
+"""
+
+import logging
+import sys
+
+from opentelemetry import context, propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+logger = logging.getLogger(__name__)
+
+# Resolves to the real tracer once a provider is installed
+tracer = trace.get_tracer('hello-game')
+_provider = None
+
+
+def create_exporter(name, trace_file, service_name):
+    """Returns the span exporter for the given TRACE_EXPORTER value."""
+    def json_line(span):
+        return span.to_json(indent=None) + '\n'
+
+    if name == 'console':
+        return ConsoleSpanExporter(service_name=service_name, out=sys.stdout, formatter=json_line)
+    if name == 'file':
+        out = open(trace_file, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+        return ConsoleSpanExporter(service_name=service_name, out=out, formatter=json_line)
+    if name == 'otlp':
+        try:
+            # pylint: disable=import-outside-toplevel
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        except ImportError as e:
+            raise RuntimeError("TRACE_EXPORTER=otlp requires the opentelemetry-exporter-otlp package") from e
+        return OTLPSpanExporter()
+    raise ValueError(f"Unknown TRACE_EXPORTER: {name}")
+
+
+def setup_tracing(service_name, exporter_name, trace_file=None):
+    """Installs the tracer provider (once per process); returns False when tracing is off."""
+    global _provider  # pylint: disable=global-statement
+    exporter_name = (exporter_name or 'none').lower()
+    if exporter_name == 'none':
+        return False
+    if _provider is not None:
+        return True
+
+    _provider = TracerProvider(resource=Resource.create({'service.name': service_name}))
+    _provider.add_span_processor(BatchSpanProcessor(create_exporter(exporter_name, trace_file, service_name)))
+    trace.set_tracer_provider(_provider)
+    logger.info("Tracing enabled (exporter: %s)", exporter_name)
+    return True
+
+
+def init_tracing(app, service_name):
+    """Installs the tracer provider and wraps every request of a Flask app in a server span."""
+    from flask import g, request  # pylint: disable=import-outside-toplevel
+
+    if not setup_tracing(service_name, app.config.get('TRACE_EXPORTER'), app.config.get('TRACE_FILE')):
+        return
+
+    @app.before_request
+    def start_request_span():
+        # Continue the caller's trace if it sent a traceparent header
+        parent = propagate.extract(request.headers)
+        route = request.url_rule.rule if request.url_rule else request.path
+        span = tracer.start_span(
+            f"{request.method} {route}",
+            context=parent,
+            kind=trace.SpanKind.SERVER,
+            attributes={'http.request.method': request.method, 'url.path': request.path},
+        )
+        g.trace_span = span
+        g.trace_token = context.attach(trace.set_span_in_context(span))
+
+    @app.after_request
+    def record_response_status(response):
+        if 'trace_span' in g:
+            g.trace_span.set_attribute('http.response.status_code', response.status_code)
+        return response
+
+    @app.teardown_request
+    def end_request_span(exception=None):
+        span = g.pop('trace_span', None)
+        if span is None:
+            return
+        if exception is not None:
+            span.record_exception(exception)
+            span.set_status(trace.Status(trace.StatusCode.ERROR))
+        span.end()
+        context.detach(g.pop('trace_token'))
+
+
+def extract_context(event):
+    """Returns the trace context carried in the Pub/Sub message attributes."""
+    return propagate.extract(event.get('attributes') or {})
+
+
+def flush_spans():
+    """
+    Exports finished spans right away.
+
+    Function instances can be frozen between invocations, so we don't rely on
+    the background export thread getting CPU time later.
+    """
+    if _provider is not None:
+        _provider.force_flush()
@@ -0,0 +1,211 @@
+"""Admission control for the Hello Game services.
+
+Sheds load early instead of letting requests pile up (behind the connection
+pool in the backend). Limits are set per route with ADMISSION_LIMITS, e.g.
+
+    backend:  ADMISSION_LIMITS="/submit:rate=200,burst=400,concurrency=6;/stats:concurrency=2"
+    frontend: ADMISSION_LIMITS="/play:rate=100,burst=200;/stats:concurrency=4"
+
+- rate/burst: token bucket; requests above the rate get 429 with Retry-After
+  set to when the next token is available
+- concurrency: requests running at the same time; a request waits at most
+  ADMISSION_MAX_WAIT_MS for a free slot, then gets 503 with Retry-After
+
+A request only uses up a rate token when it is admitted: one shed for
+concurrency gets its token back.
+
+Limits are per gunicorn worker. To keep requests from queueing on the pool,
+keep the concurrency of the backend's DB routes at or below pool_size +
+max_overflow. The frontend's background Pub/Sub publishes of /play are
+limited separately (PUBLISH_MAX_IN_FLIGHT). Admitted and shed counts per
+route are served by /debug/admission.
+
+The source of this module is shared/admission.py; the backend and the frontend
+have a copy (`make sync-shared`). Edit the shared file, not the copies.
+"""
+
+import logging
+import math
+import threading
+import time
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+RETRY_AFTER_OVERLOADED_SECONDS = 1
+
+
+def parse_limits(spec):
+    """Parses ADMISSION_LIMITS into {route: {'rate': .., 'burst': .., 'concurrency': ..}}."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in (spec or '').split(';'))):
+        route, _, params = entry.partition(':')
+        values = {}
+        for param in filter(None, params.split(',')):
+            key, _, value = param.partition('=')
+            if key.strip() not in ('rate', 'burst', 'concurrency'):
+                raise ValueError(f"Unknown admission limit '{key}' in '{entry}'")
+            values[key.strip()] = float(value)
+        limits[route.strip()] = values
+    return limits
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` saved up."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Takes a token; returns (admitted, seconds until a token is available)."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True, 0
+            return False, (1 - self._tokens) / self.rate
+
+    def refund(self):
+        """Gives back a token taken by try_acquire()."""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+
+class ConcurrencyLimit:
+    """At most `limit` holders at a time; waits at most `max_wait` seconds for a slot."""
+
+    def __init__(self, limit, max_wait=0):
+        self.limit = limit
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Returns True when a slot was taken (release it with release())."""
+        if not self._semaphore.acquire(timeout=self.max_wait):  # pylint: disable=consider-using-with
+            return False
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return True
+
+    def release(self):
+        """Frees a slot."""
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+
+class RouteAdmission:
+    """Limits and counters of one route."""
+
+    def __init__(self, rate=0, burst=0, concurrency=0, max_wait=0):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.slots = ConcurrencyLimit(int(concurrency), max_wait) if concurrency else None
+        self.admitted = 0
+        self.rate_limited = 0
+        self.overloaded = 0
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """Returns None when admitted, else (status, retry_after_seconds)."""
+        if self.bucket:
+            admitted, wait = self.bucket.try_acquire()
+            if not admitted:
+                self._count('rate_limited')
+                return 429, max(1, math.ceil(wait))
+        if self.slots and not self.slots.acquire():
+            if self.bucket:
+                self.bucket.refund()
+            self._count('overloaded')
+            return 503, RETRY_AFTER_OVERLOADED_SECONDS
+        self._count('admitted')
+        return None
+
+    def release(self):
+        """Called when an admitted request is done."""
+        if self.slots:
+            self.slots.release()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def to_dict(self):
+        """JSON-friendly counters and limits."""
+        result = {
+            'admitted': self.admitted,
+            'shed_rate_limited': self.rate_limited,
+            'shed_overloaded': self.overloaded,
+        }
+        if self.bucket:
+            result.update(rate=self.bucket.rate, burst=self.bucket.burst)
+        if self.slots:
+            result.update(concurrency=self.slots.limit, in_flight=self.slots.in_flight,
+                          max_in_flight=self.slots.max_in_flight)
+        return result
+
+
+class AdmissionController:
+    """Per-route admission, keyed by the route rule (e.g. '/stats/name/<name>')."""
+
+    def __init__(self, limits, max_wait_ms=100):
+        self.routes = {
+            route: RouteAdmission(max_wait=max_wait_ms / 1000, **values)
+            for route, values in limits.items()
+        }
+        self.started_at = time.time()
+
+    def add_route(self, route, **values):
+        """Adds limits for a route (or any other named resource); returns its RouteAdmission."""
+        self.routes[route] = RouteAdmission(**values)
+        return self.routes[route]
+
+    def summary(self):
+        """Counters of every route."""
+        return {
+            'since': self.started_at,
+            'routes': {route: admission.to_dict() for route, admission in self.routes.items()},
+        }
+
+
+def init_admission_control(app):
+    """Creates the controller and registers the admission hooks for the limited routes."""
+    controller = AdmissionController(parse_limits(app.config.get('ADMISSION_LIMITS')),
+                                     max_wait_ms=app.config['ADMISSION_MAX_WAIT_MS'])
+    app.extensions['admission'] = controller
+    if not controller.routes:
+        return controller
+    logger.info("Admission control enabled for: %s", ', '.join(controller.routes))
+
+    @app.before_request
+    def admit_request():
+        rule = request.url_rule.rule if request.url_rule else None
+        admission = controller.routes.get(rule)
+        if admission is None:
+            return None
+
+        rejected = admission.admit()
+        if rejected:
+            status, retry_after = rejected
+            message = "Too many requests" if status == 429 else "Server overloaded"
+            return {"error": f"{message}, please retry later"}, status, {'Retry-After': str(retry_after)}
+        g.admission = admission
+        return None
+
+    @app.teardown_request
+    def release_request(exception=None):  # pylint: disable=unused-argument
+        admission = g.pop('admission', None)
+        if admission is not None:
+            admission.release()
+
+    return controller
@@ -9,6 +9,45 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'supersecret')
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 
+    # Optional request capture for load testing (see traffic_capture.py)
+    TRAFFIC_CAPTURE_FILE = os.getenv('TRAFFIC_CAPTURE_FILE')
+    # Server-Timing header with the request duration, for replay.py (see traffic_capture.py)
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() == 'true'
+
+    # Tracing: none, console, file or otlp (see tracing.py)
+    TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none')
+    TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+
+    # Per-route token bucket and concurrency limits (see admission.py). Empty = no limits.
+    ADMISSION_LIMITS = os.getenv('ADMISSION_LIMITS', '')
+    ADMISSION_MAX_WAIT_MS = float(os.getenv('ADMISSION_MAX_WAIT_MS', '100'))
+
+    # Background Pub/Sub publishes of /play running at the same time; /play is rejected with 503 above it
+    PUBLISH_MAX_IN_FLIGHT = int(os.getenv('PUBLISH_MAX_IN_FLIGHT', '100'))
+
+    # single: one Pub/Sub message per name; batch: names are collected into envelope messages
+    # (see name_batcher.py - needs a hello-function that understands the envelope)
+    PUBLISH_MODE = os.getenv('PUBLISH_MODE', 'single')
+    if PUBLISH_MODE not in ('single', 'batch'):
+        raise ValueError(f"Unknown PUBLISH_MODE: {PUBLISH_MODE} (expected single or batch)")
+    PUBLISH_BATCH_WINDOW_MS = float(os.getenv('PUBLISH_BATCH_WINDOW_MS', '50'))
+    PUBLISH_BATCH_MAX_NAMES = int(os.getenv('PUBLISH_BATCH_MAX_NAMES', '500'))
+    PUBLISH_BATCH_MAX_PENDING = int(os.getenv('PUBLISH_BATCH_MAX_PENDING', '10000'))
+    PUBLISH_BATCH_COMPRESS = os.getenv('PUBLISH_BATCH_COMPRESS', 'false').lower() == 'true'
+
+    # Protects the /debug/* endpoints (sent as the X-Debug-Token header).
+    # When not set, they are only available with DEBUG enabled.
+    DEBUG_TOKEN = os.getenv('DEBUG_TOKEN')
+
+    # On-demand request profiling (see profiling.py). Enabled by PROFILE_SECRET (signed
+    # X-Profile-Token header / _profile query parameter) and/or PROFILE_SAMPLE_RATE (1 in N).
+    PROFILE_SECRET = os.getenv('PROFILE_SECRET')
+    PROFILE_SAMPLE_RATE = int(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_MODE = os.getenv('PROFILE_MODE', 'cprofile')  # cprofile or sampling
+    PROFILE_SAMPLING_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLING_INTERVAL_MS', '5'))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/hello-game-profiles')
+    PROFILE_DIR_MAX_MB = int(os.getenv('PROFILE_DIR_MAX_MB', '100'))
+
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -0,0 +1,206 @@
+"""Logging setup shared by the Hello Game services.
+
+- Non-blocking: request threads only put the record on a bounded in-memory
+  queue; a background thread formats and writes it (LOG_ASYNC, default on).
+  When the queue is full, records are dropped instead of blocking the request
+  (the number of dropped records is reported on the next written line).
+- Structured: one JSON object per line (LOG_FORMAT=json, the default), with
+  `severity` and `message` as Cloud Logging expects, the trace ID when a span
+  is active, and any `extra={...}` fields. LOG_FORMAT=text keeps the classic
+  format for local development.
+- Rate limited: each message type (logger + format string) may write at most
+  LOG_RATE_LIMIT INFO/DEBUG lines per second; the rest are counted and
+  reported as `suppressed` on the next line that gets through. Warnings and
+  errors are never limited. LOG_RATE_LIMIT=0 turns it off.
+
+Use lazy formatting (`logger.info("Saved %s", name)`, not f-strings): the
+message is only rendered on the background thread, and only if it is written.
+
+The source of this module is shared/log_setup.py; every service has a copy
+(`make sync-shared`, run by `make install` and `make run`). Edit the shared
+file, not the copies.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from opentelemetry import trace
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+LOG_ASYNC = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_RATE_LIMIT = float(os.getenv('LOG_RATE_LIMIT', '20'))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Message types the rate limiter tracks; the least recently logged ones are forgotten beyond that
+RATE_LIMIT_MAX_TYPES = 1000
+
+# LogRecord attributes that are not `extra` fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects."""
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'severity': record.levelname,
+            'message': record.getMessage(),
+            'logger': record.name,
+            'service': self.service,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `per_second` INFO/DEBUG records per message type.
+
+    The message type is the logger name plus the unformatted message, so
+    `logger.info("Saved %s", name)` is one type no matter the name. Pre-formatted
+    messages make a new type per text, so only the `max_types` most recently
+    logged types are kept.
+    """
+
+    def __init__(self, per_second, max_types=RATE_LIMIT_MAX_TYPES):
+        super().__init__()
+        self.per_second = per_second
+        self.max_types = max_types
+        self._buckets = OrderedDict()  # (logger, msg) -> [tokens, last refill, suppressed], oldest first
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        try:
+            # msg can be any object (dict, list, ...); its text is the message type
+            key = (record.name, str(record.msg))
+        except Exception:  # pylint: disable=broad-exception-caught
+            return True  # a message that can't be turned into text is never limited
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.per_second, now, 0]
+                if len(self._buckets) > self.max_types:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            bucket[0] = min(self.per_second, bucket[0] + (now - bucket[1]) * self.per_second)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+
+class TraceContextFilter(logging.Filter):
+    """Adds the active trace ID (captured on the calling thread, before queueing)."""
+
+    def filter(self, record):
+        span_context = trace.get_current_span().get_span_context()
+        if span_context.is_valid:
+            record.trace_id = format(span_context.trace_id, '032x')
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full and defers formatting."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._reported = 0
+        self._count_lock = threading.Lock()
+
+    def prepare(self, record):
+        # The stock implementation formats the message here, on the request thread.
+        # The queue is in-process, so the record can be handed over as it is.
+        if self.dropped != self._reported:
+            with self._count_lock:
+                if self.dropped != self._reported:
+                    record.dropped = self.dropped - self._reported
+                    self._reported = self.dropped
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._count_lock:
+                self.dropped += 1
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits for room in a full queue instead of failing."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def setup_logging(service):
+    """Configures the root logger for `service` (safe to call more than once)."""
+    global _listener  # pylint: disable=global-statement
+    root = logging.getLogger()
+    if any(getattr(handler, 'hello_game', False) for handler in root.handlers):
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter(service) if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    if LOG_ASYNC:
+        handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _listener = DrainingQueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+    else:
+        handler = output
+
+    handler.hello_game = True
+    if LOG_RATE_LIMIT > 0:
+        handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT))
+    handler.addFilter(TraceContextFilter())
+
+    # Replace whatever basicConfig or the platform installed, so lines aren't written twice
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+
+
+def flush_logs(timeout=2.0):
+    """Waits (up to `timeout` seconds) until the queued records are written."""
+    if _listener is None:
+        return
+    deadline = time.monotonic() + timeout
+    while _listener.queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.005)
@@ -1,15 +1,32 @@
 from flask import Flask, render_template, request, redirect, url_for, flash
 from google.cloud import pubsub_v1      # type: ignore
 from google.api_core import exceptions  # type: ignore
+from opentelemetry import context, propagate, trace
+import google.auth.jwt
 import google.auth.transport.requests
 import google.oauth2.id_token
 import requests
 import logging
 import os
 import threading
+import time
 import concurrent.futures
+import hmac
 
+from src.admission import init_admission_control
 from src.config import config
+from src.log_setup import setup_logging
+from src.name_batcher import NameBatcher
+from src.profiling import init_profiling
+from src.traffic_capture import init_traffic_capture
+from src.tracing import init_tracing, tracer
+
+def submitted_name():
+    """Normalized name submitted with the current request (if any), for the traffic capture."""
+    if request.path != '/play':
+        return None
+    name = request.form.get('name')
+    return name.strip().title() if name and name.strip() else None
 
 def create_app(config_name='default'):
     """Application factory pattern."""
@@ -35,14 +52,23 @@ def create_app(config_name='default'):
     # Raise an exception if any required variables are missing
     if missing_vars:
         raise EnvironmentError(f"Missing required environment variables: {', '.join(missing_vars)}")
-        
+
+    # Optional request capture and Server-Timing header for load testing
+    init_traffic_capture(app, 'frontend', submitted_name)
+
+    # Request tracing (no-op unless TRACE_EXPORTER is set)
+    init_tracing(app, 'hello-frontend')
+
+    # On-demand profiling (no-op unless PROFILE_SECRET or PROFILE_SAMPLE_RATE is set)
+    init_profiling(app)
+
+    # Load shedding: 429/503 with Retry-After instead of piling up requests
+    init_admission_control(app)
+
     return app
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging (JSON, written from a background thread - see log_setup.py)
+setup_logging('hello-frontend')
 logger = logging.getLogger(__name__)
 
 environment = os.getenv('ENVIRONMENT', 'development')
@@ -59,18 +85,64 @@ publisher = pubsub_v1.PublisherClient()
 # in the form `projects/{project_id}/topics/{topic_id}`
 topic_path = publisher.topic_path(PROJECT_ID, TOPIC_ID)
 
+# Bounds the background publish threads started by /play
+publish_admission = app.extensions['admission'].add_route(
+    'pubsub.publish', concurrency=app.config['PUBLISH_MAX_IN_FLIGHT'])
+
+# With PUBLISH_MODE=batch, names are published in batches instead of one message each
+batcher = None
+if app.config['PUBLISH_MODE'] == 'batch':
+    batcher = NameBatcher(
+        lambda data, **attributes: publisher.publish(topic_path, data, **attributes),
+        window_ms=app.config['PUBLISH_BATCH_WINDOW_MS'],
+        max_names=app.config['PUBLISH_BATCH_MAX_NAMES'],
+        max_pending=app.config['PUBLISH_BATCH_MAX_PENDING'],
+        compress=app.config['PUBLISH_BATCH_COMPRESS'],
+    )
+
+# ID tokens are valid for an hour; fetch a new one this long before the cached one expires
+ID_TOKEN_REFRESH_MARGIN_SECONDS = 300
+id_token_cache = {}  # audience -> (token, expires at)
+id_token_lock = threading.Lock()
+
 def get_gcp_id_token(audience):
-    """Fetches a GCP ID token for the given audience."""
-    if environment != 'development':
+    """Returns a GCP ID token for the given audience, fetched once and reused until shortly before it expires."""
+    if environment == 'development':
+        return None
+
+    cached = id_token_cache.get(audience)
+    if cached and time.time() < cached[1] - ID_TOKEN_REFRESH_MARGIN_SECONDS:
+        return cached[0]
+
+    # One fetch from the metadata server at a time; the others use its result
+    with id_token_lock:
+        cached = id_token_cache.get(audience)
+        if cached and time.time() < cached[1] - ID_TOKEN_REFRESH_MARGIN_SECONDS:
+            return cached[0]
         logger.info("Fetching GCP ID token for audience: %s", audience)
         try:
             request = google.auth.transport.requests.Request()
             id_token = google.oauth2.id_token.fetch_id_token(request, audience)
-            return id_token
+            expires_at = google.auth.jwt.decode(id_token, verify=False)['exp']
         except Exception as e:
             logger.error("Error fetching GCP ID token: %s", e)
             return None
-    
+        id_token_cache[audience] = (id_token, expires_at)
+        return id_token
+
+
+def debug_access_error():
+    """
+    Checks access to the /debug/* endpoints.
+
+    Returns None when the request may proceed, or an error response otherwise.
+    Without DEBUG_TOKEN the endpoints only exist in DEBUG mode.
+    """
+    token = app.config.get('DEBUG_TOKEN')
+    if not token:
+        return None if app.debug else ({"error": "Not found"}, 404)
+    if not hmac.compare_digest(request.headers.get('X-Debug-Token', ''), token):
+        return {"error": "Forbidden"}, 403
     return None
 
 
@@ -85,18 +157,38 @@ def play():
     name = request.form.get('name')
     logger.info("Received name submission: %s", name)
 
-    if name:
+    if name and batcher is not None:
+        capitalized_name = name.strip().title()
+        if not batcher.add(capitalized_name, context.get_current()):
+            flash("The game is very busy right now - please try again in a moment.", "danger")
+            return render_template('index.html'), 503, {'Retry-After': '1'}
+        flash(f"Hello, {capitalized_name}! Welcome to the game!", "success")
+
+    elif name:
+        # Don't start yet another publish thread when too many are still running
+        if publish_admission.admit():
+            flash("The game is very busy right now - please try again in a moment.", "danger")
+            return render_template('index.html'), 503, {'Retry-After': '1'}
+
         # Capitalize the name properly
         capitalized_name = name.strip().title()
         flash(f"Hello, {capitalized_name}! Welcome to the game!", "success")
 
+        # The publish thread doesn't inherit the request's trace context, so hand it over
+        parent_context = context.get_current()
+
         # Define a function to publish and log in a separate thread
         def publish_and_log(name_to_publish):
             try:
                 logger.info("Publishing name to Pub/Sub: %s", name_to_publish)
-                future = publisher.publish(topic_path, name_to_publish.encode("utf-8"))
-                # Wait for the result with a timeout to avoid hanging if Pub/Sub is unreachable
-                message_id = future.result(timeout=5)
+                with tracer.start_as_current_span('pubsub.publish', context=parent_context,
+                                                  kind=trace.SpanKind.PRODUCER):
+                    # Trace context travels to hello-function as message attributes
+                    attributes = {}
+                    propagate.inject(attributes)
+                    future = publisher.publish(topic_path, name_to_publish.encode("utf-8"), **attributes)
+                    # Wait for the result with a timeout to avoid hanging if Pub/Sub is unreachable
+                    message_id = future.result(timeout=5)
                 logger.info("Published message ID: %s", message_id)
 
             except concurrent.futures.TimeoutError:
@@ -108,6 +200,9 @@ def play():
             except exceptions.GoogleAPICallError as e:
                 logger.error("Failed to publish message (GCP API Error): %s", e)
 
+            finally:
+                publish_admission.release()
+
         # Start the thread
         thread = threading.Thread(target=publish_and_log, args=(capitalized_name,))
         thread.start()
@@ -116,6 +211,29 @@ def play():
 
     return redirect(url_for('index'))
 
+@app.route('/names/suggest', methods=['GET'])
+def suggest_names():
+    """Name suggestions for the play form (popular names starting with `prefix`)."""
+    prefix = request.args.get('prefix', '').strip()
+    if not prefix:
+        return {"names": []}, 200
+
+    try:
+        id_token = get_gcp_id_token(BACKEND_URL)
+        headers = {"Authorization": f"Bearer {id_token}"} if id_token else {}
+        with tracer.start_as_current_span('backend.search_names', kind=trace.SpanKind.CLIENT):
+            propagate.inject(headers)
+            response = requests.get(f"{BACKEND_URL}/names/search", params={'prefix': prefix, 'limit': 8},
+                                    headers=headers, timeout=2)
+            response.raise_for_status()
+            names = [item['name'] for item in response.json()['names']]
+    except (requests.RequestException, KeyError) as e:
+        # Suggestions are optional - the form works without them
+        logger.warning("Could not fetch name suggestions: %s", e)
+        names = []
+
+    return {"names": names}, 200
+
 @app.route('/stats', methods=['GET'])
 def stats():
     """Render the game statistics page."""
@@ -123,13 +241,16 @@ def stats():
     try:
         # TODO: Implement token caching to avoid fetching a new token on every request
         # Get GCP ID token for backend authentication
-        id_token = get_gcp_id_token(BACKEND_URL)
+        with tracer.start_as_current_span('fetch_id_token'):
+            id_token = get_gcp_id_token(BACKEND_URL)
         headers = {"Authorization": f"Bearer {id_token}"} if id_token else {}
 
-        # Fetch data from backend API
-        response = requests.get(f"{BACKEND_URL}/stats", headers=headers, timeout=5)
-        response.raise_for_status()
-        backend_data = response.json()
+        # Fetch data from backend API (the traceparent header continues the trace in the backend)
+        with tracer.start_as_current_span('backend.get_stats', kind=trace.SpanKind.CLIENT):
+            propagate.inject(headers)
+            response = requests.get(f"{BACKEND_URL}/stats", headers=headers, timeout=5)
+            response.raise_for_status()
+            backend_data = response.json()
 
         # Extract data for template
         stats_data = {
@@ -157,5 +278,14 @@ def stats():
     return render_template('stats.html', **stats_data)
 
 
+@app.route('/debug/admission', methods=['GET'])
+def debug_admission():
+    """Admitted and shed requests per route and publish slots, with the configured limits."""
+    error = debug_access_error()
+    if error:
+        return error
+    return app.extensions['admission'].summary(), 200
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8080, debug=(environment == 'development'))
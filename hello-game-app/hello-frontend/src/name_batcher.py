@@ -0,0 +1,144 @@
+"""Batched publishing of /play names (PUBLISH_MODE=batch).
+
+Instead of one Pub/Sub message per name, names are collected for up to
+PUBLISH_BATCH_WINDOW_MS (or until PUBLISH_BATCH_MAX_NAMES are waiting) and
+published as one envelope v1 message:
+- attribute `envelope` = "1", `count` = number of names
+- attribute `content-encoding` = "gzip" with PUBLISH_BATCH_COMPRESS
+- data: JSON lines, one `{"id": ..., "ts": ..., "name": ...}` per name
+
+`id` is a random client ID (lets hello-function drop duplicates within a
+message) and `ts` the time /play received the name, which hello-function
+stores as submitted_at. See hello-function/envelope.py for the decoder -
+the function must be rolled out before switching the frontend to batch mode.
+
+Every publish gets a PRODUCER span linked to the /play spans of its names.
+"""
+
+import atexit
+import gzip
+import json
+import logging
+import threading
+import time
+import uuid
+
+from opentelemetry import propagate, trace
+
+from src.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+ENVELOPE_VERSION = '1'
+
+
+class NameBatcher:
+    """
+    Collects names and publishes them in envelope messages from a background thread.
+
+    :param publish: Callable(data, **attributes) returning a publish future.
+    :param window_ms: Publish at the latest this long after the first name of a batch arrived.
+    :param max_names: Publish as soon as this many names are waiting.
+    :param max_pending: add() refuses names above this many waiting or still publishing names.
+    :param compress: Gzip the message data.
+    """
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, publish, window_ms=50, max_names=500, max_pending=10000, compress=False):
+        self.publish = publish
+        self.window = window_ms / 1000
+        self.max_names = max_names
+        self.max_pending = max_pending
+        self.compress = compress
+
+        self._pending = []
+        self._in_flight = 0  # names in published messages that aren't acknowledged yet
+        self._first_added = None
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def _ensure_started(self):
+        # Started on first use, so the thread lives in the gunicorn worker and not in a pre-fork parent
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='name-batcher', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+            logger.info("Name batcher started (window %.0f ms, max %d names)", self.window * 1000, self.max_names)
+
+    def add(self, name, parent_context=None):
+        """Queues a name for the next batch; returns False when too many names are waiting."""
+        entry = {'id': uuid.uuid4().hex, 'ts': time.time(), 'name': name}
+        span_context = trace.get_current_span(parent_context).get_span_context()
+        with self._condition:
+            if len(self._pending) + self._in_flight >= self.max_pending:
+                return False
+            self._ensure_started()
+            if not self._pending:
+                self._first_added = time.monotonic()
+            self._pending.append((entry, span_context))
+            if len(self._pending) >= self.max_names or len(self._pending) == 1:
+                self._condition.notify()
+        return True
+
+    def stop(self):
+        """Publishes what is waiting and stops the background thread."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    # --- Background thread ---
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                while not self._stopping and len(self._pending) < self.max_names:
+                    remaining = self._first_added + self.window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending[:self.max_names], self._pending[self.max_names:]
+                self._first_added = time.monotonic() if self._pending else None
+                self._in_flight += len(batch)
+
+            try:
+                self._publish(batch)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Failed to publish batch of %d names: %s", len(batch), e)
+                self._published(batch)
+
+    def _published(self, batch):
+        with self._condition:
+            self._in_flight -= len(batch)
+
+    def encode(self, entries):
+        """Envelope data and attributes of a batch."""
+        data = ''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in entries).encode('utf-8')
+        attributes = {'envelope': ENVELOPE_VERSION, 'count': str(len(entries))}
+        if self.compress:
+            data = gzip.compress(data)
+            attributes['content-encoding'] = 'gzip'
+        return data, attributes
+
+    def _publish(self, batch):
+        data, attributes = self.encode([entry for entry, _ in batch])
+        links = [trace.Link(span_context) for _, span_context in batch if span_context.is_valid]
+        with tracer.start_as_current_span('pubsub.publish_batch', kind=trace.SpanKind.PRODUCER, links=links,
+                                          attributes={'messaging.batch.message_count': len(batch)}):
+            # Trace context travels to hello-function as message attributes
+            propagate.inject(attributes)
+            future = self.publish(data, **attributes)
+
+        def log_result(future):
+            self._published(batch)
+            try:
+                logger.info("Published batch of %d names, message ID: %s", len(batch), future.result())
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Failed to publish batch of %d names: %s", len(batch), e)
+
+        future.add_done_callback(log_result)
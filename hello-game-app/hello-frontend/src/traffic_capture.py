@@ -0,0 +1,98 @@
+"""Optional structured traffic capture for the Hello Game services.
+
+When TRAFFIC_CAPTURE_FILE is set, every request is appended to that file as a
+JSON line (arrival time, method, path, status, duration and - for the route
+that submits a name, /submit or /play - the normalized name). The file is the
+input for benchmarks/replay.py, which turns it into a trace and replays it
+against a local stack. The path is recorded with its query string (`target`),
+so replayed requests keep it; `_profile` tokens (see profiling.py) are
+removed, they must not be written to disk or replayed.
+
+With SERVER_TIMING, every response carries the same duration in a
+`Server-Timing: app;dur=<ms>` header, which replay.py compares with the
+captured original - server time against server time.
+
+NOTE: The capture contains the submitted names. Treat the file like user data.
+
+The source of this module is shared/traffic_capture.py; the backend and the
+frontend have a copy (`make sync-shared`). Edit the shared file, not the copies.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that are never captured
+PRIVATE_PARAMETERS = ('_profile',)
+
+
+def capture_target():
+    """Path and query string of the current request, without PRIVATE_PARAMETERS."""
+    if not request.query_string:
+        return request.path
+    query = [(key, value) for key, value in request.args.items(multi=True) if key not in PRIVATE_PARAMETERS]
+    return f"{request.path}?{urlencode(query)}" if query else request.path
+
+
+def init_traffic_capture(app, service_name, extract_name=None):
+    """
+    Registers the hooks on the app if TRAFFIC_CAPTURE_FILE or SERVER_TIMING is configured.
+
+    :param app: The Flask app.
+    :param service_name: Recorded as `service` in every captured line.
+    :param extract_name: Callable returning the normalized name submitted with the
+        current request, or None.
+    """
+    path = app.config.get('TRAFFIC_CAPTURE_FILE')
+    server_timing = app.config.get('SERVER_TIMING')
+    if not path and not server_timing:
+        return
+
+    capture_file = None
+    if path:
+        # Append mode + one write per line keeps lines intact across gunicorn workers
+        capture_file = open(path, 'a', encoding='utf-8', buffering=1)  # pylint: disable=consider-using-with
+        logger.info("Traffic capture enabled, writing to %s", path)
+    lock = threading.Lock()
+
+    @app.before_request
+    def start_capture():
+        g.capture_started = time.time()
+        g.capture_perf = time.perf_counter()
+
+    @app.after_request
+    def write_capture(response):
+        if 'capture_perf' not in g:
+            return response
+        try:
+            duration_ms = round((time.perf_counter() - g.capture_perf) * 1000, 3)
+            if server_timing:
+                response.headers['Server-Timing'] = f"app;dur={duration_ms}"
+            if capture_file is None:
+                return response
+            record = {
+                'service': service_name,
+                'ts': round(g.capture_started, 6),
+                'method': request.method,
+                'path': request.path,
+                'target': capture_target(),
+                'status': response.status_code,
+                'duration_ms': duration_ms,
+                'pid': os.getpid(),
+            }
+            name = extract_name() if extract_name else None
+            if name:
+                record['name'] = name
+            with lock:
+                capture_file.write(json.dumps(record) + '\n')
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Capturing must never break the request itself
+            logger.error("Traffic capture failed: %s", e)
+        return response
@@ -0,0 +1,104 @@
+"""Pub/Sub message formats understood by hello-function.
+
+Legacy (single name): the message data is the raw UTF-8 name, no `envelope`
+attribute.
+
+Envelope v1 (several names, published by the frontend with PUBLISH_MODE=batch):
+- attribute `envelope` = "1"
+- attribute `content-encoding` = "gzip" when the data is gzip-compressed
+- data: JSON lines, one `{"id": ..., "ts": ..., "name": ...}` per name, where
+  `id` is a client-generated unique ID and `ts` the client time (Unix seconds)
+
+Both formats are accepted so the frontend can switch after the function is
+rolled out.
+
+Raising would make Pub/Sub redeliver the message forever, so nothing here
+does: a message that can't be decoded (bad base64/gzip/UTF-8, unknown envelope
+version) is logged and yields no entries, an invalid line (bad JSON, missing
+or non-string name or id, non-numeric or out of range ts) is logged and
+skipped.
+"""
+
+import base64
+import binascii
+import gzip
+import json
+import logging
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+ENVELOPE_VERSION = '1'
+
+# client_ts and client_id are None for legacy messages
+Entry = namedtuple('Entry', ['name', 'client_ts', 'client_id'])
+
+
+def valid_timestamp(ts):
+    """True for a Unix timestamp (seconds) that maps to a datetime."""
+    if isinstance(ts, bool) or not isinstance(ts, (int, float)):
+        return False
+    try:
+        datetime.fromtimestamp(ts, timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        return False
+    return True
+
+
+def decode_entry(line):
+    """Entry of one envelope line, or None (logged) when the line is invalid."""
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        logger.warning("Skipping envelope line that is not JSON (%s): %r", e, line[:200])
+        return None
+    if not isinstance(item, dict) or not isinstance(item.get('name'), str):
+        logger.warning("Skipping envelope line without a name: %r", line[:200])
+        return None
+    if item.get('id') is not None and not isinstance(item['id'], str):
+        logger.warning("Skipping envelope line with a non-string id: %r", line[:200])
+        return None
+    ts = item.get('ts')
+    if ts is not None and not valid_timestamp(ts):
+        logger.warning("Skipping envelope line with invalid ts (id %s): %r", item.get('id'), ts)
+        return None
+    return Entry(item['name'], ts, item.get('id'))
+
+
+def decode_event(event):
+    """Returns the entries of a Pub/Sub event (empty if it has no or undecodable data)."""
+    if 'data' not in event:
+        return []
+    attributes = event.get('attributes') or {}
+    version = attributes.get('envelope')
+    try:
+        data = base64.b64decode(event['data'])
+        if version is None:
+            return [Entry(data.decode('utf-8'), None, None)]
+        if version != ENVELOPE_VERSION:
+            logger.error("Dropping message with unsupported envelope version %r", version)
+            return []
+        if attributes.get('content-encoding') == 'gzip':
+            data = gzip.decompress(data)
+        text = data.decode('utf-8')
+    except (binascii.Error, OSError, EOFError, zlib.error, UnicodeDecodeError, TypeError) as e:
+        logger.error("Dropping undecodable message (envelope %s): %s", version, e)
+        return []
+
+    entries = []
+    seen_ids = set()
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        entry = decode_entry(line)
+        if entry is None:
+            continue
+        # The same entry twice in one message can only be a client retry
+        if entry.client_id is not None:
+            if entry.client_id in seen_ids:
+                continue
+            seen_ids.add(entry.client_id)
+        entries.append(entry)
+    return entries
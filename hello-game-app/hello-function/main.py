@@ -1,36 +1,52 @@
 import base64
 import logging
 import os
+from datetime import datetime, timezone
 from google.cloud.sql.connector import Connector, IPTypes
 import pg8000
+import pg8000.dbapi
+from opentelemetry import trace
+
+from envelope import decode_event
+from log_setup import flush_logs, setup_logging
+from tracing import extract_context, flush_spans, setup_tracing, tracer
 
 # Database configuration
 INSTANCE_CONNECTION_NAME = os.getenv('INSTANCE_CONNECTION_NAME', '')
 DB_NAME = os.getenv('DB_NAME', 'hello_game_submissions')
 DB_USER = os.getenv('DB_USER', 'hello_user')
 
+# Used only for local development (when INSTANCE_CONNECTION_NAME is not set)
+DB_HOST = os.getenv('DB_HOST', 'localhost')
+DB_PORT = int(os.getenv('DB_PORT', '5432'))
+DB_PASSWORD = os.getenv('DB_PASSWORD', 'hello_password')
+
+# One row per name: (%s, NOW()) for legacy messages, (%s, %s) with the client timestamp otherwise
 INSERT_QUERY = """
     INSERT INTO game_submissions (name, submitted_at)
-    VALUES (%s, NOW());
+    VALUES {values};
 """
 
+# game_submissions.name is VARCHAR(100)
+MAX_NAME_LENGTH = 100
+
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+setup_logging('hello-function')
 
-def process_pubsub_message(event, context):
-    """
-    Background Cloud Function to be triggered by Pub/Sub.
-    Args:
-         event: Contains the Pub/Sub message data
-        context: Contains metadata (timestamp, event_id, etc.)
+setup_tracing('hello-function', os.getenv('TRACE_EXPORTER', 'none'), os.getenv('TRACE_FILE', 'traces.jsonl'))
+
+
+def get_db_connection():
     """
-    logger.info(f"Received event ID: {context.event_id} at {context.timestamp}")
+    Opens a new database connection.
+
+    Uses the Cloud SQL Python Connector (IAM Auth) when INSTANCE_CONNECTION_NAME
+    is set, and a classic username/password connection for local development.
 
-    if 'data' in event:
-        pubsub_message = base64.b64decode(event['data']).decode('utf-8')
-        logger.info(f"Decoded Pub/Sub message: {pubsub_message}")
-        
-        # Save the name to the database
+    Returns:
+      (db, connector) - connector is None in local mode
+    """
+    if INSTANCE_CONNECTION_NAME:
         connector = Connector()
         db = connector.connect(
             instance_connection_string=INSTANCE_CONNECTION_NAME,
@@ -40,33 +56,99 @@ def process_pubsub_message(event, context):
             enable_iam_auth=True,     # IAM-based passwordless auth
             ip_type=IPTypes.PRIVATE,  # PRIVATE or PUBLIC
         )
+        return db, connector
 
-        # Insert the name into the database in try block to close connection properly on error
-        try:
+    db = pg8000.dbapi.connect(
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME,
+    )
+    return db, None
+
+def process_pubsub_message(event, context):
+    """
+    Background Cloud Function to be triggered by Pub/Sub.
+    Args:
+         event: Contains the Pub/Sub message data
+        context: Contains metadata (timestamp, event_id, etc.)
+    """
+    logger.info("Received event ID: %s at %s", context.event_id, context.timestamp)
+
+    # Continue the trace started by the frontend in /play (carried in the message attributes)
+    try:
+        with tracer.start_as_current_span(
+            'process_pubsub_message',
+            context=extract_context(event),
+            kind=trace.SpanKind.CONSUMER,
+            attributes={'messaging.message.id': str(context.event_id)},
+        ):
+            save_message(event)
+    finally:
+        flush_spans()
+        # The instance may be frozen between invocations, so write queued log lines now
+        flush_logs()
+
+
+def build_insert(entries):
+    """Returns (query, params) inserting all entries with one statement."""
+    values, params = [], []
+    for entry in entries:
+        if entry.client_ts is None:
+            values.append("(%s, NOW())")
+            params.append(entry.name)
+        else:
+            values.append("(%s, %s)")
+            submitted_at = datetime.fromtimestamp(entry.client_ts, timezone.utc).replace(tzinfo=None)
+            params.extend([entry.name, submitted_at])
+    return INSERT_QUERY.format(values=', '.join(values)), params
+
+
+def save_message(event):
+    """Decodes the Pub/Sub message and saves its name(s) to the database."""
+    entries = []
+    for entry in decode_event(event):
+        name = entry.name.strip().title()
+        # A name that can never be inserted would make Pub/Sub redeliver the whole message forever
+        if not name or len(name) > MAX_NAME_LENGTH:
+            logger.warning("Skipping invalid name (id %s): %r", entry.client_id, entry.name[:200])
+            continue
+        entries.append(entry._replace(name=name))
+
+    if not entries:
+        logger.warning("No data found in Pub/Sub message.")
+        return
+    logger.info("Decoded Pub/Sub message with %d name(s)", len(entries))
+
+    # Save the names to the database
+    with tracer.start_as_current_span('db.connect'):
+        db, connector = get_db_connection()
+
+    # Insert the names into the database in try block to close connection properly on error
+    try:
+        with tracer.start_as_current_span('db.insert', attributes={'db.rows': len(entries)}):
             cursor = db.cursor()
-            insert_query = INSERT_QUERY
-            cursor.execute(insert_query, (pubsub_message.strip().title(),))
+            insert_query, params = build_insert(entries)
+            cursor.execute(insert_query, params)
             cursor.close()
+        with tracer.start_as_current_span('db.commit'):
             db.commit()
-            logger.info(f"Inserted name '{pubsub_message}' into database.")
-        
-        except Exception as e:
-            logger.error(f"Error inserting name into database: {e}")
-            raise # Reraise exception to signal failure to Pub/Sub
-
-        finally:
-            db.close()
+        logger.info("Inserted %d name(s) into database.", len(entries))
+
+    except Exception as e:
+        logger.error("Error inserting names into database: %s", e)
+        raise # Reraise exception to signal failure to Pub/Sub
+
+    finally:
+        db.close()
+        if connector:
             connector.close()
-            logger.info("Database connection closed.")
-        
-    else:
-        logger.warning("No data found in Pub/Sub message.")
+        logger.info("Database connection closed.")
 
 
 if __name__ == "__main__":
     """Test the function locally with mock data."""
-    from datetime import datetime
-    
     # Mock Pub/Sub event data
     mock_event = {
         'data': base64.b64encode("TestUser".encode('utf-8')).decode('utf-8')
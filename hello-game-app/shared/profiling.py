@@ -0,0 +1,230 @@
+"""On-demand per-request profiling for the Hello Game services.
+
+A request is profiled when either:
+- it carries a valid signed token in the X-Profile-Token header or the
+  `_profile` query parameter (needs PROFILE_SECRET), or
+- it is picked by sampling, 1 in every PROFILE_SAMPLE_RATE requests.
+
+PROFILE_MODE selects the profiler:
+- cprofile: deterministic, every call is counted; written as a .pstats file
+  (open with `python -m pstats` or snakeviz)
+- sampling: the request thread's stack is sampled every
+  PROFILE_SAMPLING_INTERVAL_MS; written as collapsed stacks (.collapsed),
+  ready for flamegraph.pl or speedscope. Much lower overhead.
+
+Profiles go to PROFILE_DIR, which is capped at PROFILE_DIR_MAX_MB (oldest
+files are removed first). When neither trigger is configured the middleware
+is not installed at all. A streamed response is profiled until the server
+closes it, so the time spent producing the body is included.
+
+Create a token that is valid for 5 minutes:
+    PROFILE_SECRET=... python src/profiling.py 300
+
+The source of this module is shared/profiling.py; the backend and the frontend
+have a copy (`make sync-shared`). Edit the shared file, not the copies.
+"""
+
+import cProfile
+import hashlib
+import hmac
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+from werkzeug.wsgi import ClosingIterator
+
+logger = logging.getLogger(__name__)
+
+
+def sign_token(secret, ttl_seconds):
+    """Returns a profiling token valid for `ttl_seconds`: '<expires>.<hmac>'."""
+    expires = str(int(time.time() + ttl_seconds))
+    signature = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_token(secret, token):
+    """Checks the token signature and expiry."""
+    expires, _, signature = token.partition('.')
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected)
+
+
+class StackSampler:
+    """Samples the stack of one thread at a fixed interval (collapsed-stack counts)."""
+
+    def __init__(self, thread_id, interval_seconds):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Starts sampling."""
+        self._thread.start()
+
+    def stop(self):
+        """Stops sampling and waits for the sampler thread."""
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)  # pylint: disable=protected-access
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        """Writes the samples in collapsed-stack format."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfilingMiddleware:
+    """
+    WSGI middleware that profiles selected requests.
+
+    :param wsgi_app: The wrapped WSGI application.
+    :param profile_dir: Where profiles are written.
+    :param max_dir_bytes: Size cap of `profile_dir`; oldest profiles are removed first.
+    :param secret: Secret for signed profiling tokens (None disables them).
+    :param sample_rate: Profile 1 in every N requests (0 disables sampling).
+    :param mode: 'cprofile' or 'sampling'.
+    :param sampling_interval_ms: Stack sampling interval in 'sampling' mode.
+    """
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, wsgi_app, profile_dir, max_dir_bytes, secret=None, sample_rate=0,
+                 mode='cprofile', sampling_interval_ms=5):
+        if mode not in ('cprofile', 'sampling'):
+            raise ValueError(f"Unknown PROFILE_MODE: {mode}")
+        self.wsgi_app = wsgi_app
+        self.profile_dir = profile_dir
+        self.max_dir_bytes = max_dir_bytes
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.sampling_interval = sampling_interval_ms / 1000
+        self._counter = itertools.count(1)
+        self._dir_lock = threading.Lock()
+        os.makedirs(profile_dir, exist_ok=True)
+
+    def __call__(self, environ, start_response):
+        if not self._should_profile(environ):
+            return self.wsgi_app(environ, start_response)
+        return self._profile(environ, start_response)
+
+    def _should_profile(self, environ):
+        if self.sample_rate and next(self._counter) % self.sample_rate == 0:
+            return True
+        if not self.secret:
+            return False
+
+        token = environ.get('HTTP_X_PROFILE_TOKEN')
+        query = environ.get('QUERY_STRING', '')
+        if token is None and '_profile=' in query:
+            token = parse_qs(query).get('_profile', [None])[0]
+        return bool(token) and verify_token(self.secret, token)
+
+    def _profile(self, environ, start_response):
+        started = time.perf_counter()
+        if self.mode == 'sampling':
+            sampler = StackSampler(threading.get_ident(), self.sampling_interval)
+            sampler.start()
+
+            def stop():
+                sampler.stop()
+                self._save(environ, started, 'collapsed', sampler.write)
+        else:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Only one deterministic profiler can be active at a time
+                logger.warning("Skipping profile, another profiler is active: %s", e)
+                return self.wsgi_app(environ, start_response)
+
+            def stop():
+                profiler.disable()
+                self._save(environ, started, 'pstats', profiler.dump_stats)
+
+        try:
+            body = self.wsgi_app(environ, start_response)
+        except Exception:
+            stop()
+            raise
+        # A streamed body (e.g. /export) is produced while the server iterates it;
+        # the server closes it afterwards, on the same thread
+        return ClosingIterator(body, stop)
+
+    def _save(self, environ, started, extension, writer):
+        duration_ms = (time.perf_counter() - started) * 1000
+        path_slug = re.sub(r'[^A-Za-z0-9]+', '_', environ.get('PATH_INFO', '')).strip('_') or 'root'
+        filename = (f"{time.strftime('%Y%m%d-%H%M%S')}-{environ.get('REQUEST_METHOD', '')}-{path_slug}"
+                    f"-{duration_ms:.0f}ms-{os.getpid()}-{threading.get_ident()}.{extension}")
+        path = os.path.join(self.profile_dir, filename)
+        try:
+            writer(path)
+            logger.info("Request profile written to %s", path)
+            self._enforce_size_cap()
+        except OSError as e:
+            logger.error("Could not write request profile: %s", e)
+
+    def _enforce_size_cap(self):
+        with self._dir_lock:
+            entries = []
+            for entry in os.scandir(self.profile_dir):
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_dir_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+def init_profiling(app):
+    """Installs the profiling middleware if a trigger (secret or sampling) is configured."""
+    secret = app.config.get('PROFILE_SECRET')
+    sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0)
+    if not secret and not sample_rate:
+        return
+
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app,
+        profile_dir=app.config['PROFILE_DIR'],
+        max_dir_bytes=app.config['PROFILE_DIR_MAX_MB'] * 1024 * 1024,
+        secret=secret,
+        sample_rate=sample_rate,
+        mode=app.config['PROFILE_MODE'],
+        sampling_interval_ms=app.config['PROFILE_SAMPLING_INTERVAL_MS'],
+    )
+    logger.info("Request profiling enabled (mode: %s, sampling 1 in %s, signed tokens: %s)",
+                app.config['PROFILE_MODE'], sample_rate or 'off', 'on' if secret else 'off')
+
+
+if __name__ == '__main__':
+    # Prints a signed profiling token, e.g. `PROFILE_SECRET=... python src/profiling.py 300`
+    if not os.getenv('PROFILE_SECRET'):
+        sys.exit("PROFILE_SECRET must be set")
+    print(sign_token(os.environ['PROFILE_SECRET'], int(sys.argv[1]) if len(sys.argv) > 1 else 300))
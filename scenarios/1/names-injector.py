@@ -1,8 +1,41 @@
-# post_random_names.py
+"""
+Open-loop load generator for the Hello Game App.
+
+Sends requests at a target rate (not "one after another"), so when the app
+slows down the load does not slow down with it. Latency is measured from the
+moment a request *should* have been sent, which keeps latency spikes visible
+instead of hiding them (coordinated omission).
+
+Traffic is described as a list of phases, each with a duration and a target
+rate. A `ramp` phase goes linearly from the previous rate to its target, the
+other phases hold their rate, e.g.:
+
+    ramp:30:20,steady:60:20,spike:10:100,steady:30:20
+
+Examples:
+    # Same as the original script, but open-loop: ~0.5 req/s against /play
+    FRONTEND_URL=https://hello-frontend-xyz.run.app python3 names-injector.py --phases steady:100:0.5
+
+    # Ramp up, hold, spike, recover - with a Zipf-like name popularity
+    FRONTEND_URL=... python3 names-injector.py --phases ramp:30:20,steady:60:20,spike:10:100,steady:30:20 \\
+        --distribution zipf --connections 64
+
+    # Mix of frontend plays and backend reads (backend needs to be reachable, e.g. from inside the VPC)
+    FRONTEND_URL=... BACKEND_URL=... ID_TOKEN=$(gcloud auth print-identity-token) \\
+        python3 names-injector.py --mix play=0.8,stats=0.15,submit=0.05
+"""
+import argparse
+import bisect
+import math
 import os
 import random
-import requests
+import threading
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
 
 # Random names list
 NAMES = [
@@ -13,27 +46,289 @@ NAMES = [
 ]
 
 FRONTEND_URL = os.getenv("FRONTEND_URL")  # Your Cloud Run frontend URL
+BACKEND_URL = os.getenv("BACKEND_URL")    # Only needed for the submit/stats targets
+ID_TOKEN = os.getenv("ID_TOKEN")          # Only needed if the backend requires authentication
+
+TARGETS = ('play', 'submit', 'stats')
+
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram.
+
+    Values are kept in log-linear buckets with 3 significant digits (microsecond
+    values below 1000 are exact, larger ones are at most 1% off), which means
+    constant memory no matter how many requests are recorded. Percentiles
+    report the upper bound of their bucket, so they are never too low.
+    """
+
+    def __init__(self):
+        self._buckets = Counter()
+        self._lock = threading.Lock()
+        self.count = 0
+        self.max = 0
+
+    @staticmethod
+    def _width(value_us):
+        if value_us < 1000:
+            return 1
+        return 10 ** (int(math.log10(value_us)) - 2)
+
+    @classmethod
+    def _bucket(cls, value_us):
+        scale = cls._width(value_us)
+        return int(value_us // scale) * scale
+
+    def record(self, seconds):
+        """Records a single latency (in seconds)."""
+        value_us = int(seconds * 1_000_000)
+        with self._lock:
+            self._buckets[self._bucket(value_us)] += 1
+            self.count += 1
+            self.max = max(self.max, value_us)
+
+    def percentile(self, pct):
+        """Returns the given percentile in milliseconds."""
+        with self._lock:
+            if not self.count:
+                return None
+            threshold = math.ceil(pct / 100 * self.count)
+            seen = 0
+            for bucket in sorted(self._buckets):
+                seen += self._buckets[bucket]
+                if seen >= threshold:
+                    upper = bucket + self._width(bucket) - 1
+                    return min(upper, self.max) / 1000
+            return self.max / 1000
+
+
+class PhaseStats:
+    """Counters for a single load phase."""
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.latency = LatencyHistogram()
+        self.results = Counter()  # "<target> <status>" -> count
+        self.errors = 0
+        self.max_lag = 0.0        # How far behind schedule the generator itself got
+        self._lock = threading.Lock()
+
+    def record(self, target, status, ok, latency):
+        """Records the outcome of a single request."""
+        self.latency.record(latency)
+        with self._lock:
+            self.results[f"{target} {status}"] += 1
+            if not ok:
+                self.errors += 1
+
+    def report(self):
+        """Prints the phase summary."""
+        name, duration, rate = self.phase
+        total = self.latency.count
+        error_rate = (self.errors / total * 100) if total else 0.0
+        print(f"\n=== Phase {name} ({duration:g}s, target {rate:g} req/s) ===")
+        print(f"Requests: {total} ({total / duration:.1f} req/s)  errors: {self.errors} ({error_rate:.2f}%)")
+        if total:
+            percentiles = "  ".join(
+                f"p{pct:g}: {self.latency.percentile(pct):.1f} ms" for pct in (50, 90, 99, 99.9)
+            )
+            print(f"Latency {percentiles}  max: {self.latency.max / 1000:.1f} ms")
+        for result, count in sorted(self.results.items()):
+            print(f"  {result}: {count}")
+        if self.max_lag > 0.1:
+            print(f"⚠ Generator fell {self.max_lag:.2f}s behind schedule - add --connections or a second machine")
+
+
+class NamePicker:
+    """Picks names following a uniform, Zipf or explicitly weighted distribution."""
+
+    def __init__(self, names, weights):
+        self.names = names
+        self._cum_weights = []
+        total = 0.0
+        for weight in weights:
+            total += weight
+            self._cum_weights.append(total)
+
+    @classmethod
+    def from_args(cls, args):
+        """Builds the picker from the command line options."""
+        names, weights = list(NAMES), None
+        if args.names_file:
+            names, weights = [], []
+            with open(args.names_file, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    name, _, weight = line.strip().partition(',')
+                    names.append(name)
+                    weights.append(float(weight or 1))
+
+        if args.distribution == 'zipf':
+            # The n-th name in the list is 1/n^s as popular as the first one
+            weights = [1 / (rank ** args.zipf_s) for rank in range(1, len(names) + 1)]
+        elif args.distribution == 'uniform' or weights is None:
+            weights = [1.0] * len(names)
+        return cls(names, weights)
+
+    def pick(self):
+        """Returns a random name."""
+        point = random.random() * self._cum_weights[-1]
+        return self.names[bisect.bisect_right(self._cum_weights, point)]
+
+
+def parse_phases(spec):
+    """Parses "name:duration:rate,..." into a list of (name, duration, rate) (argparse type)."""
+    phases = []
+    for part in spec.split(','):
+        try:
+            name, duration, rate = part.strip().split(':')
+            duration, rate = float(duration), float(rate)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(f"invalid phase '{part}', expected name:duration:rate") from e
+        if duration <= 0 or rate < 0:
+            raise argparse.ArgumentTypeError(f"invalid phase '{part}': duration must be > 0 and rate >= 0")
+        phases.append((name, duration, rate))
+    return phases
+
+
+def parse_mix(spec):
+    """Parses "play=0.8,stats=0.2" into (targets, cumulative weights)."""
+    targets, cum_weights, total = [], [], 0.0
+    for part in spec.split(','):
+        target, _, weight = part.strip().partition('=')
+        if target not in TARGETS:
+            raise ValueError(f"Unknown target '{target}', expected one of: {', '.join(TARGETS)}")
+        total += float(weight or 1)
+        targets.append(target)
+        cum_weights.append(total)
+    return targets, cum_weights
+
+
+def arrival_times(phases, poisson):
+    """
+    Yields (phase_index, offset_in_seconds) for every request to send.
+
+    Within a ramp the rate changes linearly; every other phase keeps a constant
+    rate. With `poisson` the gaps are exponential instead of evenly spaced.
+    """
+    phase_start = 0.0
+    previous_rate = 0.0
+    for index, (name, duration, rate) in enumerate(phases):
+        start_rate = previous_rate if name == 'ramp' else rate
+        slope = (rate - start_rate) / duration
+        peak = max(start_rate, rate)
+
+        if poisson and peak > 0:
+            # Thinning: draw arrivals at the peak rate and keep each with probability rate(t) / peak
+            offset = random.expovariate(peak)
+            while offset < duration:
+                if random.random() * peak < start_rate + slope * offset:
+                    yield index, phase_start + offset
+                offset += random.expovariate(peak)
+        elif peak > 0:
+            # The k-th request goes out when the expected number of requests so far reaches k:
+            # start_rate * t + slope * t^2 / 2 = k
+            expected_total = round((start_rate + rate) / 2 * duration)
+            k = 1
+            while k <= expected_total:
+                if slope:
+                    offset = (math.sqrt(start_rate ** 2 + 2 * slope * k) - start_rate) / slope
+                else:
+                    offset = k / start_rate
+                yield index, phase_start + offset
+                k += 1
+
+        phase_start += duration
+        previous_rate = rate
+
+
+def send_request(session, target, picker, timeout):
+    """Sends a single request; returns (status, ok)."""
+    headers = {"Authorization": f"Bearer {ID_TOKEN}"} if ID_TOKEN else {}
+    if target == 'play':
+        # POST form data (not JSON) to match the /play endpoint
+        response = session.post(
+            f"{FRONTEND_URL}/play",
+            data={'name': picker.pick()},
+            allow_redirects=False,  # Don't follow redirect to avoid getting HTML back
+            timeout=timeout,
+        )
+        return response.status_code, response.status_code in (200, 302)  # 302 = redirect (success)
+    if target == 'submit':
+        response = session.post(f"{BACKEND_URL}/submit", json={'name': picker.pick()},
+                                headers=headers, timeout=timeout)
+        return response.status_code, response.status_code == 201
+    response = session.get(f"{BACKEND_URL}/stats", headers=headers, timeout=timeout)
+    return response.status_code, response.status_code == 200
+
+
+def run(args):
+    """Runs all phases and prints a report per phase."""
+    phases = args.phases
+    targets, target_weights = parse_mix(args.mix)
+    picker = NamePicker.from_args(args)
+
+    if 'play' in targets and not FRONTEND_URL:
+        raise SystemExit("FRONTEND_URL must be set for the 'play' target")
+    if {'submit', 'stats'} & set(targets) and not BACKEND_URL:
+        raise SystemExit("BACKEND_URL must be set for the 'submit' and 'stats' targets")
+
+    # One session shared by all threads, with a connection pool as big as the thread pool
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=args.connections)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    stats = [PhaseStats(phase) for phase in phases]
+
+    def fire(phase_index, target, intended_start):
+        try:
+            status, ok = send_request(session, target, picker, args.timeout)
+        except requests.RequestException as e:
+            status, ok = type(e).__name__, False
+        # Measured from the intended send time, not from when a thread got around to it
+        stats[phase_index].record(target, status, ok, time.monotonic() - intended_start)
+
+    total_duration = sum(duration for _, duration, _ in phases)
+    print(f"Running {len(phases)} phase(s) for {total_duration:g}s with up to {args.connections} connections")
+
+    with ThreadPoolExecutor(max_workers=args.connections) as executor:
+        started = time.monotonic()
+        for phase_index, offset in arrival_times(phases, args.poisson):
+            intended_start = started + offset
+            lag = time.monotonic() - intended_start
+            if lag < 0:
+                time.sleep(-lag)
+            else:
+                stats[phase_index].max_lag = max(stats[phase_index].max_lag, lag)
+
+            target = targets[bisect.bisect_right(target_weights, random.random() * target_weights[-1])]
+            executor.submit(fire, phase_index, target, intended_start)
+
+    for phase_stats in stats:
+        phase_stats.report()
+
+
+def parse_args():
+    """Command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--phases', type=parse_phases, default='ramp:30:10,steady:60:10,spike:10:50,steady:30:10',
+                        help="Comma separated name:duration_seconds:target_rps (name 'ramp' ramps up/down)")
+    parser.add_argument('--mix', default='play=1',
+                        help="Comma separated target=weight, targets: play, submit, stats")
+    parser.add_argument('--connections', type=int, default=32, help="Max concurrent requests")
+    parser.add_argument('--distribution', choices=('uniform', 'zipf', 'weighted'), default='uniform',
+                        help="Name popularity; 'weighted' uses the weights from --names-file")
+    parser.add_argument('--zipf-s', type=float, default=1.1, help="Zipf exponent (higher = more skewed)")
+    parser.add_argument('--names-file', help="File with one name per line, optionally 'name,weight'")
+    parser.add_argument('--poisson', action='store_true', help="Poisson (random) arrivals instead of evenly spaced")
+    parser.add_argument('--timeout', type=float, default=30, help="Request timeout in seconds")
+    args = parser.parse_args()
+    if args.distribution == 'weighted' and not args.names_file:
+        parser.error("--distribution weighted needs --names-file with 'name,weight' lines")
+    return args
+
 
-def post_random_name():
-    name = random.choice(NAMES)
-    
-    # POST form data (not JSON) to match your /play endpoint
-    response = requests.post(
-        f"{FRONTEND_URL}/play",
-        data={'name': name},  # Form data, not JSON
-        allow_redirects=False  # Don't follow redirect to avoid getting HTML back
-    )
-    
-    if response.status_code in [302, 200]:  # 302 = redirect (success)
-        print(f"✅ Posted name: {name}")
-    else:
-        print(f"❌ Failed to post {name}: {response.status_code}")
-
-def spam_names(count=10, delay=1):
-    """Post multiple random names with delay"""
-    for i in range(count):
-        post_random_name()
-        time.sleep(delay)
-        
 if __name__ == "__main__":
-    spam_names(count=50, delay=2)  # Post 50 names, 2 seconds apart
\ No newline at end of file
+    run(parse_args())